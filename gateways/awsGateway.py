@@ -1,24 +1,53 @@
 import os
+import time
 import boto3
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from boto3.dynamodb.conditions import Key, Attr
+from utils.batching import chunked, backoff_delay
+from gateways.bulk_writer import BulkWriter, estimate_write_units
+from gateways.stock_counter import StockCounter, SETTLE_SECONDS
+from gateways.catalog_sync import CatalogSync, new_sync_stamp
+from utils.aws_clients import get_resource, get_client, hedged_read
+from utils.circuit_breaker import guarded_call, is_degraded
+from utils import ledger_keys
+from utils.dynamo_expressions import projection_kwargs, set_update_kwargs
+from botocore.exceptions import ClientError #type: ignore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BATCH_GET_CHUNK_SIZE = 100  # DynamoDB BatchGetItem limit per request
+BATCH_GET_MAX_RETRIES = 8
+BATCH_GET_PROJECTION = ("product_id", "item", "price")
+LEDGER_ROWS_PER_TRANSACTION = 50  # a row Put and a stock Update each; TransactWriteItems takes 100 actions
+LEDGER_TRANSACTION_ATTEMPTS = 5
+CONTENTION_REASONS = {"ThrottlingError", "TransactionConflict", "ProvisionedThroughputExceeded"}
+BULK_MAX_WORKERS = 8
+# Attributes maintained by the gateway itself; product edits may not set them
+PROTECTED_PRODUCT_ATTRIBUTES = {
+    "product_id", "version", "stock_total", "stock_shards", "stock_backfilled", "total_quantity", "sync_bucket", "sync_version", "updated_at",
+}
+
 class AWSGateway:
     def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb')
-        self.s3 = boto3.client('s3')
+        self.dynamodb = get_resource('dynamodb')
+        self.s3 = get_client('s3')
         self.padeliver_table = self.dynamodb.Table(os.getenv('PADELIVER_PRODUCTS_TABLE'))
         self.inventory_table = self.dynamodb.Table(os.getenv('PRODUCTS_INVENTORY_TABLE'))
+        self.padeliver_writer = BulkWriter(self.padeliver_table, ['product_id'])
+        self.inventory_writer = BulkWriter(self.inventory_table, ['product_id', 'datetime'])
+        self.stock_counter = StockCounter(self.padeliver_table)
+        self.catalog_sync = CatalogSync(
+            self.padeliver_table, lambda product_ids: self.batch_get_products(product_ids, include_stock=False, projection=())
+        )
 
-    def get_padeliver_products(self):
+    def get_padeliver_products(self, projection=()):
         try:
-            response = self.padeliver_table.scan()
+            response = self.padeliver_table.scan(**projection_kwargs(*projection))
             products = response.get('Items', [])
             return products
         except Exception as e:
@@ -26,23 +55,42 @@ class AWSGateway:
             return []
 
     def batch_create_products(self, products):
-        """Batch create products in the Pa-deliver products table."""
+        """Batch create products in the Pa-deliver products table within the bulk write budget."""
         try:
-            with self.padeliver_table.batch_writer() as batch:
-                for product in products:
-                    batch.put_item(Item=product)
-            logger.info(f"Batch created {len(products)} products successfully.")
+            results = self.padeliver_writer.put_items([self.catalog_sync.stamp({"version": 1, **product}) for product in products])
+            logger.info(f"Batch created {len(results['succeeded'])} of {len(products)} products.")
+            return results
         except Exception as e:
             logger.error(f"Error batch creating products: {e}")
             raise
 
     def batch_delete_products(self, product_ids):
+        """Batch delete products from the Pa-deliver products table within the bulk write budget."""
         try:
-            with self.padeliver_table.batch_writer() as batch:
-                for product_id in product_ids:
-                    batch.delete_item(Key={'product_id': product_id})
+            results = self.padeliver_writer.delete_keys([{'product_id': product_id} for product_id in product_ids])
+            missing = [key['product_id'] for key in results['succeeded']]
+            for _ in range(2):  # the BulkWriter already retries throttles; one more pass for anything left
+                if not missing:
+                    break
+                tombstones = self.catalog_sync.record_deletions(missing)
+                missing = [failure['key']['product_id'] for failure in tombstones['failed']]
+            if missing:
+                # Deleted, but delta sync clients will not hear about it: report these as failed
+                results['succeeded'] = [key for key in results['succeeded'] if key['product_id'] not in missing]
+                results['failed'].extend(
+                    {"key": {"product_id": product_id}, "error": "Deleted, but the sync tombstone was not written"}
+                    for product_id in missing
+                )
+            return results
         except Exception as e:
             print(f"Error batch deleting products: {e}")
+            return {"succeeded": [], "failed": [{"key": {"product_id": product_id}, "error": str(e)} for product_id in product_ids]}
+
+    def get_catalog_changes(self, since=None, limit=None):
+        """Catalog changes and deletions after sync version `since` (see CatalogSync.changes_since)."""
+        if limit:
+            return self.catalog_sync.changes_since(since, limit)
+        return self.catalog_sync.changes_since(since)
 
     def get_s3_object(self, bucket_name, key):
         try:
@@ -53,20 +101,29 @@ class AWSGateway:
             print(f"Error fetching S3 object: {e}")
             return None
 
-    def search_padeliver_products_by_id(self, product_id):
+    def stream_s3_lines(self, bucket_name, key):
+        """Yield the decoded lines of an S3 object without loading the whole body into memory."""
+        response = self.s3.get_object(Bucket=bucket_name, Key=key)
+        for line in response['Body'].iter_lines():
+            yield line.decode('utf-8-sig')
+
+    def search_padeliver_products_by_id(self, product_id, projection=()):
         try:
-            response = self.padeliver_table.get_item(Key={'product_id': product_id})
+            response = hedged_read(
+                'padeliver.get_item', self.padeliver_table.get_item,
+                Key={'product_id': product_id}, **projection_kwargs(*projection)
+            )
             product = response.get('Item', {})
             return [product] if product else []
         except Exception as e:
             print(f"Error searching product by ID: {e}")
             return []
 
-    def search_padeliver_products_by_name(self, product_name):
+    def search_padeliver_products_by_name(self, product_name, projection=()):
         try:
             response = self.padeliver_table.scan(
-                FilterExpression="contains(item, :name)",
-                ExpressionAttributeValues={":name": product_name}
+                FilterExpression=Attr('item').contains(product_name),
+                **projection_kwargs(*projection)
             )
             products = response.get('Items', [])
             return products
@@ -77,36 +134,48 @@ class AWSGateway:
     def get_product_names(self):
         """Retrieves all product names."""
         try:
-            response = self.padeliver_table.scan()
+            response = guarded_call('padeliver.scan', self.padeliver_table.scan, **projection_kwargs('product_id', 'item'))
             products = response.get('Items', [])
             return [{"id": p["product_id"], "name": p["item"]} for p in products]
         except Exception as e:
+            if is_degraded(e):
+                raise
             print(f"❌ Error fetching product names: {e}")
             return []
 
-    def get_product_name(self, item):
-        """Fetches product details by item name WITHOUT using a GSI."""
+    def get_product_name(self, item, projection=()):
+        """Fetches product details (or only the `projection` attributes) by item name WITHOUT using a GSI."""
         try:
-            response = self.padeliver_table.scan(
-                FilterExpression=Attr('item').eq(item)
+            response = guarded_call(
+                'padeliver.scan', self.padeliver_table.scan,
+                FilterExpression=Attr('item').eq(item),
+                **projection_kwargs(*projection)
             )
             items = response.get('Items', [])
             return items[0] if items else None
         except Exception as e:
+            if is_degraded(e):
+                raise
             print(f"❌ Error fetching item: {e}")
             return None
 
     def view_product(self, product_id):
-        """Fetches product details by product_id and its inventory if available."""
+        """Fetches product details by product_id and its inventory if available.
+
+        Unavailable tables (open circuit, throttling, timeouts) raise instead of returning 500,
+        so callers can serve the product from stale data.
+        """
         if not product_id:
             return {"statusCode": 400, "body": json.dumps({"message": "Invalid product_id"})}
 
         try:
-            response = self.padeliver_table.get_item(Key={'product_id': product_id})
+            response = hedged_read('padeliver.get_item', self.padeliver_table.get_item, Key={'product_id': product_id})
             if 'Item' in response:
                 product = response['Item']
-                inventory_response = self.inventory_table.query(
-                    KeyConditionExpression=Key('product_id').eq(product_id)
+                inventory_response = hedged_read(
+                    'inventory.query', self.inventory_table.query,
+                    KeyConditionExpression=Key('product_id').eq(product_id),
+                    ProjectionExpression="quantity"
                 )
                 items = inventory_response.get("Items", [])
                 total_quantity = sum(Decimal(item['quantity']) for item in items) if items else Decimal(0)
@@ -115,6 +184,8 @@ class AWSGateway:
             else:
                 return {"statusCode": 404, "body": json.dumps({"message": "Product not found"})}
         except Exception as e:
+            if is_degraded(e):
+                raise
             print(f"❌ Error fetching product: {e}")
             return {"statusCode": 500, "body": json.dumps({"message": f"Error fetching product: {str(e)}"})}
     def decimal_default(self, obj):
@@ -130,25 +201,201 @@ class AWSGateway:
             print(f"❌ Error adding inventory item: {e}")
             raise
 
+    def add_inventory_items(self, inventory_items):
+        """Batch write ledger rows within the bulk write budget, reporting per-row results."""
+        return self.inventory_writer.put_items(inventory_items)
+
+    def add_inventory_items_once(self, inventory_items):
+        """Write ledger rows only if absent, within the bulk write budget.
+
+        Returns {"written": [keys], "existing": [keys], "failed": [{"key", "error"}]}; rows with
+        deterministic keys that an earlier attempt already wrote come back as "existing", so
+        callers adjust stock for the "written" rows only.
+        """
+        def write(item):
+            key = {"product_id": item["product_id"], "datetime": item["datetime"]}
+            self.inventory_writer.bucket.acquire(estimate_write_units(item))
+            try:
+                self.inventory_table.put_item(Item=item, ConditionExpression="attribute_not_exists(product_id)")
+                return "written", key
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                    return "existing", key
+                return "failed", {"key": key, "error": str(e)}
+            except Exception as e:
+                return "failed", {"key": key, "error": str(e)}
+
+        results = {"written": [], "existing": [], "failed": []}
+        if not inventory_items:
+            return results
+        with ThreadPoolExecutor(max_workers=min(BULK_MAX_WORKERS, len(inventory_items))) as executor:
+            for status, result in executor.map(write, inventory_items):
+                results[status].append(result)
+        return results
+
+    def adjust_stock_totals(self, deltas):
+        """Apply quantity deltas ({product_id: delta}) to the materialized stock of each product.
+
+        Hot products are spread over write shards by the StockCounter. Updates run
+        concurrently; returns a list of {"product_id", "error"} for deltas that failed.
+        """
+        def adjust(product_id, delta):
+            try:
+                self.stock_counter.adjust(product_id, delta)
+                return None
+            except Exception as e:
+                logger.error(f"Error adjusting stock total of {product_id} by {delta}: {e}")
+                return {"product_id": product_id, "error": str(e)}
+
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return []
+        with ThreadPoolExecutor(max_workers=min(BULK_MAX_WORKERS, len(deltas))) as executor:
+            results = executor.map(lambda entry: adjust(*entry), deltas.items())
+            return [failure for failure in results if failure]
+
+    def write_ledger_rows_once(self, rows):
+        """Write ledger rows and ADD their quantities to the materialized stock in one transaction.
+
+        Rows are only written if absent, so a repeated call finds them and changes nothing; the
+        stock is adjusted exactly when the rows are written. Returns True if written now, False
+        if a previous call already did. Products throttled or contended in the transaction are
+        moved to sharded counting and the transaction retried; products whose record no longer
+        exists get their rows without a stock update. At most LEDGER_ROWS_PER_TRANSACTION rows.
+        """
+        client = self.dynamodb.meta.client
+        deltas = {}
+        for row in rows:
+            deltas[row["product_id"]] = deltas.get(row["product_id"], Decimal(0)) + Decimal(row["quantity"])
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        puts = [
+            {"Put": {"TableName": self.inventory_table.name, "Item": row, "ConditionExpression": "attribute_not_exists(product_id)"}}
+            for row in rows
+        ]
+
+        for attempt in range(LEDGER_TRANSACTION_ATTEMPTS):
+            product_ids = list(deltas)
+            try:
+                client.transact_write_items(
+                    TransactItems=puts + [self.stock_counter.update_action(product_id, deltas[product_id]) for product_id in product_ids]
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                    raise
+                reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+                if "ConditionalCheckFailed" in reasons[:len(puts)]:
+                    return False
+                for product_id, reason in zip(product_ids, reasons[len(puts):]):
+                    if reason == "ConditionalCheckFailed":
+                        logger.warning(f"Product {product_id} no longer exists; ledger rows written without a stock update")
+                        deltas.pop(product_id)
+                    elif reason in CONTENTION_REASONS:
+                        self.stock_counter.shard_hot(product_id)
+                if attempt == LEDGER_TRANSACTION_ATTEMPTS - 1:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            for product_id in product_ids:
+                self.stock_counter.invalidate(product_id)
+            return True
+
+    def get_stock_total(self, product_id):
+        """Materialized stock of a product, aggregated over its shards when it is sharded."""
+        return self.stock_counter.get_total(product_id)
+
+    def backfill_stock_totals(self, should_continue=lambda: True, settle_seconds=SETTLE_SECONDS):
+        """Seed the materialized stock of products that predate it from their ledger.
+
+        Products without the `stock_backfilled` marker get the difference between their
+        ledger sum and their stored total ADDed, together with the marker, once. The two are
+        read non-atomically, so each page is read twice, settle_seconds apart, and only a
+        difference seen both times is applied; the rest are counted "unsettled" and left to
+        the next run. Returns {"backfilled", "unsettled", "failed", "complete"}; re-run until
+        complete.
+        """
+        scan_kwargs = {
+            "FilterExpression": Attr("stock_backfilled").not_exists(),
+            "ProjectionExpression": "product_id",
+        }
+        summary = {"backfilled": 0, "unsettled": 0, "failed": 0, "complete": False}
+
+        def difference(product_id):
+            try:
+                stored = self.stock_counter.get_total(product_id, use_cache=False)
+                return Decimal(self.get_product_stock(product_id)) - Decimal(stored)
+            except Exception as e:
+                logger.error(f"Error reading stock of {product_id} for backfill: {e}")
+                return None
+
+        def backfill(entry):
+            product_id, first = entry
+            second = difference(product_id)
+            if first is None or second is None:
+                return "failed"
+            if first != second:
+                return "unsettled"
+            try:
+                self.stock_counter.backfill(product_id, second)
+                return "backfilled"
+            except Exception as e:
+                logger.error(f"Error backfilling stock total of {product_id}: {e}")
+                return "failed"
+
+        with ThreadPoolExecutor(max_workers=BULK_MAX_WORKERS) as executor:
+            while should_continue():
+                response = self.padeliver_table.scan(**scan_kwargs)
+                product_ids = [item["product_id"] for item in response.get("Items", [])]
+                if product_ids:
+                    first = list(executor.map(difference, product_ids))
+                    time.sleep(settle_seconds)
+                    for outcome in executor.map(backfill, zip(product_ids, first)):
+                        summary[outcome] += 1
+                if "LastEvaluatedKey" not in response:
+                    summary["complete"] = True
+                    break
+                scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        logger.info(f"Stock total backfill: {summary}")
+        return summary
+
     def product_exists(self, product_id):
         """Checks if a product exists in the padeliver table."""
         try:
-            response = self.padeliver_table.get_item(Key={'product_id': product_id})
+            response = hedged_read(
+                'padeliver.get_item', self.padeliver_table.get_item,
+                Key={'product_id': product_id}, ProjectionExpression='product_id'
+            )
             return 'Item' in response
         except Exception as e:
+            if is_degraded(e):
+                raise
             print(f"❌ Error checking if product exists: {e}")
             return False
 
-    def scan_padeliver_products(self):
-        """Retrieve all products from the PADELIVER_PRODUCTS_TABLE."""
-        response = self.padeliver_table.scan()
+    def scan_padeliver_products(self, projection=()):
+        """Retrieve all products (or only the `projection` attributes) from the PADELIVER_PRODUCTS_TABLE."""
+        response = guarded_call('padeliver.scan', self.padeliver_table.scan, **projection_kwargs(*projection))
         return response.get("Items", [])
 
-    def get_product_inventory(self, product_id):
-        """Fetch inventory records for a product and calculate total stock."""
-        response = self.inventory_table.query(
+    def scan_all_padeliver_products(self, projection=()):
+        """Retrieve every product (or only the `projection` attributes) of the PADELIVER_PRODUCTS_TABLE, following pagination."""
+        scan_kwargs = projection_kwargs(*projection)
+        products = []
+        while True:
+            response = guarded_call('padeliver.scan', self.padeliver_table.scan, **scan_kwargs)
+            products.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return products
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get_product_inventory(self, product_id, projection=()):
+        """Fetch inventory records (or only the `projection` attributes) for a product and calculate total stock."""
+        if projection and "quantity" not in projection:
+            projection = tuple(projection) + ("quantity",)
+        response = hedged_read(
+            'inventory.query', self.inventory_table.query,
             KeyConditionExpression="product_id = :product_id",
-            ExpressionAttributeValues={":product_id": product_id}
+            ExpressionAttributeValues={":product_id": product_id},
+            **projection_kwargs(*projection)
         )
         items = response.get("Items", [])
         total_quantity = sum(Decimal(item.get("quantity", 0)) for item in items)
@@ -158,18 +405,30 @@ class AWSGateway:
         }
 
     def add_product(self, product):
-        """Insert a new product into the Pa-deliver products table."""
+        """Insert a new product into the Pa-deliver products table; returns False if its product_id is taken."""
         try:
-            self.padeliver_table.put_item(Item=product)
+            self.padeliver_table.put_item(
+                Item=self.catalog_sync.stamp({"version": 1, **product}),
+                ConditionExpression="attribute_not_exists(product_id)"
+            )
             logger.info(f"Product added successfully: {product['product_id']}")
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return False
+            logger.error(f"Error adding product {product['product_id']}: {e}")
+            raise
         except Exception as e:
             logger.error(f"Error adding product {product['product_id']}: {e}")
             raise
 
     def delete_product(self, product_id):
-        """Delete a product from the Pa-deliver products table."""
+        """Delete a product and write its sync tombstone in one transaction."""
         try:
-            self.padeliver_table.delete_item(Key={"product_id": product_id})
+            self.dynamodb.meta.client.transact_write_items(TransactItems=[
+                {"Delete": {"TableName": self.padeliver_table.name, "Key": {"product_id": product_id}}},
+                {"Put": {"TableName": self.catalog_sync.tombstones_table.name, "Item": self.catalog_sync.tombstone(product_id)}},
+            ])
             logger.info(f"Product deleted successfully: {product_id}")
         except Exception as e:
             logger.error(f"Error deleting product {product_id}: {e}")
@@ -189,19 +448,238 @@ class AWSGateway:
             logger.error(f"Error deleting inventory item: product_id={product_id}, datetime={datetime}, error={e}")
             raise
 
-    def update_product(self, product_id, update_expression, expression_attribute_values):
-        """Update a product in the Pa-deliver products table."""
+    def update_product(self, product_id, updates):
+        """SET the given attributes of an existing product, stamping a new sync version."""
         try:
             self.padeliver_table.update_item(
                 Key={"product_id": product_id},
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_attribute_values
+                **set_update_kwargs({**updates, **new_sync_stamp(product_id)}, key_attribute="product_id", version_attribute="version")
             )
             logger.info(f"Product updated successfully: {product_id}")
         except Exception as e:
             logger.error(f"Error updating product {product_id}: {e}")
             raise
 
+    def edit_product(self, product_id, updates, expected_version=None):
+        """Apply a partial product edit in a single conditional UpdateItem.
+
+        Only the given attributes are SET; the product must exist and, when expected_version is
+        given, still be at that version. Returns {"status": "updated"|"not_found"|"conflict", "product"}.
+        """
+        updates = {**updates, **new_sync_stamp(product_id)}
+        try:
+            response = self.padeliver_table.update_item(
+                Key={"product_id": product_id},
+                ReturnValues="ALL_NEW",
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                **set_update_kwargs(updates, key_attribute="product_id", version_attribute="version", expected_version=expected_version)
+            )
+            logger.info(f"Product {product_id} updated: {sorted(updates)}")
+            return {"status": "updated", "product": response["Attributes"]}
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                logger.error(f"Error updating product {product_id}: {e}")
+                raise
+            current = e.response.get("Item")
+            return {"status": "conflict" if current else "not_found", "product": current}
+
+    def rename_product(self, old_product_id, new_product_id, updates, expected_version=None):
+        """Move a product to a new product_id with edits applied, atomically and without clobbering.
+
+        The new record is created only if that id is free and the old one is deleted only if it
+        is unchanged since it was read; the old id's sync tombstone is written in the same
+        transaction. Ledger rows are moved afterwards by the caller.
+        Returns {"status": "updated"|"not_found"|"conflict"|"exists", "product"}.
+        """
+        response = self.padeliver_table.get_item(Key={"product_id": old_product_id}, ConsistentRead=True)
+        product = response.get("Item")
+        if not product:
+            return {"status": "not_found", "product": None}
+        current_version = int(product.get("version", 0))
+        if expected_version is not None and int(expected_version) != current_version:
+            return {"status": "conflict", "product": product}
+
+        moved = self.catalog_sync.stamp({**product, **updates, "product_id": new_product_id, "version": current_version + 1})
+        moved.pop("total_quantity", None)
+        if moved.pop("stock_shards", None):
+            moved["stock_total"] = self.stock_counter.get_total(old_product_id, use_cache=False)  # shards stay keyed by the old id
+        delete_condition = {"ConditionExpression": "attribute_not_exists(version)"} if current_version == 0 else {
+            "ConditionExpression": "version = :version",
+            "ExpressionAttributeValues": {":version": current_version},
+        }
+        try:
+            self.dynamodb.meta.client.transact_write_items(TransactItems=[
+                {"Put": {
+                    "TableName": self.padeliver_table.name,
+                    "Item": moved,
+                    "ConditionExpression": "attribute_not_exists(product_id)",
+                }},
+                {"Delete": {
+                    "TableName": self.padeliver_table.name,
+                    "Key": {"product_id": old_product_id},
+                    **delete_condition,
+                }},
+                {"Put": {"TableName": self.catalog_sync.tombstones_table.name, "Item": self.catalog_sync.tombstone(old_product_id)}},
+            ])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+            reasons = [reason.get("Code") for reason in e.response.get("CancellationReasons", [])]
+            if reasons and reasons[0] == "ConditionalCheckFailed":
+                return {"status": "exists", "product": None}
+            return {"status": "conflict", "product": product}
+        logger.info(f"Product {old_product_id} moved to {new_product_id}")
+        return {"status": "updated", "product": moved}
+
+    def get_product_stock(self, product_id):
+        """Sum the ledger quantities of a product, following pagination."""
+        query_kwargs = {
+            "KeyConditionExpression": Key('product_id').eq(product_id),
+            "ProjectionExpression": "quantity",
+        }
+        total_quantity = Decimal(0)
+        while True:
+            response = hedged_read('inventory.query', self.inventory_table.query, **query_kwargs)
+            total_quantity += sum(Decimal(item.get("quantity", 0)) for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return int(total_quantity)
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get_stock_as_of(self, product_id, as_of):
+        """Sum the ledger movements of a product up to and including `as_of` with a range query."""
+        query_kwargs = {
+            "KeyConditionExpression": Key('product_id').eq(product_id) & Key('datetime').lte(ledger_keys.range_end(as_of)),
+            "ProjectionExpression": "quantity",
+        }
+        total_quantity = Decimal(0)
+        while True:
+            response = hedged_read('inventory.query', self.inventory_table.query, **query_kwargs)
+            total_quantity += sum(Decimal(item.get("quantity", 0)) for item in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return int(total_quantity)
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get_inventory_movements(self, product_id, start, end):
+        """Fetch the ledger movements of a product between two datetimes (inclusive), oldest first."""
+        query_kwargs = {
+            "KeyConditionExpression": Key('product_id').eq(product_id)
+            & Key('datetime').between(ledger_keys.range_start(start), ledger_keys.range_end(end)),
+        }
+        movements = []
+        while True:
+            response = hedged_read('inventory.query', self.inventory_table.query, **query_kwargs)
+            movements.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return movements
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def migrate_ledger_keys(self, start_key=None, should_continue=lambda: True):
+        """Rewrite legacy ledger rows under the uniform UTC key format.
+
+        Each legacy row is copied to its migrated key (keeping the old value in
+        `legacy_datetime`) before the original is deleted. Migrated keys are deterministic,
+        so an interrupted run can be resumed from the returned `last_evaluated_key`.
+        """
+        scan_kwargs = {"ExclusiveStartKey": start_key} if start_key else {}
+        migrated = 0
+        failed = []
+        while True:
+            response = self.inventory_table.scan(**scan_kwargs)
+            legacy_items = [item for item in response.get("Items", []) if not ledger_keys.is_current_key(item["datetime"])]
+            if legacy_items:
+                new_items = [
+                    dict(item, datetime=ledger_keys.migrated_ledger_key(item["datetime"]), legacy_datetime=item["datetime"])
+                    for item in legacy_items
+                ]
+                put_results = self.inventory_writer.put_items(new_items)
+                copied = {(key["product_id"], key["datetime"]) for key in put_results["succeeded"]}
+                old_keys = [
+                    {"product_id": item["product_id"], "datetime": item["legacy_datetime"]}
+                    for item in new_items if (item["product_id"], item["datetime"]) in copied
+                ]
+                delete_results = self.inventory_writer.delete_keys(old_keys)
+                migrated += len(delete_results["succeeded"])
+                failed.extend(put_results["failed"] + delete_results["failed"])
+
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key or not should_continue():
+                logger.info(f"Migrated {migrated} ledger rows; {len(failed)} failures.")
+                return {"migrated": migrated, "failed": failed, "last_evaluated_key": last_evaluated_key}
+            scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+    def _batch_get_product_chunk(self, product_ids, projection=BATCH_GET_PROJECTION):
+        """Run one BatchGetItem request, retrying UnprocessedKeys with jittered backoff."""
+        client = self.dynamodb.meta.client
+        table_name = self.padeliver_table.name
+        request_items = {
+            table_name: {
+                "Keys": [{"product_id": product_id} for product_id in product_ids],
+                **projection_kwargs(*projection),
+            }
+        }
+        items = []
+        attempt = 0
+        while request_items:
+            response = hedged_read('padeliver.batch_get_item', client.batch_get_item, RequestItems=request_items)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request_items = response.get("UnprocessedKeys") or {}
+            if request_items:
+                attempt += 1
+                if attempt > BATCH_GET_MAX_RETRIES:
+                    raise RuntimeError(f"BatchGetItem left keys unprocessed after {BATCH_GET_MAX_RETRIES} retries")
+                time.sleep(backoff_delay(attempt))
+        return items
+
+    def batch_get_products(self, product_ids, include_stock=True, projection=BATCH_GET_PROJECTION):
+        """Resolve many products by product_id with chunked, concurrent BatchGetItem calls.
+
+        Returns a dict keyed by product_id; ids that do not exist are simply absent.
+        When include_stock is set, each product also carries its current ledger `stock`.
+        An empty projection returns whole products.
+        """
+        unique_ids = list(dict.fromkeys(product_id for product_id in product_ids if product_id))
+        if not unique_ids:
+            return {}
+
+        products = {}
+        chunks = list(chunked(unique_ids, BATCH_GET_CHUNK_SIZE))
+        with ThreadPoolExecutor(max_workers=min(BULK_MAX_WORKERS, len(chunks))) as executor:
+            for items in executor.map(lambda chunk: self._batch_get_product_chunk(chunk, projection), chunks):
+                for item in items:
+                    products[item["product_id"]] = item
+
+        if include_stock and products:
+            found_ids = list(products)
+            with ThreadPoolExecutor(max_workers=min(BULK_MAX_WORKERS, len(found_ids))) as executor:
+                for product_id, stock in zip(found_ids, executor.map(self.get_product_stock, found_ids)):
+                    products[product_id]["stock"] = stock
+
+        logger.info(f"Bulk resolved {len(products)} of {len(unique_ids)} requested products.")
+        return products
+
+    def iter_table(self, table, **scan_kwargs):
+        """Yield the items of a table one page at a time, so callers never hold the whole table."""
+        while True:
+            response = table.scan(**scan_kwargs)
+            yield from response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def iter_products_with_stock(self):
+        """Yield Pa-deliver products with their ledger stock, resolving each scan page concurrently."""
+        scan_kwargs = {}
+        with ThreadPoolExecutor(max_workers=BULK_MAX_WORKERS) as executor:
+            while True:
+                response = self.padeliver_table.scan(**scan_kwargs)
+                products = response.get("Items", [])
+                for product, stock in zip(products, executor.map(lambda product: self.get_product_stock(product["product_id"]), products)):
+                    product["stock"] = stock
+                    yield product
+                if "LastEvaluatedKey" not in response:
+                    return
+                scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
     def get_all_inventory(self):
         """Retrieve all inventory records from the inventory table."""
         try:
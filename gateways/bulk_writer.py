@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from utils.batching import chunked, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+BATCH_WRITE_CHUNK_SIZE = 25  # DynamoDB BatchWriteItem limit per request
+THROTTLE_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+DEFAULT_WRITE_CAPACITY_UNITS = float(os.getenv("BULK_WRITE_CAPACITY_UNITS", "25"))
+DEFAULT_MAX_WORKERS = int(os.getenv("BULK_WRITE_MAX_WORKERS", "4"))
+DEFAULT_MAX_RETRIES = int(os.getenv("BULK_WRITE_MAX_RETRIES", "8"))
+
+class TokenBucket:
+    """Thread-safe token bucket whose refill rate can be adjusted while in use."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` can be charged and take them.
+
+        A cost above the capacity waits for a full bucket and is then charged in full,
+        leaving the balance negative; later callers wait until that debt is repaid, so
+        the average rate holds for any batch size.
+        """
+        tokens = float(tokens)
+        threshold = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= threshold:
+                    self.tokens -= tokens
+                    return
+                wait = (threshold - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens=1):
+        """Charge `tokens` if possible without blocking; returns 0, or the seconds until it would be."""
+        tokens = float(tokens)
+        threshold = min(tokens, self.capacity)
+        with self.lock:
+            self._refill()
+            if self.tokens >= threshold:
+                self.tokens -= tokens
+                return 0.0
+            return (threshold - self.tokens) / self.rate
+
+    def wait_time(self, tokens=1):
+        """Seconds until `tokens` could be charged (0 if now), without charging them."""
+        threshold = min(float(tokens), self.capacity)
+        with self.lock:
+            self._refill()
+            return max(0.0, (threshold - self.tokens) / self.rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = float(rate)
+
+def estimate_write_units(item):
+    """Approximate the WCUs a put consumes (1 WCU per started KB of item data)."""
+    size = len(json.dumps(item, default=str).encode("utf-8"))
+    return size // 1024 + 1
+
+class BulkWriter:
+    """Rate-limited, throttle-aware BatchWriteItem submitter for a single table.
+
+    Writes are spent against a token-bucket budget of write capacity units per second.
+    Throttling halves the budget (down to a floor) and clean batches grow it back
+    towards the configured ceiling, so bulk jobs use spare capacity without starving
+    live traffic on the same table.
+    """
+
+    def __init__(self, table, key_attributes, write_capacity_units=None, max_workers=None, max_retries=None):
+        self.client = table.meta.client  # resource client: accepts and returns native Python types
+        self.table_name = table.name
+        self.key_attributes = list(key_attributes)
+        self.max_rate = float(write_capacity_units or DEFAULT_WRITE_CAPACITY_UNITS)
+        self.min_rate = max(1.0, self.max_rate * 0.05)
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.bucket = TokenBucket(self.max_rate)
+        self.rate_lock = threading.Lock()
+
+    def put_items(self, items):
+        """Put items; returns {"succeeded": [keys], "failed": [{"key", "error"}]}."""
+        requests = [{"PutRequest": {"Item": item}} for item in items]
+        return self._write(requests)
+
+    def delete_keys(self, keys):
+        """Delete items by key; returns {"succeeded": [keys], "failed": [{"key", "error"}]}."""
+        requests = [{"DeleteRequest": {"Key": key}} for key in keys]
+        return self._write(requests)
+
+    def _request_key(self, request):
+        if "PutRequest" in request:
+            item = request["PutRequest"]["Item"]
+        else:
+            item = request["DeleteRequest"]["Key"]
+        return {attribute: item.get(attribute) for attribute in self.key_attributes}
+
+    def _key_tuple(self, request):
+        return tuple(str(value) for value in self._request_key(request).values())
+
+    def _request_cost(self, request):
+        if "PutRequest" in request:
+            return estimate_write_units(request["PutRequest"]["Item"])
+        return 1
+
+    def _on_throttle(self):
+        with self.rate_lock:
+            new_rate = max(self.min_rate, self.bucket.rate * 0.5)
+            self.bucket.set_rate(new_rate)
+        logger.warning(f"Write throttled on {self.table_name}; write budget lowered to {new_rate:.1f} WCU/s")
+
+    def _on_success(self):
+        with self.rate_lock:
+            if self.bucket.rate < self.max_rate:
+                self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate * 0.05))
+
+    def _write(self, requests):
+        # BatchWriteItem rejects duplicate keys in one call; the last write for a key wins.
+        deduplicated = {}
+        for request in requests:
+            deduplicated[self._key_tuple(request)] = request
+        chunks = list(chunked(deduplicated.values(), BATCH_WRITE_CHUNK_SIZE))
+
+        results = {"succeeded": [], "failed": []}
+        if not chunks:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+            for chunk_result in executor.map(self._submit_batch, chunks):
+                results["succeeded"].extend(chunk_result["succeeded"])
+                results["failed"].extend(chunk_result["failed"])
+
+        logger.info(
+            f"Bulk write to {self.table_name}: {len(results['succeeded'])} succeeded, "
+            f"{len(results['failed'])} failed."
+        )
+        return results
+
+    def _submit_batch(self, requests):
+        """Submit one batch, retrying throttles and unprocessed items with backoff."""
+        results = {"succeeded": [], "failed": []}
+        pending = requests
+        attempt = 0
+        while pending:
+            self.bucket.acquire(sum(self._request_cost(request) for request in pending))
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: pending})
+            except ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code")
+                if error_code in THROTTLE_ERROR_CODES and attempt < self.max_retries:
+                    self._on_throttle()
+                    attempt += 1
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                results["failed"].extend({"key": self._request_key(request), "error": str(e)} for request in pending)
+                return results
+
+            unprocessed = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            unprocessed_keys = {self._key_tuple(request) for request in unprocessed}
+            results["succeeded"].extend(
+                self._request_key(request) for request in pending if self._key_tuple(request) not in unprocessed_keys
+            )
+
+            if not unprocessed:
+                self._on_success()
+                return results
+
+            self._on_throttle()
+            attempt += 1
+            if attempt > self.max_retries:
+                results["failed"].extend(
+                    {"key": self._request_key(request), "error": "Unprocessed after retries"} for request in unprocessed
+                )
+                return results
+            time.sleep(backoff_delay(attempt))
+            pending = unprocessed
+
+        return results
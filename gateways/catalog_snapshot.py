@@ -0,0 +1,182 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from botocore.exceptions import ClientError #type: ignore
+from gateways.catalog_sync import SYNC_SETTLE_SECONDS
+from utils.aws_clients import get_client
+from utils import ledger_keys
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "catalog_snapshots/"
+LATEST_KEY = SNAPSHOT_PREFIX + "latest.json"
+SNAPSHOT_NAMES = ("products", "names", "stock")
+POINTER_CACHE_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_POINTER_CACHE_SECONDS", "5"))
+STOCK_MAX_AGE_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_STOCK_MAX_AGE_SECONDS", "300"))
+REDIRECT_EXPIRES_SECONDS = 300
+STOCK_ATTRIBUTES = {"stock_total", "stock_shards", "stock_backfilled"}
+
+def snapshot_default(obj):
+    """Serialize Decimals the way the catalog handlers do: int when whole, float otherwise."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError
+
+def is_catalog_change(record):
+    """True when a Pa-deliver products stream record touches more than the stock counters."""
+    if record["eventName"] != "MODIFY":
+        return True
+    old_image = record["dynamodb"].get("OldImage") or {}
+    new_image = record["dynamodb"].get("NewImage") or {}
+    changed = {name for name in set(old_image) | set(new_image) if old_image.get(name) != new_image.get(name)}
+    return bool(changed - STOCK_ATTRIBUTES)
+
+class CatalogSnapshot:
+    """Versioned, gzip-compressed JSON snapshots of the Pa-deliver catalog in S3.
+
+    catalog_snapshots/<version>/products.json.gz   the product records as returned by the catalog scan
+    catalog_snapshots/<version>/names.json.gz      [{"id", "name"}] as returned by get_product_names
+    catalog_snapshots/<version>/stock.json.gz      {product_id: materialized stock}
+    catalog_snapshots/latest.json                  pointer to the current version
+
+    Snapshots are immutable; a regeneration writes a new version and then swaps the pointer,
+    so readers never see a half-written catalog.
+    """
+
+    def __init__(self, aws_gateway, bucket_name=None):
+        self.aws_gateway = aws_gateway
+        self.s3 = get_client('s3')
+        self.bucket_name = bucket_name or os.getenv('S3_BUCKET_NAME')
+        self.pointer = None
+        self.pointer_loaded_at = 0.0
+        self.bodies = {}  # (version, name) -> JSON text of the current version only
+        self.index = (None, {})  # (version, {product_id: product with its snapshot stock})
+        self.lock = threading.Lock()
+
+    def _object_key(self, version, name):
+        return f"{SNAPSHOT_PREFIX}{version}/{name}.json.gz"
+
+    def latest(self):
+        """The current snapshot pointer, or None before the first regeneration; cached briefly."""
+        with self.lock:
+            if time.monotonic() - self.pointer_loaded_at < POINTER_CACHE_SECONDS:
+                return self.pointer
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=LATEST_KEY)
+            pointer = json.loads(response["Body"].read())
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            pointer = None
+        with self.lock:
+            self.pointer = pointer
+            self.pointer_loaded_at = time.monotonic()
+        return pointer
+
+    def load(self, name):
+        """JSON text of one snapshot of the current version, or None if there is no snapshot yet."""
+        pointer = self.latest()
+        if not pointer:
+            return None
+        cache_key = (pointer["version"], name)
+        with self.lock:
+            if cache_key in self.bodies:
+                return self.bodies[cache_key]
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=pointer["keys"][name])
+        body = gzip.decompress(response["Body"].read()).decode("utf-8")
+        with self.lock:
+            self.bodies = {key: value for key, value in self.bodies.items() if key[0] == pointer["version"]}
+            self.bodies[cache_key] = body
+        return body
+
+    def product(self, product_id):
+        """One product of the current snapshot with its snapshot stock, or None; the index is built once per version."""
+        pointer = self.latest()
+        if not pointer:
+            return None
+        with self.lock:
+            version, products = self.index
+        if version != pointer["version"]:
+            stock = json.loads(self.load("stock"))
+            products = {
+                product["product_id"]: {**product, "total_quantity": stock.get(product["product_id"], 0)}
+                for product in json.loads(self.load("products"))
+            }
+            with self.lock:
+                self.index = (pointer["version"], products)
+        return products.get(product_id)
+
+    def redirect_url(self, name):
+        """Presigned URL of one snapshot of the current version, or None if there is no snapshot yet."""
+        pointer = self.latest()
+        if not pointer:
+            return None
+        return self.s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket_name, "Key": pointer["keys"][name]},
+            ExpiresIn=REDIRECT_EXPIRES_SECONDS
+        )
+
+    def stock_age_seconds(self):
+        """Seconds since the current snapshot was generated, or None if there is none."""
+        pointer = self.latest()
+        if not pointer:
+            return None
+        generated_at = datetime.fromisoformat(pointer["generated_at"])
+        return (datetime.now(timezone.utc) - generated_at).total_seconds()
+
+    def regenerate(self):
+        """Scan the catalog once, write a new snapshot version and point latest.json at it."""
+        scan_started = datetime.now(timezone.utc)
+        products = self.aws_gateway.scan_all_padeliver_products()
+        names = [{"id": product["product_id"], "name": product["item"]} for product in products if "item" in product]
+        stock = {
+            product["product_id"]: (
+                self.aws_gateway.get_stock_total(product["product_id"]) if product.get("stock_shards")
+                else int(product.get("stock_total", 0))
+            )
+            for product in products
+        }
+
+        generated_at = datetime.now(timezone.utc)
+        version = f"{generated_at.strftime('%Y%m%dT%H%M%S%fZ')}-{uuid.uuid4().hex[:6]}"
+        keys = {}
+        for name, content in zip(SNAPSHOT_NAMES, (products, names, stock)):
+            keys[name] = self._object_key(version, name)
+            self.s3.put_object(
+                Bucket=self.bucket_name,
+                Key=keys[name],
+                Body=gzip.compress(json.dumps(content, default=snapshot_default).encode("utf-8")),
+                ContentType="application/json",
+                ContentEncoding="gzip",
+                CacheControl="public, max-age=31536000, immutable"
+            )
+
+        pointer = {
+            "version": version,
+            "generated_at": generated_at.isoformat(),
+            "product_count": len(products),
+            # Clients bootstrapping from the snapshot continue delta sync from here; changes
+            # racing the scan are replayed, which is harmless since sync is idempotent
+            "sync_version": ledger_keys.range_start(scan_started - timedelta(seconds=SYNC_SETTLE_SECONDS)),
+            "keys": keys,
+        }
+        self.s3.put_object(
+            Bucket=self.bucket_name,
+            Key=LATEST_KEY,
+            Body=json.dumps(pointer),
+            ContentType="application/json",
+            CacheControl="no-cache"
+        )
+        with self.lock:
+            self.pointer = pointer
+            self.pointer_loaded_at = time.monotonic()
+        logger.info(f"Catalog snapshot {version} written with {len(products)} products")
+        return pointer
@@ -0,0 +1,143 @@
+import os
+import time
+import zlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from boto3.dynamodb.conditions import Key
+from gateways.bulk_writer import BulkWriter
+from utils.aws_clients import get_resource, hedged_read
+from utils import ledger_keys
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEGACY_SYNC_BUCKET = "CATALOG"  # single bucket of items stamped before the feed was sharded
+SYNC_BUCKETS = int(os.getenv("CATALOG_SYNC_BUCKETS", "8"))
+SYNC_INDEX = os.getenv("CATALOG_SYNC_INDEX", "sync_version_index")  # sync_bucket (HASH) + sync_version (RANGE), KEYS_ONLY
+SYNC_SETTLE_SECONDS = float(os.getenv("CATALOG_SYNC_SETTLE_SECONDS", "5"))
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("CATALOG_TOMBSTONE_RETENTION_DAYS", "30"))
+MAX_CHANGES_PER_PAGE = 1000
+
+def sync_bucket(product_id):
+    """Feed partition of a product: a stable hash over SYNC_BUCKETS."""
+    return f"CATALOG#{zlib.crc32(product_id.encode('utf-8')) % SYNC_BUCKETS}"
+
+def all_sync_buckets():
+    return [LEGACY_SYNC_BUCKET] + [f"CATALOG#{bucket}" for bucket in range(SYNC_BUCKETS)]
+
+def new_sync_stamp(product_id):
+    """Attributes that version a catalog write: its feed bucket, a time-ordered, unique sync_version and updated_at."""
+    moment = datetime.now(timezone.utc)
+    return {
+        "sync_bucket": sync_bucket(product_id),
+        "sync_version": ledger_keys.new_ledger_key(moment),
+        "updated_at": moment.isoformat(),
+    }
+
+class CatalogSync:
+    """Change feed of the Pa-deliver catalog for incremental client sync.
+
+    Every product write carries a sync_version (same sortable format as ledger keys) and is
+    indexed by SYNC_INDEX on the products table. Deletes leave a tombstone with the same
+    stamp in the tombstones table, expiring after CATALOG_TOMBSTONE_RETENTION_DAYS; clients
+    older than that must resync fully.
+
+    Both are spread over CATALOG_SYNC_BUCKETS hash keys by product_id, and every bucket is
+    queried and merged, so catalog writes do not all land on one index partition. The index
+    projects keys only: stock ADDs never rewrite it, and changed products are read from the
+    table with fetch_products (product_ids -> {product_id: product}). Changing the bucket
+    count only takes effect for products as they are next written.
+
+    Versions come from the writers' clocks, so a change only becomes visible once it is older
+    than CATALOG_SYNC_SETTLE_SECONDS. That horizon covers clock skew between containers and
+    index propagation, so a client advancing to the returned version never misses a change.
+    """
+
+    def __init__(self, products_table, fetch_products, tombstones_table=None):
+        self.products_table = products_table
+        self.fetch_products = fetch_products
+        self.tombstones_table = tombstones_table or get_resource('dynamodb').Table(os.getenv('CATALOG_TOMBSTONES_TABLE'))
+        self.tombstones_writer = BulkWriter(self.tombstones_table, ['sync_bucket', 'sync_version'])
+
+    def stamp(self, product):
+        """Return a copy of a product with a fresh sync stamp."""
+        return {**product, **new_sync_stamp(product["product_id"])}
+
+    def tombstone(self, product_id):
+        """Tombstone item recording that a product was deleted now."""
+        expires_at = int(time.time()) + TOMBSTONE_RETENTION_DAYS * 86400
+        return {**new_sync_stamp(product_id), "product_id": product_id, "deleted": True, "expires_at": expires_at}
+
+    def record_deletions(self, product_ids):
+        """Write a tombstone for each deleted product; returns the BulkWriter results."""
+        return self.tombstones_writer.put_items([self.tombstone(product_id) for product_id in product_ids])
+
+    def _query_since(self, query, bucket, since, horizon, limit, **index_kwargs):
+        items = []
+        query_kwargs = {
+            "KeyConditionExpression": Key("sync_bucket").eq(bucket) & Key("sync_version").between(since, horizon),
+            "Limit": limit,
+            **index_kwargs,
+        }
+        while len(items) < limit:
+            response = query(**query_kwargs)
+            items.extend(item for item in response.get("Items", []) if item["sync_version"] > since)
+            if "LastEvaluatedKey" not in response:
+                break
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        return items[:limit]
+
+    def changes_since(self, since=None, limit=MAX_CHANGES_PER_PAGE):
+        """Products changed and deleted after `since`, oldest first.
+
+        Returns {"changed": [product, ...], "deleted": [{"product_id", "sync_version"}, ...], "version", "has_more"}
+        where "version" is what the client passes as `since` next time. Returns
+        {"full_resync": True, ...} when `since` is missing or older than the tombstone retention.
+        """
+        now = datetime.now(timezone.utc)
+        horizon = ledger_keys.range_end(now - timedelta(seconds=SYNC_SETTLE_SECONDS))
+        retention_start = ledger_keys.range_start(now - timedelta(days=TOMBSTONE_RETENTION_DAYS))
+        if not since or since < retention_start:
+            return {"full_resync": True, "version": horizon, "changed": [], "deleted": [], "has_more": False}
+
+        if since >= horizon:
+            return {"full_resync": False, "version": since, "changed": [], "deleted": [], "has_more": False}
+
+        limit = max(1, min(limit, MAX_CHANGES_PER_PAGE))
+        queries = [
+            (lambda **kwargs: hedged_read('padeliver.sync_query', self.products_table.query, **kwargs), {"IndexName": SYNC_INDEX}),
+            (lambda **kwargs: hedged_read('tombstones.query', self.tombstones_table.query, **kwargs), {}),
+        ]
+        jobs = [(query, bucket, index_kwargs) for query, index_kwargs in queries for bucket in all_sync_buckets()]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            pages = list(executor.map(
+                lambda job: self._query_since(job[0], job[1], since, horizon, limit, **job[2]), jobs
+            ))
+
+        # A page that hit the limit may hide later items of its bucket: only changes up to the
+        # lowest such cut-off are complete across buckets
+        cutoffs = [page[-1]["sync_version"] for page in pages if len(page) == limit]
+        changes = sorted((item for page in pages for item in page), key=lambda item: item["sync_version"])
+        if cutoffs:
+            changes = [item for item in changes if item["sync_version"] <= min(cutoffs)]
+        has_more = bool(cutoffs) or len(changes) > limit
+        changes = changes[:limit]
+        version = changes[-1]["sync_version"] if has_more and changes else horizon
+
+        changed_ids = [item["product_id"] for item in changes if not item.get("deleted")]
+        products = self.fetch_products(changed_ids) if changed_ids else {}
+
+        return {
+            "full_resync": False,
+            "version": version,
+            "has_more": has_more,
+            "changed": [
+                {key: value for key, value in products[product_id].items() if key != "sync_bucket"}
+                for product_id in dict.fromkeys(changed_ids) if product_id in products
+            ],
+            "deleted": [
+                {"product_id": item["product_id"], "sync_version": item["sync_version"]}
+                for item in changes if item.get("deleted")
+            ],
+        }
@@ -1,8 +1,14 @@
-from utils.aws_resources import aws_resources, logger
+from utils.aws_resources import aws_resources, logger, DecimalEncoder
+from utils.dynamo_expressions import set_update_kwargs
+from gateways.bulk_writer import BulkWriter
+from botocore.exceptions import ClientError
+from utils import ledger_keys
 import json
 from datetime import datetime
 from decimal import Decimal
 
+products_writer = BulkWriter(aws_resources.products_table, ["product_id"])
+
 def save_product(product):
     """Insert a single product into DynamoDB."""
     aws_resources.products_table.put_item(Item=product)
@@ -24,7 +30,8 @@ def get_product(product_id):
     # Get all inventory records for the product
     inventory_response = aws_resources.product_inventory_table.query(
         KeyConditionExpression="product_id = :product_id",
-        ExpressionAttributeValues={":product_id": product_id}
+        ExpressionAttributeValues={":product_id": product_id},
+        ProjectionExpression="quantity"
     )
     inventory_items = inventory_response.get("Items", [])
     
@@ -35,6 +42,13 @@ def get_product(product_id):
     product["total_quantity"] = total_quantity if inventory_items else Decimal(0)
     return product
 
+def product_exists(product_id):
+    """Check a product exists, reading only its key."""
+    response = aws_resources.products_table.get_item(
+        Key={"product_id": product_id}, ProjectionExpression="product_id"
+    )
+    return "Item" in response
+
 def get_product_name(product_name):
     """Get a product ID by product name."""
     try:
@@ -55,16 +69,35 @@ def get_all_product_names():
     return response.get("Items", [])
 
 def update_product(product_id, update_expression, expression_attribute_values):
-    """Update a product in DynamoDB."""
-    product = get_product(product_id)
-    if product:
+    """Update a product in DynamoDB in one conditional request (no read to check it exists)."""
+    try:
         aws_resources.products_table.update_item(
             Key={"product_id": product_id},
             UpdateExpression=update_expression,
+            ConditionExpression="attribute_exists(product_id)",
             ExpressionAttributeValues=expression_attribute_values
         )
         return {"statusCode": 200, "body": json.dumps({"message": "Product updated successfully"})}
-    else:
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return {"statusCode": 404, "body": json.dumps({"message": f"Product with ID {product_id} not found."})}
+
+def update_product_fields(product_id, updates, expected_version=None):
+    """SET the given attributes of a product in one UpdateItem, optionally checking its version."""
+    try:
+        response = aws_resources.products_table.update_item(
+            Key={"product_id": product_id},
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            **set_update_kwargs(updates, key_attribute="product_id", version_attribute="version", expected_version=expected_version)
+        )
+        return {"statusCode": 200, "body": json.dumps({"message": "Product updated successfully", "product": response["Attributes"]}, cls=DecimalEncoder)}
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        if e.response.get("Item"):
+            return {"statusCode": 409, "body": json.dumps({"message": f"Product with ID {product_id} was changed concurrently."})}
         return {"statusCode": 404, "body": json.dumps({"message": f"Product with ID {product_id} not found."})}
 
 def delete_product(product_id):
@@ -72,26 +105,22 @@ def delete_product(product_id):
     aws_resources.products_table.delete_item(Key={"product_id": product_id})
 
 def batch_create_products(items):
-    """Batch insert products using DynamoDB batch_writer."""
-    with aws_resources.products_table.batch_writer() as batch:
-        for item in items:
-            batch.put_item(Item=item)
+    """Batch insert products within the bulk write budget, reporting per-item results."""
+    return products_writer.put_items(items)
 
 def batch_delete_products(product_ids):
-    """Batch delete products using DynamoDB batch_writer."""
-    with aws_resources.products_table.batch_writer() as batch:
-        for pid in product_ids:
-            batch.delete_item(Key={"product_id": pid})
+    """Batch delete products within the bulk write budget, reporting per-item results."""
+    return products_writer.delete_keys([{"product_id": pid} for pid in product_ids])
 
 def save_product_inventory(item):
     """Insert a single product inventory record into DynamoDB."""
     # Check if the product exists in the products table
     product_id = item.get("product_id")
-    if not get_product(product_id):
+    if not product_exists(product_id):
         return {"statusCode": 404, "body": json.dumps({"message": f"Product with ID {product_id} not found."})}
 
-    # Get the current local time in ISO format
-    item["datetime"] = datetime.now().isoformat()
+    # Use the same unique UTC ledger key format as the Pa-deliver inventory writers
+    item["datetime"] = ledger_keys.new_ledger_key()
     
     if "remarks" not in item:
         item["remarks"] = "Default remarks."
@@ -101,19 +130,18 @@ def save_product_inventory(item):
     return {"statusCode": 200, "body": json.dumps({"message": "Product inventory record saved successfully"})}
 
 def update_product_quantity(product_id, quantity):
-    """Update the quantity of a product in DynamoDB."""
-    product = get_product(product_id)
-    if product:
-        new_quantity = product.get("quantity", 0) + quantity
-        update_expression = "SET quantity = :quantity"
-        expression_attribute_values = {":quantity": new_quantity}
+    """Atomically add to the quantity of a product in DynamoDB (drift is repaired by reconciliation)."""
+    try:
         aws_resources.products_table.update_item(
             Key={"product_id": product_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeValues=expression_attribute_values
+            UpdateExpression="ADD quantity :quantity",
+            ConditionExpression="attribute_exists(product_id)",
+            ExpressionAttributeValues={":quantity": Decimal(str(quantity))}
         )
         return {"statusCode": 200, "body": json.dumps({"message": "Product quantity updated successfully"})}
-    else:
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
         logger.info(f"Product with ID {product_id} not found.")
         return {"statusCode": 404, "body": json.dumps({"message": f"Product with ID {product_id} not found."})}
 
@@ -0,0 +1,198 @@
+import os
+import io
+import csv
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError #type: ignore
+from utils.aws_clients import get_resource, get_client
+from utils.s3_multipart import GzipMultipartWriter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_PREFIX = "exports/"
+DEFAULT_TOTAL_SEGMENTS = int(os.getenv("EXPORT_TOTAL_SEGMENTS", "16"))
+ROWS_PER_FILE = int(os.getenv("EXPORT_ROWS_PER_FILE", "500000"))
+SCAN_PAGE_LIMIT = 1000
+
+# Exportable tables, their environment variable and the columns used for CSV output
+EXPORT_TABLES = {
+    "catalog": {
+        "table_env": "PADELIVER_PRODUCTS_TABLE",
+        "columns": ["product_id", "item", "product_description", "price", "brand", "category"],
+    },
+    "ledger": {
+        "table_env": "PRODUCTS_INVENTORY_TABLE",
+        "columns": ["product_id", "datetime", "quantity", "remark"],
+    },
+    "orders": {
+        "table_env": "PADELIVER_ORDERS_TABLE",
+        "columns": ["order_id", "customer_name", "status", "order_datetime", "items"],
+    },
+}
+
+def export_default(obj):
+    """Serialize Decimals without losing precision: integers as int, others as their exact string."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else str(obj)
+    if isinstance(obj, set):
+        return sorted(obj)
+    raise TypeError
+
+class ExportGateway:
+    """Parallel segmented-scan exports of DynamoDB tables to gzip NDJSON/CSV files in S3.
+
+    Every table is scanned with TotalSegments workers. Each worker writes its rows into
+    part files of up to ROWS_PER_FILE rows through a multipart upload, and checkpoints the
+    scan position in the export manifest whenever it closes a file. An interrupted export
+    is resumed by running it again with the same export_id.
+    """
+
+    def __init__(self, bucket_name=None):
+        self.dynamodb = get_resource('dynamodb')
+        self.s3 = get_client('s3')
+        self.bucket_name = bucket_name or os.getenv('S3_BUCKET_NAME')
+        self.manifest_lock = threading.RLock()
+
+    def manifest_key(self, export_id):
+        return f"{EXPORT_PREFIX}{export_id}/manifest.json"
+
+    def load_manifest(self, export_id):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self.manifest_key(export_id))
+            return json.loads(response["Body"].read())
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def save_manifest(self, manifest):
+        with self.manifest_lock:
+            self.s3.put_object(
+                Bucket=self.bucket_name,
+                Key=self.manifest_key(manifest["export_id"]),
+                Body=json.dumps(manifest, default=export_default, indent=2),
+                ContentType="application/json"
+            )
+
+    def new_manifest(self, export_id, tables, export_format, total_segments):
+        return {
+            "export_id": export_id,
+            "format": export_format,
+            "status": "in_progress",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "tables": {
+                table: {
+                    "total_segments": total_segments,
+                    "segments": {
+                        str(segment): {"status": "pending", "last_evaluated_key": None, "rows": 0, "files": []}
+                        for segment in range(total_segments)
+                    },
+                }
+                for table in tables
+            },
+        }
+
+    def run_export(self, export_id, tables=None, export_format="ndjson", total_segments=None, should_continue=lambda: True):
+        """Run or resume an export and return its manifest."""
+        manifest = self.load_manifest(export_id)
+        if manifest is None:
+            tables = tables or list(EXPORT_TABLES)
+            unknown = [table for table in tables if table not in EXPORT_TABLES]
+            if unknown:
+                raise ValueError(f"Unknown export tables: {unknown}")
+            if export_format not in ("ndjson", "csv"):
+                raise ValueError(f"Unsupported export format: {export_format}")
+            manifest = self.new_manifest(export_id, tables, export_format, total_segments or DEFAULT_TOTAL_SEGMENTS)
+            self.save_manifest(manifest)
+
+        work = [
+            (table, int(segment))
+            for table, table_state in manifest["tables"].items()
+            for segment, segment_state in table_state["segments"].items()
+            if segment_state["status"] != "complete"
+        ]
+        if work:
+            with ThreadPoolExecutor(max_workers=min(len(work), 32)) as executor:
+                list(executor.map(lambda job: self._export_segment(manifest, job[0], job[1], should_continue), work))
+
+        if all(
+            segment_state["status"] == "complete"
+            for table_state in manifest["tables"].values()
+            for segment_state in table_state["segments"].values()
+        ):
+            manifest["status"] = "complete"
+            manifest["completed_at"] = datetime.now(timezone.utc).isoformat()
+        self.save_manifest(manifest)
+        return manifest
+
+    def _export_segment(self, manifest, table_name, segment, should_continue):
+        table_state = manifest["tables"][table_name]
+        state = table_state["segments"][str(segment)]
+        table = self.dynamodb.Table(os.getenv(EXPORT_TABLES[table_name]["table_env"]))
+        scan_kwargs = {"Segment": segment, "TotalSegments": table_state["total_segments"], "Limit": SCAN_PAGE_LIMIT}
+
+        while state["status"] != "complete" and should_continue():
+            if state["last_evaluated_key"]:
+                scan_kwargs["ExclusiveStartKey"] = state["last_evaluated_key"]
+            file_key = self._file_key(manifest, table_name, segment, len(state["files"]))
+            rows = 0
+            last_evaluated_key = state["last_evaluated_key"]
+            finished = False
+
+            with GzipMultipartWriter(self.s3, self.bucket_name, file_key, content_type=self._content_type(manifest)) as writer:
+                csv_writer = self._start_csv(manifest, table_name, writer)
+                # Files end on scan page boundaries so the checkpoint is always a LastEvaluatedKey
+                while True:
+                    response = table.scan(**scan_kwargs)
+                    for item in response.get("Items", []):
+                        self._write_row(manifest, item, writer, csv_writer)
+                    rows += len(response.get("Items", []))
+                    last_evaluated_key = response.get("LastEvaluatedKey")
+                    if not last_evaluated_key:
+                        finished = True
+                        break
+                    scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+                    if rows >= ROWS_PER_FILE or not should_continue():
+                        break
+
+            with self.manifest_lock:
+                state["files"].append({"key": file_key, "rows": rows})
+                state["rows"] += rows
+                state["last_evaluated_key"] = last_evaluated_key
+                if finished:
+                    state["status"] = "complete"
+                self.save_manifest(manifest)
+
+        logger.info(f"Export {manifest['export_id']} {table_name} segment {segment}: {state['status']}, {state['rows']} rows")
+
+    def _file_key(self, manifest, table_name, segment, file_index):
+        extension = "ndjson" if manifest["format"] == "ndjson" else "csv"
+        return f"{EXPORT_PREFIX}{manifest['export_id']}/{table_name}/segment-{segment:04d}-part-{file_index:05d}.{extension}.gz"
+
+    def _content_type(self, manifest):
+        return "application/x-ndjson" if manifest["format"] == "ndjson" else "text/csv"
+
+    def _start_csv(self, manifest, table_name, writer):
+        if manifest["format"] != "csv":
+            return None
+        columns = EXPORT_TABLES[table_name]["columns"]
+        writer.write(",".join(columns) + "\n")
+        return columns
+
+    def _write_row(self, manifest, item, writer, csv_columns):
+        if csv_columns is None:
+            writer.write(json.dumps(item, default=export_default) + "\n")
+            return
+        line = io.StringIO()
+        csv.writer(line).writerow([
+            json.dumps(item[column], default=export_default) if isinstance(item.get(column), (list, dict))
+            else export_default(item[column]) if isinstance(item.get(column), Decimal)
+            else item.get(column, "")
+            for column in csv_columns
+        ])
+        writer.write(line.getvalue())
@@ -0,0 +1,202 @@
+import os
+import gzip
+import json
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError #type: ignore
+from gateways.bulk_writer import BulkWriter
+from utils.aws_clients import get_resource, get_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = "orders_archive/"
+INDEX_PREFIX = ARCHIVE_PREFIX + "index/customers/"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVABLE_STATUSES = ["Received", "Cancelled"]
+ORDERS_PER_OBJECT = 5000
+PARTITION_CACHE_SIZE = 32
+INDEX_WORKERS = 16
+
+def archive_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else str(obj)
+    raise TypeError
+
+def archived_order_hook(order):
+    """Restore Decimals for numeric values so archived orders look like table items."""
+    return {key: Decimal(str(value)) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+            for key, value in order.items()}
+
+class OrderArchive:
+    """Cold tier for completed orders: gzip NDJSON objects partitioned by order date.
+
+    orders_archive/year=YYYY/month=MM/day=DD/<run>-<n>.ndjson.gz   archived orders
+    orders_archive/index/customers/<customer_name>.json           {order_id: {key, order_datetime}}
+
+    Orders are written to S3 and indexed before being deleted from the hot table, so an
+    interrupted run never loses an order; at worst one is archived twice and the index
+    points to the newest copy.
+    """
+
+    def __init__(self, orders_table=None, bucket_name=None):
+        self.orders_table = orders_table or get_resource('dynamodb').Table(os.getenv('PADELIVER_ORDERS_TABLE'))
+        self.s3 = get_client('s3')
+        self.bucket_name = bucket_name or os.getenv('S3_BUCKET_NAME')
+        self.orders_writer = BulkWriter(self.orders_table, ['customer_name', 'order_id'])
+        self.partition_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
+    def _index_key(self, customer_name):
+        return f"{INDEX_PREFIX}{customer_name}.json"
+
+    def _partition_key(self, day, run_id, sequence):
+        year, month, day_of_month = day.split("-")
+        return f"{ARCHIVE_PREFIX}year={year}/month={month}/day={day_of_month}/{run_id}-{sequence:04d}.ndjson.gz"
+
+    def load_index(self, customer_name):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self._index_key(customer_name))
+            return json.loads(response["Body"].read())
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return {}
+            raise
+
+    def _update_index(self, customer_name, entries):
+        index = self.load_index(customer_name)
+        index.update(entries)
+        self.s3.put_object(
+            Bucket=self.bucket_name,
+            Key=self._index_key(customer_name),
+            Body=json.dumps(index),
+            ContentType="application/json"
+        )
+
+    def _load_partition(self, key):
+        """Read an archive object, keeping recently used ones in memory."""
+        with self.cache_lock:
+            if key in self.partition_cache:
+                self.partition_cache.move_to_end(key)
+                return self.partition_cache[key]
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+        lines = gzip.decompress(response["Body"].read()).decode("utf-8").splitlines()
+        orders = {}
+        for line in lines:
+            order = json.loads(line, object_hook=archived_order_hook)
+            orders[(order["customer_name"], order["order_id"])] = order
+        with self.cache_lock:
+            self.partition_cache[key] = orders
+            while len(self.partition_cache) > PARTITION_CACHE_SIZE:
+                self.partition_cache.popitem(last=False)
+        return orders
+
+    def partition_keys(self, since_day=None):
+        """Keys of the archive objects, only those of days on or after since_day (YYYY-MM-DD) if given."""
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{ARCHIVE_PREFIX}year="):
+            for entry in page.get("Contents", []):
+                parts = dict(part.split("=", 1) for part in entry["Key"][len(ARCHIVE_PREFIX):].split("/")[:3])
+                if since_day is None or f"{parts['year']}-{parts['month']}-{parts['day']}" >= since_day:
+                    yield entry["Key"]
+
+    def iter_partition(self, key):
+        """Stream the orders of one archive object without caching it."""
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+        with gzip.GzipFile(fileobj=response["Body"]) as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line, object_hook=archived_order_hook)
+
+    def find_order(self, customer_name, order_id):
+        """Look up one archived order, or None."""
+        entry = self.load_index(customer_name).get(order_id)
+        if not entry:
+            return None
+        return self._load_partition(entry["key"]).get((customer_name, order_id))
+
+    def get_customer_orders(self, customer_name, limit=None, before=None):
+        """Archived orders of a customer, oldest first, and the cursor of the next page (or None).
+
+        With `limit`, only the `limit` newest orders placed before `before` (an order_datetime
+        cursor from the previous page) are read, so each page touches a bounded number of
+        archive objects.
+        """
+        index = self.load_index(customer_name)
+        entries = sorted(
+            ((order_id, entry) for order_id, entry in index.items() if before is None or entry.get("order_datetime", "") < before),
+            key=lambda pair: pair[1].get("order_datetime", "")
+        )
+        next_cursor = None
+        if limit is not None and len(entries) > limit:
+            entries = entries[-limit:]
+            next_cursor = entries[0][1].get("order_datetime", "")
+        orders = []
+        for order_id, entry in entries:
+            order = self._load_partition(entry["key"]).get((customer_name, order_id))
+            if order:
+                orders.append(order)
+        return orders, next_cursor
+
+    def _flush(self, orders, run_id, sequence):
+        """Write one batch of orders to S3, index them, then remove them from the hot table."""
+        by_day = {}
+        for order in orders:
+            by_day.setdefault(str(order.get("order_datetime", ""))[:10], []).append(order)
+
+        index_entries = {}
+        for day, day_orders in by_day.items():
+            key = self._partition_key(day, run_id, sequence)
+            body = "".join(json.dumps(order, default=archive_default) + "\n" for order in day_orders)
+            self.s3.put_object(
+                Bucket=self.bucket_name, Key=key, Body=gzip.compress(body.encode("utf-8")),
+                ContentType="application/x-ndjson", ContentEncoding="gzip"
+            )
+            for order in day_orders:
+                index_entries.setdefault(order["customer_name"], {})[order["order_id"]] = {
+                    "key": key, "order_datetime": order.get("order_datetime")
+                }
+
+        with ThreadPoolExecutor(max_workers=INDEX_WORKERS) as executor:
+            list(executor.map(lambda entry: self._update_index(*entry), index_entries.items()))
+
+        results = self.orders_writer.delete_keys(
+            [{"customer_name": order["customer_name"], "order_id": order["order_id"]} for order in orders]
+        )
+        return len(results["succeeded"]), results["failed"]
+
+    def archive_completed_orders(self, older_than_days=ARCHIVE_AFTER_DAYS, should_continue=lambda: True):
+        """Move completed orders older than the cutoff from the hot table into the archive."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+        run_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:6]}"
+        scan_kwargs = {
+            "FilterExpression": Attr("status").is_in(ARCHIVABLE_STATUSES) & Attr("order_datetime").lt(cutoff)
+        }
+        pending = []
+        archived = 0
+        failed = []
+        sequence = 0
+
+        while True:
+            response = self.orders_table.scan(**scan_kwargs)
+            pending.extend(response.get("Items", []))
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            done = not last_evaluated_key or not should_continue()
+            if len(pending) >= ORDERS_PER_OBJECT or (done and pending):
+                moved, batch_failed = self._flush(pending, run_id, sequence)
+                archived += moved
+                failed.extend(batch_failed)
+                pending = []
+                sequence += 1
+            if done:
+                break
+            scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+        logger.info(f"Archived {archived} orders older than {cutoff}; {len(failed)} not removed from the table.")
+        return {"archived": archived, "failed": failed, "complete": not last_evaluated_key}
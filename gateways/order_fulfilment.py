@@ -0,0 +1,186 @@
+import os
+import json
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key #type: ignore
+from utils.aws_clients import get_client
+from utils.batching import chunked
+from utils import ledger_keys
+from gateways.awsGateway import LEDGER_ROWS_PER_TRANSACTION
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FULFILMENT_PENDING = "pending"
+PENDING_SHARDS = int(os.getenv("FULFILMENT_PENDING_SHARDS", "10"))
+FULFILMENT_WORKERS = 16
+ORDER_EVENT_SOURCE = "padeliver.orders"
+PENDING_INDEX = os.getenv("FULFILMENT_PENDING_INDEX", "fulfilment_status_index")  # fulfilment_status (HASH) + order_datetime (RANGE), sparse
+SWEEP_SETTLE_SECONDS = int(os.getenv("FULFILMENT_SWEEP_SETTLE_SECONDS", "600"))
+
+def fulfilment_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError
+
+def pending_status():
+    """fulfilment_status of a newly placed order: "pending#<n>", spreading pending orders over index partitions."""
+    return f"{FULFILMENT_PENDING}#{random.randrange(PENDING_SHARDS)}"
+
+def order_ledger_rows(order):
+    """Stock-out ledger rows of an order, keyed deterministically so a redelivered order reuses them."""
+    moment = ledger_keys.parse_ledger_key(order['order_datetime'])
+    return [
+        {
+            "product_id": item['product_id'],
+            "quantity": -Decimal(item['quantity']),
+            "remark": f"Stock-out: Purchase made by {order['order_id']}",
+            "datetime": ledger_keys.derived_ledger_key(moment, f"{order['order_id']}#{index}#{item['product_id']}"),
+        }
+        for index, item in enumerate(order.get('items', []))
+    ]
+
+class OrderFulfilment:
+    """The asynchronous part of placing an order, run by queue workers.
+
+    place_order durably writes the order (fulfilment_status "pending#<n>") and clears the
+    cart in one transaction, then enqueues the order. Workers take batches of orders and write
+    the stock-out ledger rows together with their materialized stock updates, publish
+    OrderPlaced events and pre-generate receipts, then mark the orders fulfilled by removing
+    fulfilment_status, which keeps PENDING_INDEX sparse. Orders still pending after
+    SWEEP_SETTLE_SECONDS (never queued, or fulfilment kept failing) are re-queued by sweep.
+
+    Every step is safe to repeat: ledger rows use keys derived from the order and are written
+    only if absent, in the same transaction as their stock update, so a redelivery never
+    applies stock twice nor skips it.
+
+    Locally, pass sqs_client=LocalQueue() and drain it into process_fulfilment_queue.
+    """
+
+    def __init__(self, aws_gateway, orders_table, prepare_receipt=None, queue_url=None, event_bus_name=None, sqs_client=None):
+        self.aws_gateway = aws_gateway
+        self.orders_table = orders_table
+        self.prepare_receipt = prepare_receipt
+        self.queue_url = queue_url or os.getenv('FULFILMENT_QUEUE_URL')
+        self.event_bus_name = event_bus_name or os.getenv('ORDER_EVENT_BUS_NAME')
+        self.sqs = sqs_client
+
+    def _sqs(self):
+        if self.sqs is None:
+            self.sqs = get_client('sqs')
+        return self.sqs
+
+    def enqueue(self, order):
+        """Queue an order for fulfilment; returns False if it could not be queued."""
+        if not self.queue_url:
+            return False
+        try:
+            self._sqs().send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(order, default=fulfilment_default))
+            return True
+        except Exception as e:
+            logger.error(f"Error queueing order {order['order_id']} for fulfilment: {e}")
+            return False
+
+    def _publish_events(self, orders):
+        """Publish OrderPlaced events; returns the order_ids whose event was not published."""
+        if not self.event_bus_name:
+            return set()
+        events = get_client('events')
+        unpublished = set()
+        for chunk in chunked(orders, 10):  # PutEvents limit
+            try:
+                response = events.put_events(Entries=[
+                    {
+                        "Source": ORDER_EVENT_SOURCE,
+                        "DetailType": "OrderPlaced",
+                        "Detail": json.dumps(order, default=fulfilment_default),
+                        "EventBusName": self.event_bus_name,
+                    }
+                    for order in chunk
+                ])
+            except Exception as e:
+                logger.error(f"Error publishing order events: {e}")
+                unpublished.update(order['order_id'] for order in chunk)
+                continue
+            if response.get("FailedEntryCount"):
+                # Result entries are in request order; failed ones carry an ErrorCode
+                for order, entry in zip(chunk, response.get("Entries", [])):
+                    if entry.get("ErrorCode"):
+                        logger.error(f"OrderPlaced event for {order['order_id']} not published: {entry['ErrorCode']}")
+                        unpublished.add(order['order_id'])
+        return unpublished
+
+    def _mark_fulfilled(self, order):
+        self.orders_table.update_item(
+            Key={'order_id': order['order_id'], 'customer_name': order['customer_name']},
+            UpdateExpression="REMOVE fulfilment_status",
+            ConditionExpression="attribute_exists(order_id)"
+        )
+
+    def _run_per_order(self, step, orders, failed):
+        """Run `step` for every order not yet failed, concurrently, adding failures to `failed`."""
+        pending = [order for order in orders if order['order_id'] not in failed]
+        if not pending:
+            return
+
+        def run(order):
+            try:
+                step(order)
+                return None
+            except Exception as e:
+                logger.error(f"Fulfilment step {step.__name__} failed for order {order['order_id']}: {e}")
+                return order['order_id']
+
+        with ThreadPoolExecutor(max_workers=min(FULFILMENT_WORKERS, len(pending))) as executor:
+            failed.update(order_id for order_id in executor.map(run, pending) if order_id)
+
+    def fulfil(self, orders):
+        """Fulfil a batch of orders; returns the order_ids that failed and should be retried."""
+        failed = set()
+
+        def write_ledger(order):
+            for rows in chunked(order_ledger_rows(order), LEDGER_ROWS_PER_TRANSACTION):
+                self.aws_gateway.write_ledger_rows_once(rows)
+
+        self._run_per_order(write_ledger, orders, failed)
+
+        failed.update(self._publish_events([order for order in orders if order['order_id'] not in failed]))
+
+        if self.prepare_receipt:
+            self._run_per_order(self.prepare_receipt, orders, failed)
+        self._run_per_order(self._mark_fulfilled, orders, failed)
+        return failed
+
+    def pending_orders(self, settle_seconds=SWEEP_SETTLE_SECONDS):
+        """Yield orders placed more than settle_seconds ago that are still pending fulfilment."""
+        cutoff = (datetime.now() - timedelta(seconds=settle_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+        for shard in range(PENDING_SHARDS):
+            kwargs = {
+                "IndexName": PENDING_INDEX,
+                "KeyConditionExpression": Key("fulfilment_status").eq(f"{FULFILMENT_PENDING}#{shard}") & Key("order_datetime").lt(cutoff),
+            }
+            while True:
+                response = self.orders_table.query(**kwargs)
+                yield from response.get("Items", [])
+                if "LastEvaluatedKey" not in response:
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def sweep(self, settle_seconds=SWEEP_SETTLE_SECONDS):
+        """Re-queue stale pending orders, fulfilling inline any that cannot be queued.
+
+        Returns counts of orders requeued, fulfilled inline and still failing.
+        """
+        requeued, inline = 0, []
+        for order in self.pending_orders(settle_seconds):
+            if self.enqueue(order):
+                requeued += 1
+            else:
+                inline.append(order)
+        failed = set()
+        for chunk in chunked(inline, 100):
+            failed.update(self.fulfil(chunk))
+        return {"requeued": requeued, "fulfilled": len(inline) - len(failed), "failed": len(failed)}
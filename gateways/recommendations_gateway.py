@@ -0,0 +1,187 @@
+import os
+import gzip
+import json
+import time
+import heapq
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError #type: ignore
+from gateways.order_archive import OrderArchive
+from utils.aws_clients import get_resource, get_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_KEY = "recommendations/frequently_bought_together.json.gz"
+TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "10"))
+MIN_CO_OCCURRENCES = int(os.getenv("RECOMMENDATIONS_MIN_CO_OCCURRENCES", "2"))
+SCAN_SEGMENTS = int(os.getenv("RECOMMENDATIONS_SCAN_SEGMENTS", "8"))
+CACHE_SECONDS = float(os.getenv("RECOMMENDATIONS_CACHE_SECONDS", "600"))
+WINDOW_DAYS = int(os.getenv("RECOMMENDATIONS_WINDOW_DAYS", "365"))  # 0 counts every order ever placed
+ARCHIVE_WORKERS = 8
+EXCLUDED_STATUSES = {"Cancelled"}
+
+def count_co_occurrences(baskets):
+    """Count how many baskets contain each product and each pair of products.
+
+    Returns (product_counts, pair_counts) where pair_counts[a][b] is the number of baskets
+    containing both a and b. Only pairs that actually occur are stored, so memory grows with
+    the number of distinct co-purchases rather than with the square of the catalog.
+    """
+    product_counts = Counter()
+    pair_counts = defaultdict(Counter)
+    for basket in baskets:
+        products = sorted(set(basket))
+        product_counts.update(products)
+        for index, product_id in enumerate(products):
+            for other_id in products[index + 1:]:
+                pair_counts[product_id][other_id] += 1
+                pair_counts[other_id][product_id] += 1
+    return product_counts, pair_counts
+
+def merge_co_occurrences(partials):
+    """Sum the (product_counts, pair_counts) of several scan segments."""
+    product_counts = Counter()
+    pair_counts = defaultdict(Counter)
+    for partial_products, partial_pairs in partials:
+        product_counts.update(partial_products)
+        for product_id, related in partial_pairs.items():
+            pair_counts[product_id].update(related)
+    return product_counts, pair_counts
+
+def top_related(product_counts, pair_counts, top_k=TOP_K, min_count=MIN_CO_OCCURRENCES, names=None):
+    """Top-K "frequently bought together" products per product.
+
+    Related products are ranked by confidence, P(bought B | bought A), with the raw pair
+    count as tie-breaker; pairs seen fewer than `min_count` times are ignored as noise.
+    """
+    names = names or {}
+    recommendations = {}
+    for product_id, related in pair_counts.items():
+        if names and product_id not in names:
+            continue
+        candidates = (
+            (count / product_counts[product_id], count, other_id)
+            for other_id, count in related.items()
+            if count >= min_count and (not names or other_id in names)
+        )
+        best = heapq.nlargest(top_k, candidates)
+        if best:
+            recommendations[product_id] = [
+                {"product_id": other_id, "item": names.get(other_id), "confidence": round(confidence, 4), "orders": count}
+                for confidence, count, other_id in best
+            ]
+    return recommendations
+
+class RecommendationsGateway:
+    """Offline co-purchase recommendations built from orders and served from S3.
+
+    The batch job counts product co-occurrences over the orders of the last
+    RECOMMENDATIONS_WINDOW_DAYS: the hot orders table with parallel scan segments and the
+    archived day partitions under orders_archive/ with parallel readers. It merges the counts
+    and publishes {product_id: [related...]} as one gzip JSON object. Request handlers only do
+    a dictionary lookup in a copy cached per container.
+    """
+
+    def __init__(self, orders_table=None, bucket_name=None, order_archive=None):
+        self.orders_table = orders_table or get_resource('dynamodb').Table(os.getenv('PADELIVER_ORDERS_TABLE'))
+        self.s3 = get_client('s3')
+        self.bucket_name = bucket_name or os.getenv('S3_BUCKET_NAME')
+        self.order_archive = order_archive or OrderArchive(self.orders_table, self.bucket_name)
+        self.cached = None
+        self.cached_at = 0.0
+        self.lock = threading.Lock()
+
+    def _baskets(self, orders, window_start):
+        for order in orders:
+            if order.get("status") not in EXCLUDED_STATUSES and str(order.get("order_datetime", "")) >= window_start:
+                yield [item["product_id"] for item in order.get("items", []) if item.get("product_id")]
+
+    def _segment_orders(self, segment, total_segments, window_start):
+        scan_kwargs = {
+            "Segment": segment,
+            "TotalSegments": total_segments,
+            "ProjectionExpression": "#items, #status, order_datetime",
+            "ExpressionAttributeNames": {"#items": "items", "#status": "status"},
+        }
+        if window_start:
+            scan_kwargs["FilterExpression"] = Attr("order_datetime").gte(window_start)
+        while True:
+            response = self.orders_table.scan(**scan_kwargs)
+            yield from response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def build(self, names=None, top_k=TOP_K, min_count=MIN_CO_OCCURRENCES, total_segments=SCAN_SEGMENTS, window_days=WINDOW_DAYS):
+        """Recompute recommendations from the orders of the last window_days and publish them; returns a summary.
+
+        `names` ({product_id: item}) restricts recommendations to products still in the catalog
+        and is embedded so clients can render them without another lookup.
+        """
+        window_start = ""
+        if window_days:
+            window_start = (datetime.now(timezone.utc) - timedelta(days=window_days)).strftime("%Y-%m-%d %H:%M:%S")
+        archive_keys = list(self.order_archive.partition_keys(since_day=window_start[:10] or None))
+
+        with ThreadPoolExecutor(max_workers=total_segments) as executor:
+            partials = list(executor.map(
+                lambda segment: count_co_occurrences(self._baskets(self._segment_orders(segment, total_segments, window_start), window_start)),
+                range(total_segments)
+            ))
+        if archive_keys:
+            with ThreadPoolExecutor(max_workers=min(ARCHIVE_WORKERS, len(archive_keys))) as executor:
+                partials.extend(executor.map(
+                    lambda key: count_co_occurrences(self._baskets(self.order_archive.iter_partition(key), window_start)),
+                    archive_keys
+                ))
+        product_counts, pair_counts = merge_co_occurrences(partials)
+        recommendations = top_related(product_counts, pair_counts, top_k, min_count, names)
+
+        document = {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "products": recommendations,
+        }
+        self.s3.put_object(
+            Bucket=self.bucket_name,
+            Key=RECOMMENDATIONS_KEY,
+            Body=gzip.compress(json.dumps(document).encode("utf-8")),
+            ContentType="application/json",
+            ContentEncoding="gzip"
+        )
+        with self.lock:
+            self.cached = recommendations
+            self.cached_at = time.monotonic()
+        summary = {
+            "window_days": window_days,
+            "archive_objects": len(archive_keys),
+            "orders_products": len(product_counts),
+            "products_with_recommendations": len(recommendations),
+            "generated_at": document["generated_at"],
+        }
+        logger.info(f"Published frequently bought together recommendations: {summary}")
+        return summary
+
+    def _load(self):
+        with self.lock:
+            if self.cached is not None and time.monotonic() - self.cached_at < CACHE_SECONDS:
+                return self.cached
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=RECOMMENDATIONS_KEY)
+            recommendations = json.loads(gzip.decompress(response["Body"].read()))["products"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            recommendations = {}
+        with self.lock:
+            self.cached = recommendations
+            self.cached_at = time.monotonic()
+        return recommendations
+
+    def get_related(self, product_id):
+        """Precomputed "frequently bought together" products for a product ([] if none)."""
+        return self._load().get(product_id, [])
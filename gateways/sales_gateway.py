@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError #type: ignore
+from utils.batching import chunked
+from utils.aws_clients import get_resource, hedged_read
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bucket layout of the sales aggregates table (partition key bucket_id, sort key bucket_key):
+#   PRODUCT#<product_id> / <day>         units and revenue of one product per day
+#   DAY#<day>            / <product_id>  the same counters, grouped for a per-day breakdown
+#   DAILY                / <day>         order, unit, revenue and per-status totals per day
+#   PROCESSED#<order_id> / <eventID>#<n> marker of a stream record already counted (TTL on expires_at)
+PRODUCT_BUCKET = "PRODUCT#"
+DAY_BUCKET = "DAY#"
+DAILY_BUCKET = "DAILY"
+PROCESSED_BUCKET = "PROCESSED#"
+CANCELLED_STATUS = "Cancelled"
+MARKER_RETENTION_SECONDS = 7 * 86400  # well past the 24 h stream retention
+TRANSACTION_UPDATES = 99  # TransactWriteItems limit of 100, less the marker
+
+def order_day(order):
+    """Reporting day of an order, taken from its "%Y-%m-%d %H:%M:%S" order_datetime."""
+    return str(order.get("order_datetime", ""))[:10]
+
+def order_line_totals(order):
+    """Yield (product_id, units, revenue) for each line of an order."""
+    for item in order.get("items", []):
+        units = Decimal(str(item.get("quantity", 0)))
+        price = Decimal(str(item.get("price", 0)))
+        yield item["product_id"], units, units * price
+
+def status_attribute(status):
+    return "status_" + "".join(ch if ch.isalnum() else "_" for ch in str(status)).lower()
+
+class SalesGateway:
+    def __init__(self, table=None):
+        self.sales_table = table or get_resource('dynamodb').Table(os.getenv('SALES_AGGREGATES_TABLE'))
+
+    def _add_request(self, bucket_id, bucket_key, counters):
+        """Transaction entry that ADDs counters to one bucket, creating it on first use."""
+        names = {}
+        values = {}
+        clauses = []
+        for index, (attribute, amount) in enumerate(counters.items()):
+            names[f"#a{index}"] = attribute
+            values[f":v{index}"] = amount
+            clauses.append(f"#a{index} :v{index}")
+        return {"Update": {
+            "TableName": self.sales_table.name,
+            "Key": {"bucket_id": bucket_id, "bucket_key": bucket_key},
+            "UpdateExpression": "ADD " + ", ".join(clauses),
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+        }}
+
+    def _apply(self, order_id, event_id, updates):
+        """Apply {(bucket_id, bucket_key): counters} exactly once per stream record.
+
+        Each transaction carries a conditional marker item for (order_id, eventID, chunk),
+        so a redelivered record, or the retry of a record that failed midway, skips the
+        chunks it already counted.
+        """
+        client = self.sales_table.meta.client  # resource client: accepts native Python types
+        expires_at = int(time.time()) + MARKER_RETENTION_SECONDS
+        for index, chunk in enumerate(chunked(sorted(updates.items()), TRANSACTION_UPDATES)):
+            marker = {"Put": {
+                "TableName": self.sales_table.name,
+                "Item": {"bucket_id": PROCESSED_BUCKET + order_id, "bucket_key": f"{event_id}#{index}", "expires_at": expires_at},
+                "ConditionExpression": "attribute_not_exists(bucket_id)",
+            }}
+            try:
+                client.transact_write_items(TransactItems=[marker] + [
+                    self._add_request(bucket_id, bucket_key, counters) for (bucket_id, bucket_key), counters in chunk
+                ])
+            except ClientError as e:
+                reasons = e.response.get("CancellationReasons") or [{}]
+                if reasons[0].get("Code") == "ConditionalCheckFailed":
+                    logger.info(f"Sales of order {order_id} for record {event_id}#{index} already counted")
+                    continue
+                raise
+
+    def _line_updates(self, order, sign, updates):
+        day = order_day(order)
+        for product_id, units, revenue in order_line_totals(order):
+            for bucket in ((PRODUCT_BUCKET + product_id, day), (DAY_BUCKET + day, product_id)):
+                counters = updates.setdefault(bucket, {"units": Decimal(0), "revenue": Decimal(0)})
+                counters["units"] += sign * units
+                counters["revenue"] += sign * revenue
+
+    def record_order_placed(self, order, event_id):
+        """Count a newly placed order in its product and day buckets, once per stream record."""
+        day = order_day(order)
+        lines = list(order_line_totals(order))
+        updates = {}
+        self._line_updates(order, Decimal(1), updates)
+        updates[(DAILY_BUCKET, day)] = {
+            "orders": Decimal(1),
+            "units": sum((units for _, units, _ in lines), Decimal(0)),
+            "revenue": sum((revenue for _, _, revenue in lines), Decimal(0)),
+            status_attribute(order.get("status")): Decimal(1),
+        }
+        self._apply(order["order_id"], event_id, updates)
+
+    def record_status_change(self, old_order, new_order, event_id):
+        """Move an order between status counters, once per stream record; cancelling it reverses its sales."""
+        old_status = old_order.get("status")
+        new_status = new_order.get("status")
+        if old_status == new_status:
+            return
+        day = order_day(new_order)
+        lines = list(order_line_totals(new_order))
+        updates = {}
+        daily = {status_attribute(old_status): Decimal(-1), status_attribute(new_status): Decimal(1)}
+
+        if CANCELLED_STATUS in (old_status, new_status):
+            sign = Decimal(-1) if new_status == CANCELLED_STATUS else Decimal(1)
+            self._line_updates(new_order, sign, updates)
+            daily["units"] = sign * sum((units for _, units, _ in lines), Decimal(0))
+            daily["revenue"] = sign * sum((revenue for _, _, revenue in lines), Decimal(0))
+        updates[(DAILY_BUCKET, day)] = daily
+        self._apply(new_order["order_id"], event_id, updates)
+
+    def _query(self, key_condition):
+        query_kwargs = {"KeyConditionExpression": key_condition}
+        buckets = []
+        while True:
+            response = hedged_read('sales.query', self.sales_table.query, **query_kwargs)
+            buckets.extend(response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return buckets
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def get_product_sales(self, product_id, start_day, end_day):
+        """Per-day sales buckets of one product between two "%Y-%m-%d" days (inclusive)."""
+        return self._query(Key("bucket_id").eq(PRODUCT_BUCKET + product_id) & Key("bucket_key").between(start_day, end_day))
+
+    def get_day_product_sales(self, day):
+        """Per-product sales buckets for one day."""
+        return self._query(Key("bucket_id").eq(DAY_BUCKET + day))
+
+    def get_daily_totals(self, start_day, end_day):
+        """Daily order/unit/revenue/status totals between two "%Y-%m-%d" days (inclusive)."""
+        return self._query(Key("bucket_id").eq(DAILY_BUCKET) & Key("bucket_key").between(start_day, end_day))
@@ -0,0 +1,230 @@
+import os
+import time
+import random
+import logging
+import threading
+from decimal import Decimal
+from botocore.exceptions import ClientError #type: ignore
+from boto3.dynamodb.conditions import Key
+from gateways.bulk_writer import THROTTLE_ERROR_CODES
+from utils.aws_clients import get_resource, hedged_read
+from utils.batching import backoff_delay
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SHARD_COUNT = int(os.getenv("STOCK_SHARD_COUNT", "10"))
+MODE_CACHE_SECONDS = 60
+PROMOTE_ATTEMPTS = 4
+TOTAL_CACHE_SECONDS = float(os.getenv("STOCK_TOTAL_CACHE_SECONDS", "2"))
+SETTLE_SECONDS = int(os.getenv("STOCK_RECONCILE_SETTLE_SECONDS", "60"))  # how long ledger vs stored drift must persist before it is corrected
+
+class StockCounter:
+    """Materialized per-product stock totals that spread hot products over write shards.
+
+    A product starts unsharded: deltas are ADDed to `stock_total` on its catalog record.
+    When DynamoDB throttles that write, which is the table-wide signal that the item is hot
+    whichever containers are writing it, the product is promoted by setting `stock_shards`
+    on its record and the delta goes to a shard. From then on deltas are ADDed to a random
+    item of the shards table (product_id, shard). The total is the record's `stock_total`
+    plus the sum of the shards, read with one query and cached briefly.
+
+    Promotion writes the same hot item, so it is retried with backoff when throttled. If it
+    still cannot land, the delta goes to a shard anyway and the container retries the
+    promotion on the product's next deltas; until it lands, totals read elsewhere miss the
+    shard quantities (the reconciler, which sums every shard, does not).
+    """
+
+    def __init__(self, products_table, shards_table=None):
+        self.products_table = products_table
+        self.shards_table = shards_table or get_resource('dynamodb').Table(os.getenv('STOCK_SHARDS_TABLE'))
+        self.shard_counts = {}  # product_id -> (stock_shards, learned_at)
+        self.totals = {}  # product_id -> (total, cached_at)
+        self.unpromoted = set()  # products sharded here whose stock_shards marker has not landed yet
+        self.lock = threading.Lock()
+
+    def _known_shards(self, product_id):
+        with self.lock:
+            entry = self.shard_counts.get(product_id)
+        if entry and time.monotonic() - entry[1] < MODE_CACHE_SECONDS:
+            return entry[0]
+        return None
+
+    def _learn_shards(self, product_id, shards):
+        with self.lock:
+            self.shard_counts[product_id] = (int(shards or 0), time.monotonic())
+
+    def _add_to_shard(self, product_id, shards, delta):
+        self.shards_table.update_item(
+            Key={"product_id": product_id, "shard": random.randrange(shards)},
+            UpdateExpression="ADD quantity :delta",
+            ExpressionAttributeValues={":delta": delta}
+        )
+
+    def _route(self, product_id):
+        """Shard count to write a product's deltas to (0 for stock_total), retrying a pending promotion."""
+        shards = self._known_shards(product_id)
+        with self.lock:
+            retry_promotion = product_id in self.unpromoted
+        if retry_promotion:
+            try:
+                shards = self._promote_or_defer(product_id, attempts=1)
+            except Exception as e:
+                logger.error(f"Error retrying promotion of {product_id}: {e}")
+                shards = SHARD_COUNT
+        return shards or 0
+
+    def invalidate(self, product_id):
+        """Drop the cached total of a product written outside adjust."""
+        with self.lock:
+            self.totals.pop(product_id, None)
+
+    def update_action(self, product_id, delta):
+        """TransactWriteItems Update ADDing a stock delta, routed like adjust.
+
+        Unsharded products are conditional on their record existing (no upsert).
+        """
+        shards = self._route(product_id)
+        if shards:
+            return {"Update": {
+                "TableName": self.shards_table.name,
+                "Key": {"product_id": product_id, "shard": random.randrange(shards)},
+                "UpdateExpression": "ADD quantity :delta",
+                "ExpressionAttributeValues": {":delta": Decimal(delta)},
+            }}
+        return {"Update": {
+            "TableName": self.products_table.name,
+            "Key": {"product_id": product_id},
+            "UpdateExpression": "ADD stock_total :delta",
+            "ConditionExpression": "attribute_exists(product_id)",
+            "ExpressionAttributeValues": {":delta": Decimal(delta)},
+        }}
+
+    def shard_hot(self, product_id):
+        """Move a product whose stock record is throttled or contended to sharded counting."""
+        if not self._known_shards(product_id):
+            logger.warning(f"Stock total of {product_id} contended; moving it to sharded counting")
+            self._promote_or_defer(product_id)
+
+    def adjust(self, product_id, delta):
+        """ADD a stock delta for a product, routing it to a shard when the product is sharded."""
+        delta = Decimal(delta)
+        shards = self._route(product_id)
+
+        if shards:
+            self._add_to_shard(product_id, shards, delta)
+        else:
+            try:
+                self.products_table.update_item(
+                    Key={"product_id": product_id},
+                    UpdateExpression="ADD stock_total :delta",
+                    ConditionExpression="attribute_exists(product_id)",
+                    ExpressionAttributeValues={":delta": delta}
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in THROTTLE_ERROR_CODES:
+                    raise
+                logger.warning(f"Stock total of {product_id} throttled; moving it to sharded counting")
+                self._add_to_shard(product_id, self._promote_or_defer(product_id), delta)
+
+        with self.lock:
+            self.totals.pop(product_id, None)
+
+    def backfill(self, product_id, difference):
+        """ADD the settled ledger-minus-stored difference to a product that predates stock_total, once.
+
+        Returns True if applied now.
+        """
+        try:
+            self.products_table.update_item(
+                Key={"product_id": product_id},
+                UpdateExpression="ADD stock_total :difference SET stock_backfilled = :backfilled",
+                ConditionExpression="attribute_exists(product_id) AND attribute_not_exists(stock_backfilled)",
+                ExpressionAttributeValues={":difference": Decimal(difference), ":backfilled": True}
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            return False
+        with self.lock:
+            self.totals.pop(product_id, None)
+        return True
+
+    def _promote_or_defer(self, product_id, attempts=PROMOTE_ATTEMPTS):
+        """Promote a product, or if its record stays throttled, shard it optimistically; returns its shard count."""
+        try:
+            shards = self.promote(product_id, attempts=attempts)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in THROTTLE_ERROR_CODES:
+                raise
+            logger.warning(f"Promotion of {product_id} throttled; writing to {SHARD_COUNT} shards until it lands")
+            with self.lock:
+                self.unpromoted.add(product_id)
+            self._learn_shards(product_id, SHARD_COUNT)
+            return SHARD_COUNT
+        with self.lock:
+            self.unpromoted.discard(product_id)
+        return shards
+
+    def promote(self, product_id, shards=SHARD_COUNT, attempts=PROMOTE_ATTEMPTS):
+        """Switch a product to sharded counting; returns its shard count, set now or by another container.
+
+        Throttled attempts are retried with backoff; the last throttling error is raised.
+        """
+        for attempt in range(attempts):
+            try:
+                return self._set_shards(product_id, shards)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in THROTTLE_ERROR_CODES or attempt == attempts - 1:
+                    raise
+                time.sleep(backoff_delay(attempt))
+
+    def _set_shards(self, product_id, shards):
+        try:
+            self.products_table.update_item(
+                Key={"product_id": product_id},
+                UpdateExpression="SET stock_shards = :shards",
+                ConditionExpression="attribute_exists(product_id) AND attribute_not_exists(stock_shards)",
+                ExpressionAttributeValues={":shards": shards}
+            )
+            logger.info(f"Promoted {product_id} to {shards} stock shards")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            response = self.products_table.get_item(
+                Key={"product_id": product_id}, ProjectionExpression="stock_shards", ConsistentRead=True
+            )
+            if not (response.get("Item") or {}).get("stock_shards"):
+                raise  # the product no longer exists
+            shards = int(response["Item"]["stock_shards"])
+        self._learn_shards(product_id, shards)
+        return shards
+
+    def get_total(self, product_id, use_cache=True):
+        """Current materialized stock of a product (base total plus shards), cached for a moment."""
+        with self.lock:
+            cached = self.totals.get(product_id) if use_cache else None
+        if cached and time.monotonic() - cached[1] < TOTAL_CACHE_SECONDS:
+            return cached[0]
+
+        response = hedged_read(
+            'padeliver.get_item', self.products_table.get_item,
+            Key={"product_id": product_id},
+            ProjectionExpression="stock_total, stock_shards"
+        )
+        product = response.get("Item") or {}
+        total = Decimal(product.get("stock_total", 0))
+        self._learn_shards(product_id, product.get("stock_shards"))
+
+        if product.get("stock_shards"):
+            query_kwargs = {"KeyConditionExpression": Key("product_id").eq(product_id), "ProjectionExpression": "quantity"}
+            while True:
+                shard_response = hedged_read('stock_shards.query', self.shards_table.query, **query_kwargs)
+                total += sum(Decimal(item.get("quantity", 0)) for item in shard_response.get("Items", []))
+                if "LastEvaluatedKey" not in shard_response:
+                    break
+                query_kwargs["ExclusiveStartKey"] = shard_response["LastEvaluatedKey"]
+
+        with self.lock:
+            self.totals[product_id] = (int(total), time.monotonic())
+        return int(total)
@@ -0,0 +1,110 @@
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from utils.aws_clients import get_resource, get_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BROADCAST_MAX_WORKERS = 16
+
+def stock_message_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    if isinstance(obj, set):
+        return sorted(obj)
+    raise TypeError
+
+def changes_for_subscriber(changes, product_ids):
+    """Filter a list of stock changes down to the products a subscriber asked for (all if none)."""
+    if not product_ids:
+        return changes
+    return [change for change in changes if change["product_id"] in product_ids]
+
+class WebSocketStockChannel:
+    """Stock change subscriptions over an API Gateway WebSocket API.
+
+    Connections are kept in the subscriptions table (connection_id, endpoint, optional
+    product_ids). Broadcasts post one message per connection concurrently and drop
+    connections that API Gateway reports as gone.
+    """
+
+    def __init__(self, table=None):
+        self.subscriptions_table = table or get_resource('dynamodb').Table(os.getenv('STOCK_SUBSCRIPTIONS_TABLE'))
+
+    def add_subscriber(self, connection_id, endpoint, product_ids=None):
+        item = {"connection_id": connection_id, "endpoint": endpoint}
+        if product_ids:
+            item["product_ids"] = set(product_ids)
+        self.subscriptions_table.put_item(Item=item)
+
+    def remove_subscriber(self, connection_id):
+        self.subscriptions_table.delete_item(Key={"connection_id": connection_id})
+
+    def _subscribers(self):
+        scan_kwargs = {}
+        while True:
+            response = self.subscriptions_table.scan(**scan_kwargs)
+            yield from response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _send(self, subscriber, changes):
+        changes = changes_for_subscriber(changes, subscriber.get("product_ids"))
+        if not changes:
+            return True
+        client = get_client('apigatewaymanagementapi', endpoint_url=subscriber["endpoint"])
+        try:
+            client.post_to_connection(
+                ConnectionId=subscriber["connection_id"],
+                Data=json.dumps({"type": "stock_changes", "changes": changes}, default=stock_message_default).encode("utf-8")
+            )
+            return True
+        except client.exceptions.GoneException:
+            self.remove_subscriber(subscriber["connection_id"])
+            return False
+        except Exception as e:
+            logger.error(f"Error notifying connection {subscriber['connection_id']}: {e}")
+            return False
+
+    def broadcast(self, changes):
+        """Send the coalesced changes to every subscriber; returns the number delivered."""
+        if not changes:
+            return 0
+        with ThreadPoolExecutor(max_workers=BROADCAST_MAX_WORKERS) as executor:
+            delivered = sum(executor.map(lambda subscriber: self._send(subscriber, changes), self._subscribers()))
+        logger.info(f"Broadcast {len(changes)} stock changes to {delivered} subscribers")
+        return delivered
+
+class LocalStockChannel:
+    """In-memory stand-in for the WebSocket channel: each subscriber collects its messages in a list."""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.messages = {}
+        self.lock = threading.Lock()
+
+    def add_subscriber(self, connection_id, endpoint=None, product_ids=None):
+        with self.lock:
+            self.subscribers[connection_id] = set(product_ids or ())
+            self.messages.setdefault(connection_id, [])
+
+    def remove_subscriber(self, connection_id):
+        with self.lock:
+            self.subscribers.pop(connection_id, None)
+
+    def broadcast(self, changes):
+        delivered = 0
+        with self.lock:
+            for connection_id, product_ids in self.subscribers.items():
+                subscriber_changes = changes_for_subscriber(changes, product_ids)
+                if subscriber_changes:
+                    self.messages[connection_id].append(
+                        json.loads(json.dumps({"type": "stock_changes", "changes": subscriber_changes}, default=stock_message_default))
+                    )
+                    delivered += 1
+        return delivered
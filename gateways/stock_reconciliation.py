@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+from botocore.exceptions import ClientError #type: ignore
+from utils.aws_clients import get_resource
+from gateways.stock_counter import SETTLE_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RECONCILIATION_PREFIX = "stock_reconciliation/"
+DEFAULT_TOTAL_SEGMENTS = int(os.getenv("STOCK_RECONCILE_SEGMENTS", "32"))
+SCAN_PAGE_LIMIT = 1000
+
+def reconciliation_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else str(obj)
+    raise TypeError
+
+class StockReconciler:
+    """Recompute every product's stock from the ledger and compare it with the stored totals.
+
+    The ledger, Pa-deliver products, stock shards and legacy products tables are each read
+    with a parallel segmented scan projecting only the attributes needed. Drifted products
+    are re-checked twice, SETTLE_SECONDS apart, and only repaired when the same difference
+    shows both times: a ledger row whose stock adjustment is still in flight looks like
+    drift on a single read, and repairing it would apply the movement twice once the
+    adjustment lands. Repairs ADD the difference rather than overwrite, which keeps any
+    concurrent stock movement intact.
+
+    Targets: the Pa-deliver materialized stock (stock_total plus shards) and the `quantity`
+    kept on the legacy products table.
+    """
+
+    def __init__(self, aws_gateway, legacy_products_table=None, bucket_name=None):
+        self.aws_gateway = aws_gateway
+        self.legacy_products_table = legacy_products_table or get_resource('dynamodb').Table(os.getenv('PRODUCTS_TABLE'))
+        self.bucket_name = bucket_name or os.getenv('S3_BUCKET_NAME')
+
+    def _parallel_sum(self, table, value_attribute, total_segments, should_continue, include_zero=False):
+        """{product_id: sum of value_attribute} over a segmented scan; also returns whether it completed."""
+        def scan_segment(segment):
+            totals = defaultdict(Decimal)
+            scan_kwargs = {
+                "Segment": segment,
+                "TotalSegments": total_segments,
+                "Limit": SCAN_PAGE_LIMIT,
+                "ProjectionExpression": "product_id, #value",
+                "ExpressionAttributeNames": {"#value": value_attribute},
+            }
+            while True:
+                response = table.scan(**scan_kwargs)
+                for item in response.get("Items", []):
+                    if include_zero or value_attribute in item:
+                        totals[item["product_id"]] += Decimal(item.get(value_attribute, 0))
+                if "LastEvaluatedKey" not in response:
+                    return totals, True
+                if not should_continue():
+                    return totals, False
+                scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        merged = defaultdict(Decimal)
+        complete = True
+        with ThreadPoolExecutor(max_workers=min(total_segments, 64)) as executor:
+            for totals, segment_complete in executor.map(scan_segment, range(total_segments)):
+                complete = complete and segment_complete
+                for product_id, value in totals.items():
+                    merged[product_id] += value
+        return merged, complete
+
+    def _find_drift(self, ledger, stored):
+        return {
+            product_id: {"product_id": product_id, "ledger": ledger.get(product_id, Decimal(0)), "stored": value}
+            for product_id, value in stored.items()
+            if ledger.get(product_id, Decimal(0)) != value
+        }
+
+    def _recheck(self, product_id, read_stored):
+        """Fresh (ledger, stored) totals of one product."""
+        return Decimal(self.aws_gateway.get_product_stock(product_id)), Decimal(read_stored(product_id))
+
+    def _read_padeliver_total(self, product_id):
+        return self.aws_gateway.stock_counter.get_total(product_id, use_cache=False)
+
+    def _read_legacy_quantity(self, product_id):
+        response = self.legacy_products_table.get_item(Key={"product_id": product_id}, ProjectionExpression="quantity")
+        return (response.get("Item") or {}).get("quantity", 0)
+
+    def _repair(self, table, attribute, drift, read_stored, settle_seconds):
+        """Re-check each drifted product twice, settle_seconds apart, and ADD a difference seen both times.
+
+        Returns per-product results.
+        """
+        def recheck(entry):
+            try:
+                ledger, stored = self._recheck(entry["product_id"], read_stored)
+                return dict(entry, ledger=ledger, stored=stored)
+            except Exception as e:
+                return dict(entry, status="failed", error=str(e))
+
+        def repair(entry):
+            if "status" in entry:
+                return entry
+            try:
+                ledger, stored = self._recheck(entry["product_id"], read_stored)
+                if ledger == stored or entry["ledger"] == entry["stored"]:
+                    return dict(entry, ledger=ledger, stored=stored, status="resolved")
+                if ledger - stored != entry["ledger"] - entry["stored"]:
+                    # Stock is still moving; leave it to the next run rather than race it
+                    return dict(entry, ledger=ledger, stored=stored, status="unsettled")
+                table.update_item(
+                    Key={"product_id": entry["product_id"]},
+                    UpdateExpression=f"ADD {attribute} :difference",
+                    ConditionExpression="attribute_exists(product_id)",
+                    ExpressionAttributeValues={":difference": ledger - stored}
+                )
+                return dict(entry, ledger=ledger, stored=stored, status="repaired")
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                    return dict(entry, status="deleted")
+                return dict(entry, status="failed", error=str(e))
+            except Exception as e:
+                return dict(entry, status="failed", error=str(e))
+
+        if not drift:
+            return []
+        with ThreadPoolExecutor(max_workers=min(16, len(drift))) as executor:
+            first = list(executor.map(recheck, drift.values()))
+            time.sleep(settle_seconds)
+            return list(executor.map(repair, first))
+
+    def reconcile(self, repair=False, total_segments=DEFAULT_TOTAL_SEGMENTS, should_continue=lambda: True, settle_seconds=SETTLE_SECONDS):
+        """Compare ledger stock with the stored totals; repair drift when asked. Returns the report."""
+        started_at = datetime.now(timezone.utc)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            ledger_future = executor.submit(
+                self._parallel_sum, self.aws_gateway.inventory_table, "quantity", total_segments, should_continue, True
+            )
+            padeliver_future = executor.submit(
+                self._parallel_sum, self.aws_gateway.padeliver_table, "stock_total", max(1, total_segments // 4), should_continue, True
+            )
+            shards_future = executor.submit(
+                self._parallel_sum, self.aws_gateway.stock_counter.shards_table, "quantity", max(1, total_segments // 4), should_continue
+            )
+            legacy_future = executor.submit(
+                self._parallel_sum, self.legacy_products_table, "quantity", max(1, total_segments // 4), should_continue
+            )
+            ledger, ledger_complete = ledger_future.result()
+            padeliver, padeliver_complete = padeliver_future.result()
+            shards, shards_complete = shards_future.result()
+            legacy, legacy_complete = legacy_future.result()
+
+        complete = ledger_complete and padeliver_complete and shards_complete and legacy_complete
+        padeliver_totals = {product_id: value + shards.get(product_id, Decimal(0)) for product_id, value in padeliver.items()}
+        targets = {
+            "padeliver": (self.aws_gateway.padeliver_table, "stock_total", self._find_drift(ledger, padeliver_totals), self._read_padeliver_total),
+            "legacy": (self.legacy_products_table, "quantity", self._find_drift(ledger, legacy), self._read_legacy_quantity),
+        }
+
+        report = {
+            "started_at": started_at.isoformat(),
+            "complete": complete,
+            "repair": bool(repair and complete),
+            "products_in_ledger": len(ledger),
+            "targets": {},
+        }
+        for name, (table, attribute, drift, read_stored) in targets.items():
+            if repair and complete:
+                results = self._repair(table, attribute, drift, read_stored, settle_seconds)
+            else:
+                results = [dict(entry, status="drift") for entry in drift.values()]
+            report["targets"][name] = {
+                "checked": len(padeliver_totals if name == "padeliver" else legacy),
+                "drifted": len(drift),
+                "products": results,
+            }
+            logger.info(f"Stock reconciliation {name}: {len(drift)} drifted products")
+        report["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+        if self.bucket_name:
+            self.aws_gateway.s3.put_object(
+                Bucket=self.bucket_name,
+                Key=f"{RECONCILIATION_PREFIX}{started_at.strftime('%Y%m%dT%H%M%SZ')}.json",
+                Body=json.dumps(report, default=reconciliation_default, indent=2),
+                ContentType="application/json"
+            )
+        return report
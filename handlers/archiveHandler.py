@@ -0,0 +1,30 @@
+import json
+import logging
+from gateways.order_archive import OrderArchive, ARCHIVE_AFTER_DAYS
+from utils.lambda_runtime import lambda_handler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+order_archive = OrderArchive()
+
+ARCHIVE_TIME_RESERVE_MS = 60000  # stop scanning with time left to write the last batch
+
+@lambda_handler
+def archive_orders(event, context):
+    """Scheduled job moving completed orders older than ORDER_ARCHIVE_AFTER_DAYS to the S3 archive.
+
+    Event: {"older_than_days"?: int}. A run that runs out of time simply stops; the next
+    scheduled run picks up the remaining orders.
+    """
+    event = event or {}
+
+    def should_continue():
+        return context is None or context.get_remaining_time_in_millis() > ARCHIVE_TIME_RESERVE_MS
+
+    result = order_archive.archive_completed_orders(
+        older_than_days=int(event.get("older_than_days", ARCHIVE_AFTER_DAYS)),
+        should_continue=should_continue
+    )
+    return json.loads(json.dumps(result, default=str))
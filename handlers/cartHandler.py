@@ -1,22 +1,68 @@
 import json
 import boto3
 import os
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 from decimal import Decimal
 from datetime import datetime
 from boto3.dynamodb.conditions import Key
-
-dynamodb = boto3.resource('dynamodb')
+from gateways.awsGateway import AWSGateway
+from utils.aws_clients import get_resource, get_client, hedged_read
+from utils.circuit_breaker import is_degraded, service_unavailable
+from utils.lambda_runtime import lambda_handler
+from utils.ndjson import wants_ndjson, ndjson_response
+from utils import ledger_keys
+from utils.batching import chunked
+from models.orderModel import OrderModel
+from gateways.order_archive import OrderArchive
+from gateways.order_fulfilment import OrderFulfilment, pending_status
+
+dynamodb = get_resource('dynamodb')
 cart_table = dynamodb.Table('user_carts_rey')
 inventory_table = dynamodb.Table(os.getenv('PRODUCTS_INVENTORY_TABLE'))
 orders_table = dynamodb.Table(os.getenv('PADELIVER_ORDERS_TABLE'))  # New table for orders
-s3 = boto3.client('s3')
+s3 = get_client('s3')
 s3_bucket_name = os.getenv('S3_BUCKET_NAME')
+aws_gateway = AWSGateway()
+order_model = OrderModel()
+order_archive = OrderArchive(orders_table)
+receipt_queue_url = os.getenv('RECEIPT_QUEUE_URL')
+order_fulfilment = OrderFulfilment(
+    aws_gateway, orders_table,
+    prepare_receipt=lambda order: upload_receipt(order, status=order['status'])  # pre-generated; regenerated when Received
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_BULK_STATUS_UPDATES = 200
+ARCHIVED_ORDERS_PAGE_SIZE = 20
+STATUS_UPDATE_WORKERS = 16
+TRANSACTION_CHUNK_SIZE = 100  # DynamoDB TransactWriteItems limit
 
 def decimal_default(obj):
     if isinstance(obj, Decimal):
         return str(obj)
     raise TypeError
 
+def cart_stock_deltas(cart):
+    """Negative stock deltas per product_id for the items of a cart."""
+    deltas = {}
+    for item in cart:
+        deltas[item['product_id']] = deltas.get(item['product_id'], Decimal(0)) - Decimal(item['quantity'])
+    return deltas
+
+def get_cart_quantity(user_id, product_id):
+    """Quantity of one product in a user's cart, reading only the cart attribute."""
+    response = hedged_read('carts.get_item', cart_table.get_item, Key={'user_id': user_id}, ProjectionExpression="cart")
+    for cart_item in response.get('Item', {}).get('cart', []):
+        if cart_item.get('product_id') == product_id:
+            return int(cart_item['quantity'])
+    return 0
+
+@lambda_handler
 def add_to_cart(event, context):
     user_id = event['pathParameters']['user_id']
     product = json.loads(event['body'], parse_float=Decimal)
@@ -52,12 +98,17 @@ def add_to_cart(event, context):
         },
     }
 
+@lambda_handler
 def get_cart(event, context):
     user_id = event['pathParameters']['user_id']
 
-    response = cart_table.get_item(
-        Key={'user_id': user_id}
-    )
+    try:
+        response = hedged_read('carts.get_item', cart_table.get_item, Key={'user_id': user_id})
+    except Exception as e:
+        if is_degraded(e):
+            # Carts change with every click, so there is no stale copy worth serving
+            return service_unavailable(e)
+        raise
 
     cart = response.get('Item', {}).get('cart', [])
 
@@ -75,6 +126,7 @@ def get_cart(event, context):
         },
     }
 
+@lambda_handler
 def checkout(event, context):
     user_id = event['pathParameters']['user_id']
 
@@ -92,15 +144,15 @@ def checkout(event, context):
         }
 
     # Push all cart contents to inventory as negative quantities
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     for item in cart:
         inventory_item = {
             "product_id": item['product_id'],
             "quantity": -Decimal(item['quantity']),  # Negative quantity for purchase
             "remark": "Purchased item!",
-            "datetime": current_time  # Ensure the datetime key is included
+            "datetime": ledger_keys.new_ledger_key()  # Unique UTC ledger key
         }
         inventory_table.put_item(Item=inventory_item)
+    aws_gateway.adjust_stock_totals(cart_stock_deltas(cart))
 
     # Clear the cart after checkout
     cart_table.update_item(
@@ -118,11 +170,17 @@ def checkout(event, context):
         },
     }
 
+@lambda_handler
 def get_formatted_cart(event, context):
     user_id = event['pathParameters']['user_id']
 
     # Fetch the current cart
-    response = cart_table.get_item(Key={'user_id': user_id})
+    try:
+        response = hedged_read('carts.get_item', cart_table.get_item, Key={'user_id': user_id})
+    except Exception as e:
+        if is_degraded(e):
+            return service_unavailable(e)
+        raise
     cart = response.get('Item', {}).get('cart', [])
 
     if not cart:
@@ -134,11 +192,22 @@ def get_formatted_cart(event, context):
             },
         }
 
+    # Refresh every line price from the catalog in one bulk pass; fall back to the cart copy
+    try:
+        current_products = aws_gateway.batch_get_products(
+            [item['product_id'] for item in cart], include_stock=False
+        )
+    except Exception as e:
+        logger.warning(f"Error refreshing cart prices, using cart prices: {e}")
+        current_products = {}
+
     formatted_items = []
     total_price = Decimal(0)
 
     for item in cart:
-        item_total = Decimal(item['quantity']) * Decimal(item['price'])
+        current_product = current_products.get(item['product_id'])
+        price = current_product['price'] if current_product and current_product.get('price') is not None else item['price']
+        item_total = Decimal(item['quantity']) * Decimal(str(price))
         formatted_items.append(f"{item['quantity']}x {item['item']}: {item_total:.2f}")
         total_price += item_total
 
@@ -155,6 +224,7 @@ def get_formatted_cart(event, context):
         },
     }
 
+@lambda_handler
 def place_order(event, context):
     """Handler for placing an order."""
     user_id = event['pathParameters']['user_id']  # user_id is equivalent to customer_name
@@ -174,38 +244,35 @@ def place_order(event, context):
         # Get the current system datetime
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        # Create an order ID
-        order_id = f"ORD-{int(datetime.now().timestamp())}"
+        # Create an order ID; the suffix keeps orders placed in the same second distinct
+        order_id = f"ORD-{int(datetime.now().timestamp())}-{uuid.uuid4().hex[:8]}"
 
-        # Prepare the order data
+        # Prepare the order data; it stays pending until the fulfilment workers have run
         order_data = {
             "order_id": order_id,  # Primary key
             "customer_name": user_id,  # user_id is stored as customer_name
             "items": cart,
             "status": "Preparing",
-            "order_datetime": current_time
+            "order_datetime": current_time,
+            "fulfilment_status": pending_status()
         }
 
-        # Store the order in the orders table
-        orders_table.put_item(Item=order_data)
-
-        # Reduce inventory for each product in the cart
-        for item in cart:
-            inventory_payload = {
-                "product_id": item['product_id'],
-                "quantity": -Decimal(item['quantity']),  # Negative quantity for stock-out
-                "remark": f"Stock-out: Purchase made by {order_id}",
-                "datetime": current_time
-            }
-            inventory_table.put_item(Item=inventory_payload)
-
-        # Clear the cart after placing the order
-        cart_table.update_item(
-            Key={'user_id': user_id},
-            UpdateExpression="SET cart = :empty_cart",
-            ExpressionAttributeValues={':empty_cart': []},
-            ReturnValues="UPDATED_NEW"
-        )
+        # Store the order and clear the cart in a single write
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': orders_table.name, 'Item': order_data, 'ConditionExpression': "attribute_not_exists(order_id)"}},
+            {'Update': {
+                'TableName': cart_table.name,
+                'Key': {'user_id': user_id},
+                'UpdateExpression': "SET cart = :empty_cart",
+                'ExpressionAttributeValues': {':empty_cart': []}
+            }}
+        ])
+
+        # Ledger stock-outs, events and receipts run in the fulfilment workers; if the order
+        # cannot be queued it is fulfilled here instead, and failing that the sweep requeues it
+        if not order_fulfilment.enqueue(order_data):
+            if order_fulfilment.fulfil([order_data]):
+                logger.error(f"Order {order_id} placed but not fully fulfilled; left to the pending sweep")
 
         return {
             "statusCode": 200,
@@ -219,22 +286,46 @@ def place_order(event, context):
             "body": json.dumps({"message": f"Error placing order: {str(e)}"})
         }
 
+@lambda_handler
 def get_orders(event, context):
-    """Handler for retrieving all orders for a user."""
+    """Handler for retrieving all orders for a user.
+
+    Returns the user's current orders plus the newest ARCHIVED_ORDERS_PAGE_SIZE archived ones
+    and an "archived_before" cursor while older archived orders remain. Passing the cursor back
+    (?archived_before=<cursor>) returns only the next archived page; ?include_archived=false
+    skips the archive.
+    """
     user_id = event['pathParameters']['user_id']  # user_id is equivalent to customer_name
+    params = event.get('queryStringParameters') or {}
 
     try:
         # Query the orders table for the user's orders
-        response = orders_table.query(
-                KeyConditionExpression=Key('customer_name').eq(user_id)
+        query_kwargs = {"KeyConditionExpression": Key('customer_name').eq(user_id)}
+        orders = []
+        while True:
+            response = orders_table.query(**query_kwargs)
+            orders.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        result = {"orders": orders}
+
+        # Completed orders older than the archive cutoff live in S3, paged newest first
+        if params.get('include_archived', 'true').lower() != 'false':
+            before = params.get('archived_before')
+            hot_order_ids = {order['order_id'] for order in orders}
+            archived, next_cursor = order_archive.get_customer_orders(
+                user_id, limit=ARCHIVED_ORDERS_PAGE_SIZE, before=before
             )
-
-        orders = response.get('Items', [])
+            archived = [order for order in archived if order['order_id'] not in hot_order_ids]
+            result["orders"] = archived if before else archived + orders
+            result["archived_before"] = next_cursor
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"orders": orders}, default=decimal_default)
+            "body": json.dumps(result, default=decimal_default)
         }
     except Exception as e:
         return {
@@ -243,9 +334,16 @@ def get_orders(event, context):
             "body": json.dumps({"message": f"Error retrieving orders: {str(e)}"})
         }
 
+@lambda_handler
 def get_all_orders(event, context):
-    """Handler for retrieving all orders."""
+    """Handler for retrieving all orders (NDJSON, streamed page by page, with Accept: application/x-ndjson)."""
     try:
+        if wants_ndjson(event):
+            return ndjson_response(
+                aws_gateway.iter_table(orders_table), default=decimal_default,
+                s3_client=s3, bucket_name=s3_bucket_name, name="orders"
+            )
+
         # Scan the orders table to fetch all orders
         response = orders_table.scan()
         orders = response.get('Items', [])
@@ -262,6 +360,7 @@ def get_all_orders(event, context):
             "body": json.dumps({"message": f"Error retrieving all orders: {str(e)}"})
         }
 
+@lambda_handler
 def update_order_status(event, context):
     """Handler for updating the status of a specific order."""
     body = json.loads(event['body'])
@@ -301,6 +400,209 @@ def update_order_status(event, context):
             "body": json.dumps({"message": f"Error updating order status: {str(e)}"})
         }
 
+def _status_update_params(update):
+    """Conditional UpdateItem parameters enforcing the allowed status transition."""
+    previous_statuses = order_model.allowed_previous_statuses(update['new_status'])
+    values = {':new_status': update['new_status']}
+    placeholders = []
+    for index, status in enumerate(previous_statuses):
+        values[f':from{index}'] = status
+        placeholders.append(f':from{index}')
+    return {
+        'Key': {'order_id': update['order_id'], 'customer_name': update['customer_name']},
+        'UpdateExpression': "SET #status = :new_status",
+        'ConditionExpression': f"attribute_exists(order_id) AND #status IN ({', '.join(placeholders)})",
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': values,
+    }
+
+def _order_result(update, status, message=""):
+    return {
+        "order_id": update['order_id'],
+        "customer_name": update['customer_name'],
+        "new_status": update['new_status'],
+        "status": status,
+        "message": message
+    }
+
+def _apply_status_update(update):
+    """Apply one conditional transition and report its outcome."""
+    try:
+        orders_table.update_item(**_status_update_params(update))
+        return _order_result(update, "updated")
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return _order_result(update, "rejected", f"Order not found or cannot move to {update['new_status']}")
+        return _order_result(update, "failed", str(e))
+    except Exception as e:
+        return _order_result(update, "failed", str(e))
+
+def _apply_status_transaction(updates):
+    """Apply up to 100 transitions atomically: all succeed or none do."""
+    client = dynamodb.meta.client
+    try:
+        client.transact_write_items(TransactItems=[
+            {'Update': dict(_status_update_params(update), TableName=orders_table.name)} for update in updates
+        ])
+        return [_order_result(update, "updated") for update in updates]
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+            return [_order_result(update, "failed", str(e)) for update in updates]
+        reasons = e.response.get('CancellationReasons', [])
+        results = []
+        for index, update in enumerate(updates):
+            code = reasons[index].get('Code') if index < len(reasons) else None
+            if code == 'ConditionalCheckFailed':
+                results.append(_order_result(update, "rejected", f"Order not found or cannot move to {update['new_status']}"))
+            else:
+                results.append(_order_result(update, "failed", "Transaction cancelled" + (f": {code}" if code and code != 'None' else "")))
+        return results
+
+def queue_receipts(results):
+    """Queue receipt generation for orders that just moved to Received; returns how many were queued."""
+    received = [result for result in results if result['status'] == "updated" and result.get('new_status') == "Received"]
+    if not received or not receipt_queue_url:
+        return 0
+    sqs = get_client('sqs')
+    queued = 0
+    for chunk in chunked(received, 10):  # SQS SendMessageBatch limit
+        response = sqs.send_message_batch(
+            QueueUrl=receipt_queue_url,
+            Entries=[
+                {"Id": str(index), "MessageBody": json.dumps({"order_id": result['order_id'], "customer_name": result['customer_name']})}
+                for index, result in enumerate(chunk)
+            ]
+        )
+        queued += len(response.get('Successful', []))
+        for failure in response.get('Failed', []):
+            logger.error(f"Error queueing receipt: {failure}")
+    return queued
+
+@lambda_handler
+def bulk_update_order_status(event, context):
+    """Handler for moving many orders to new statuses in one call.
+
+    Body: {"updates": [{"order_id", "customer_name", "status"}], "transactional"?: bool, "generate_receipts"?: bool}
+    Transitions are enforced with condition expressions. By default each order is updated
+    independently and concurrently; with "transactional" each group of up to 100 orders is
+    applied all-or-nothing. Per-order results are returned.
+    """
+    body = json.loads(event.get('body') or "{}")
+    updates = body.get('updates')
+
+    if not isinstance(updates, list) or not updates:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "Invalid input: Expected a non-empty list of updates"})
+        }
+
+    if len(updates) > MAX_BULK_STATUS_UPDATES:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Too many updates: at most {MAX_BULK_STATUS_UPDATES} per request"})
+        }
+
+    valid, results = order_model.parse_status_updates(updates)
+
+    try:
+        if body.get('transactional'):
+            for chunk in chunked(valid, TRANSACTION_CHUNK_SIZE):
+                results.extend(_apply_status_transaction(chunk))
+        elif valid:
+            with ThreadPoolExecutor(max_workers=min(STATUS_UPDATE_WORKERS, len(valid))) as executor:
+                results.extend(executor.map(_apply_status_update, valid))
+
+        receipts_queued = queue_receipts(results) if body.get('generate_receipts') else 0
+        updated = sum(1 for result in results if result['status'] == "updated")
+        succeeded = all(result['status'] in ("updated", "superseded") for result in results)
+
+        return {
+            "statusCode": 200 if succeeded else 207,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"updated": updated, "receipts_queued": receipts_queued, "results": results})
+        }
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Error updating order statuses: {str(e)}"})
+        }
+
+@lambda_handler
+def process_receipt_queue(event, context):
+    """SQS consumer generating receipts for orders moved to Received; reports partial batch failures."""
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            message = json.loads(record['body'])
+            response = orders_table.get_item(Key={'order_id': message['order_id'], 'customer_name': message['customer_name']})
+            order = response.get('Item') or order_archive.find_order(message['customer_name'], message['order_id'])
+            if not order:
+                logger.error(f"Receipt requested for missing order {message['order_id']}")
+                continue
+            upload_receipt(order)
+        except Exception as e:
+            logger.error(f"Error generating queued receipt: {e}")
+            failures.append({"itemIdentifier": record['messageId']})
+    return {"batchItemFailures": failures}
+
+@lambda_handler
+def process_fulfilment_queue(event, context):
+    """SQS consumer fulfilling placed orders in batches; reports partial batch failures."""
+    orders = {}
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            order = json.loads(record['body'], parse_float=Decimal)
+            orders[record['messageId']] = order
+        except Exception as e:
+            logger.error(f"Malformed fulfilment message {record['messageId']}: {e}")
+
+    failed_order_ids = order_fulfilment.fulfil(list(orders.values())) if orders else set()
+    failures.extend(
+        {"itemIdentifier": message_id} for message_id, order in orders.items() if order['order_id'] in failed_order_ids
+    )
+    return {"batchItemFailures": failures}
+
+@lambda_handler
+def sweep_pending_fulfilments(event, context):
+    """Scheduled job re-queueing orders still pending fulfilment.
+
+    Event: {"settle_seconds"?: int}. Orders younger than the settle delay are left to the
+    queue workers already handling them.
+    """
+    event = event or {}
+    settle_seconds = int(event.get("settle_seconds", os.getenv("FULFILMENT_SWEEP_SETTLE_SECONDS", "600")))
+    result = order_fulfilment.sweep(settle_seconds)
+    if result["failed"]:
+        logger.error(f"{result['failed']} pending orders could not be requeued or fulfilled")
+    return result
+
+def upload_receipt(order, status="Received"):
+    """Render an order's receipt, upload it to S3 and return its URL."""
+    order_id = order['order_id']
+    receipt_content = f"Order Receipt\n\nOrder ID: {order_id}\nCustomer Name: {order['customer_name']}\n"
+    receipt_content += f"Order Date: {order['order_datetime']}\nStatus: {status}\n\nItems:\n"
+
+    for item in order.get('items', []):
+        receipt_content += f"- {item['quantity']}x {item['item']} @ {item['price']} each\n"
+
+    receipt_content += f"\nTotal Items: {len(order.get('items', []))}\n"
+
+    # Upload the receipt to S3
+    receipt_key = f"receipts/{order_id}.txt"
+    s3.put_object(
+        Bucket=s3_bucket_name,
+        Key=receipt_key,
+        Body=receipt_content,
+        ContentType='text/plain'
+    )
+
+    return f"https://{s3_bucket_name}.s3.amazonaws.com/{receipt_key}"
+
+@lambda_handler
 def generate_receipt(event, context):
     """Handler for generating a receipt for a specific order."""
     body = json.loads(event['body'])
@@ -319,6 +621,18 @@ def generate_receipt(event, context):
         response = orders_table.get_item(Key={'order_id': order_id, 'customer_name': customer_name})
         order = response.get('Item')
 
+        if order:
+            # Update order status to "Received"
+            orders_table.update_item(
+                Key={'order_id': order_id, 'customer_name': customer_name},
+                UpdateExpression="SET #status = :new_status",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={":new_status": "Received"}
+            )
+        else:
+            # Archived orders are already completed; only the receipt is regenerated
+            order = order_archive.find_order(customer_name, order_id)
+
         if not order:
             return {
                 "statusCode": 404,
@@ -326,33 +640,7 @@ def generate_receipt(event, context):
                 "body": json.dumps({"message": "Order not found"})
             }
 
-        # Update order status to "Received"
-        orders_table.update_item(
-            Key={'order_id': order_id, 'customer_name': customer_name},
-            UpdateExpression="SET #status = :new_status",
-            ExpressionAttributeNames={"#status": "status"},
-            ExpressionAttributeValues={":new_status": "Received"}
-        )
-
-        # Generate receipt content
-        receipt_content = f"Order Receipt\n\nOrder ID: {order_id}\nCustomer Name: {customer_name}\n"
-        receipt_content += f"Order Date: {order['order_datetime']}\nStatus: Received\n\nItems:\n"
-
-        for item in order.get('items', []):
-            receipt_content += f"- {item['quantity']}x {item['item']} @ {item['price']} each\n"
-
-        receipt_content += f"\nTotal Items: {len(order.get('items', []))}\n"
-
-        # Upload the receipt to S3
-        receipt_key = f"receipts/{order_id}.txt"
-        s3.put_object(
-            Bucket=s3_bucket_name,
-            Key=receipt_key,
-            Body=receipt_content,
-            ContentType='text/plain'
-        )
-
-        receipt_url = f"https://{s3_bucket_name}.s3.amazonaws.com/{receipt_key}"
+        receipt_url = upload_receipt(order)
 
         return {
             "statusCode": 200,
@@ -366,6 +654,7 @@ def generate_receipt(event, context):
             "body": json.dumps({"message": f"Error generating receipt: {str(e)}"})
         }
 
+@lambda_handler
 def edit_cart_product_quantity(event, context):
     """Edit the quantity of a product in the user's cart."""
     user_id = event['pathParameters']['user_id']
@@ -409,6 +698,7 @@ def edit_cart_product_quantity(event, context):
         'headers': {'Content-Type': 'application/json'}
     }
 
+@lambda_handler
 def delete_cart_product(event, context):
     """Delete a product from the user's cart."""
     user_id = event['pathParameters']['user_id']
@@ -0,0 +1,36 @@
+import logging
+from gateways.awsGateway import AWSGateway
+from gateways.catalog_snapshot import CatalogSnapshot, STOCK_MAX_AGE_SECONDS, is_catalog_change
+from utils.lambda_runtime import lambda_handler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+aws_gateway = AWSGateway()
+catalog_snapshot = CatalogSnapshot(aws_gateway)
+
+@lambda_handler
+def regenerate_catalog_snapshot(event, context):
+    """Pa-deliver products stream consumer that rebuilds the static catalog snapshot.
+
+    The stream's batching window debounces catalog writes: every add, edit, delete, batch
+    create and CSV import landing in the window produces a single regeneration. Batches that
+    only move stock counters regenerate at most every CATALOG_SNAPSHOT_STOCK_MAX_AGE_SECONDS.
+    Invoked without records (manually or on the backstop schedule) it always regenerates.
+
+    Failures are logged and the batch is acknowledged: retrying would hold up the shard
+    that broadcastStockChanges also reads, and the snapshot is rebuilt from the table, not
+    from the records, so the next change or the schedule catches up.
+    """
+    records = (event or {}).get("Records", [])
+    if records and not any(is_catalog_change(record) for record in records):
+        age = catalog_snapshot.stock_age_seconds()
+        if age is not None and age < STOCK_MAX_AGE_SECONDS:
+            return {"batchItemFailures": []}
+
+    try:
+        catalog_snapshot.regenerate()
+    except Exception as e:
+        logger.error(f"Error regenerating catalog snapshot, left to the next change or schedule: {e}")
+    return {"batchItemFailures": []}
@@ -0,0 +1,51 @@
+import os
+import json
+import logging
+from datetime import datetime, timezone
+from gateways.export_gateway import ExportGateway
+from utils.aws_clients import get_client
+from utils.lambda_runtime import lambda_handler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+export_gateway = ExportGateway()
+
+EXPORT_TIME_RESERVE_MS = 60000  # stop scanning with time left to close files and save the manifest
+
+@lambda_handler
+def export_tables(event, context):
+    """Export the catalog, ledger and orders tables to S3 (scheduled or invoked manually).
+
+    Event: {"export_id"?, "tables"?: ["catalog", "ledger", "orders"], "format"?: "ndjson"|"csv", "segments"?: int}
+    If time runs out the manifest keeps each segment's scan position, and the function
+    re-invokes itself asynchronously with the same export_id to carry on.
+    """
+    event = event or {}
+    export_id = event.get("export_id") or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    def should_continue():
+        return context is None or context.get_remaining_time_in_millis() > EXPORT_TIME_RESERVE_MS
+
+    manifest = export_gateway.run_export(
+        export_id,
+        tables=event.get("tables"),
+        export_format=event.get("format", "ndjson"),
+        total_segments=event.get("segments"),
+        should_continue=should_continue
+    )
+
+    if manifest["status"] != "complete" and context is not None:
+        logger.info(f"Export {export_id} incomplete; continuing in a new invocation")
+        get_client('lambda').invoke(
+            FunctionName=context.function_name,
+            InvocationType="Event",
+            Payload=json.dumps({"export_id": export_id})
+        )
+
+    return {
+        "export_id": export_id,
+        "status": manifest["status"],
+        "manifest": f"s3://{os.getenv('S3_BUCKET_NAME')}/{export_gateway.manifest_key(export_id)}"
+    }
@@ -1,8 +1,18 @@
+import os
 import json
 from gateways.awsGateway import AWSGateway
+from gateways.stock_reconciliation import StockReconciler, DEFAULT_TOTAL_SEGMENTS, SETTLE_SECONDS
+from utils.lambda_runtime import lambda_handler
+from utils.ndjson import wants_ndjson, ndjson_response
+from utils import ledger_keys
 from decimal import Decimal
+from datetime import datetime, timezone
 
 aws_gateway = AWSGateway()
+stock_reconciler = StockReconciler(aws_gateway)
+
+MIGRATION_TIME_RESERVE_MS = 30000  # stop migrating with enough time left to return a resume key
+RECONCILE_TIME_RESERVE_MS = 300000  # stop scanning with time left to re-check, settle and repair both targets' drift
 
 def decimal_default(obj):
     """Convert Decimal to int or float for JSON serialization."""
@@ -10,9 +20,15 @@ def decimal_default(obj):
         return int(obj) if obj % 1 == 0 else float(obj)
     raise TypeError
 
+@lambda_handler
 def get_all_inventory(event, context):
-    """Handler for retrieving all inventory records."""
+    """Handler for retrieving all inventory records (NDJSON, streamed page by page, with Accept: application/x-ndjson)."""
     try:
+        if wants_ndjson(event):
+            return ndjson_response(
+                aws_gateway.iter_table(aws_gateway.inventory_table), default=decimal_default,
+                s3_client=aws_gateway.s3, bucket_name=os.getenv('S3_BUCKET_NAME'), name="inventory"
+            )
         inventory = aws_gateway.get_all_inventory()
         return {
             "statusCode": 200,
@@ -25,3 +41,127 @@ def get_all_inventory(event, context):
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"message": f"Error retrieving inventory: {str(e)}"})
         }
+
+@lambda_handler
+def get_padeliver_stock_as_of(event, context):
+    """Handler for the stock of a product as of a point in time (?as_of=ISO-8601, defaults to now)."""
+    product_id = event['pathParameters']['product_id']
+    params = event.get("queryStringParameters") or {}
+
+    try:
+        as_of = ledger_keys.parse_query_time(params["as_of"]) if params.get("as_of") else datetime.now(timezone.utc)
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "Invalid as_of: expected an ISO 8601 datetime"})
+        }
+
+    try:
+        stock = aws_gateway.get_stock_as_of(product_id, as_of)
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"product_id": product_id, "as_of": as_of.isoformat(), "stock": stock})
+        }
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Error retrieving stock: {str(e)}"})
+        }
+
+@lambda_handler
+def get_padeliver_inventory_movements(event, context):
+    """Handler for the ledger movements of a product between ?start= and ?end= (ISO 8601)."""
+    product_id = event['pathParameters']['product_id']
+    params = event.get("queryStringParameters") or {}
+
+    if not params.get("start") or not params.get("end"):
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "Missing required query parameters: start and end"})
+        }
+
+    try:
+        start = ledger_keys.parse_query_time(params["start"])
+        end = ledger_keys.parse_query_time(params["end"])
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "Invalid start or end: expected ISO 8601 datetimes"})
+        }
+
+    try:
+        movements = aws_gateway.get_inventory_movements(product_id, start, end)
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"product_id": product_id, "movements": movements}, default=decimal_default)
+        }
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Error retrieving inventory movements: {str(e)}"})
+        }
+
+@lambda_handler
+def migrate_ledger_keys(event, context):
+    """One-off job rewriting legacy ledger rows to the uniform UTC key format.
+
+    Invoke repeatedly, passing the returned `last_evaluated_key` as `start_key`, until it is null.
+    """
+    def should_continue():
+        return context is None or context.get_remaining_time_in_millis() > MIGRATION_TIME_RESERVE_MS
+
+    result = aws_gateway.migrate_ledger_keys((event or {}).get("start_key"), should_continue)
+    return json.loads(json.dumps(result, default=decimal_default))
+
+@lambda_handler
+def backfill_stock_totals(event, context):
+    """Seed stock_total from the ledger for products created before it existed.
+
+    Event: {"settle_seconds"?: int}. Safe to re-run: each product is backfilled once, and only
+    with a difference that held across the settle delay. Invoke again while "complete" is false
+    or products are "unsettled".
+    """
+    return aws_gateway.backfill_stock_totals(
+        should_continue=lambda: context is None or context.get_remaining_time_in_millis() > RECONCILE_TIME_RESERVE_MS,
+        settle_seconds=int((event or {}).get("settle_seconds", SETTLE_SECONDS))
+    )
+
+@lambda_handler
+def reconcile_stock(event, context):
+    """Scheduled job comparing ledger stock with the materialized and legacy stock totals.
+
+    Event: {"repair"?: bool, "segments"?: int, "settle_seconds"?: int}. Repairs default to
+    STOCK_RECONCILE_REPAIR. When repairing, products not yet backfilled are backfilled first;
+    repairs only run when every scan finished within the time budget, and both only touch
+    drift that is unchanged after the settle delay. A report-only run writes nothing but the
+    report. The full report is written to S3; the response carries the drift counts.
+    """
+    event = event or {}
+    repair = event.get("repair", os.getenv("STOCK_RECONCILE_REPAIR", "false").lower() == "true")
+    settle_seconds = int(event.get("settle_seconds", SETTLE_SECONDS))
+
+    def should_continue():
+        return context is None or context.get_remaining_time_in_millis() > RECONCILE_TIME_RESERVE_MS
+
+    backfill = {"backfilled": 0}
+    if repair:
+        backfill = aws_gateway.backfill_stock_totals(should_continue=should_continue, settle_seconds=settle_seconds)
+    report = stock_reconciler.reconcile(
+        repair=repair,
+        total_segments=int(event.get("segments", DEFAULT_TOTAL_SEGMENTS)),
+        should_continue=should_continue,
+        settle_seconds=settle_seconds
+    )
+    return {
+        "complete": report["complete"],
+        "backfilled": backfill["backfilled"],
+        "repair": report["repair"],
+        "drifted": {name: target["drifted"] for name, target in report["targets"].items()},
+    }
@@ -1,12 +1,23 @@
 import os
+import csv
 import json
 import logging
 from datetime import datetime
 from decimal import Decimal
+from io import StringIO
 from gateways import dynamodb_gateway
-from gateways.awsGateway import AWSGateway
+from gateways.awsGateway import AWSGateway, PROTECTED_PRODUCT_ATTRIBUTES
+from gateways.catalog_snapshot import CatalogSnapshot
+from gateways.recommendations_gateway import RecommendationsGateway
 from models.padeliverModel import PadeliverModel
-from handlers.cartHandler import get_cart
+from handlers.cartHandler import get_cart_quantity
+from utils.circuit_breaker import StaleCache, is_degraded, service_unavailable
+from utils.lambda_runtime import lambda_handler
+from utils.ndjson import wants_ndjson, ndjson_response
+from utils.warmup import register_primer
+from utils import ledger_keys
+from utils.batching import chunked
+from utils.s3_multipart import GzipMultipartWriter
 import boto3
 from boto3.dynamodb.conditions import Key
 
@@ -16,25 +27,139 @@ logger = logging.getLogger(__name__)
 
 aws_gateway = AWSGateway()
 padeliver_model = PadeliverModel()
-dynamodb = boto3.resource('dynamodb')
-padeliver_table = dynamodb.Table('PADELIVER_PRODUCTS_TABLE')  # Replace with the actual table name or environment variable
+catalog_snapshot = CatalogSnapshot(aws_gateway)
+recommendations_gateway = RecommendationsGateway()
+stale_cache = StaleCache()  # last good catalog reads, served while the products table is unavailable
+register_primer(lambda: aws_gateway.product_exists("__warmup__"))  # opens the Pa-deliver table on warmup
+
+MAX_BULK_PRODUCT_IDS = 500
+INVENTORY_CSV_PREFIX = 'for_padeliver_inventory/'
+INVENTORY_RESULTS_PREFIX = 'padeliver_inventory_results/'
+INVENTORY_CSV_CHUNK_SIZE = 500
+CATALOG_SNAPSHOT_MODE = os.getenv('CATALOG_SNAPSHOT_MODE', 'proxy')  # proxy | redirect | off
+
+def decimal_default(obj):
+    """Convert Decimal to int or float for JSON serialization."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError
+
+def catalog_snapshot_response(name):
+    """Serve a browse read from the static catalog snapshot; None to fall back to DynamoDB.
+
+    In proxy mode the snapshot body is returned (cached per version in the container); in
+    redirect mode the client is sent to a short-lived presigned URL of the gzip object.
+    """
+    if CATALOG_SNAPSHOT_MODE not in ('proxy', 'redirect'):
+        return None
+    try:
+        pointer = catalog_snapshot.latest()
+        if not pointer:
+            return None
+        headers = {'Content-Type': 'application/json', 'X-Catalog-Version': pointer['version']}
+        if CATALOG_SNAPSHOT_MODE == 'redirect':
+            return {'statusCode': 302, 'headers': {**headers, 'Location': catalog_snapshot.redirect_url(name)}, 'body': ''}
+        return {'statusCode': 200, 'headers': headers, 'body': catalog_snapshot.load(name)}
+    except Exception as e:
+        logger.warning(f"Catalog snapshot {name} unavailable, reading DynamoDB: {e}")
+        return None
+
+def stale_headers(age_seconds, version=None):
+    headers = {'Content-Type': 'application/json', 'X-Data-Stale': 'true', 'Age': str(max(0, int(age_seconds)))}
+    if version:
+        headers['X-Catalog-Version'] = version
+    return headers
+
+def stale_catalog_response(name, error):
+    """Serve a catalog list while the products table is unavailable, marked stale.
+
+    The snapshot is used whatever CATALOG_SNAPSHOT_MODE says, then the container's last
+    good response; without either the caller gets 503 with Retry-After.
+    """
+    logger.warning(f"Products table unavailable, serving stale {name}: {error}")
+    try:
+        pointer = catalog_snapshot.latest()
+        if pointer:
+            return {
+                'statusCode': 200,
+                'headers': stale_headers(catalog_snapshot.stock_age_seconds(), pointer['version']),
+                'body': catalog_snapshot.load(name)
+            }
+    except Exception as e:
+        logger.warning(f"Catalog snapshot {name} unavailable as a stale fallback: {e}")
+    cached = stale_cache.recall(name)
+    if cached:
+        body, age = cached
+        return {'statusCode': 200, 'headers': stale_headers(age), 'body': body}
+    return service_unavailable(error)
+
+def stale_product_response(product_id, error):
+    """Serve one product while its tables are unavailable, marked stale, from the last good read or the snapshot."""
+    logger.warning(f"Product tables unavailable, serving stale product {product_id}: {error}")
+    cached = stale_cache.recall(('product', product_id))
+    if cached:
+        product, age = cached
+        return {'statusCode': 200, 'headers': stale_headers(age), 'body': json.dumps({**product, 'stale': True})}
+    try:
+        product = catalog_snapshot.product(product_id)
+        if product:
+            return {
+                'statusCode': 200,
+                'headers': stale_headers(catalog_snapshot.stock_age_seconds(), catalog_snapshot.latest()['version']),
+                'body': json.dumps({**product, 'stale': True})
+            }
+    except Exception as e:
+        logger.warning(f"Catalog snapshot unavailable as a stale fallback for {product_id}: {e}")
+    return service_unavailable(error)
+
+def view_product_or_stale(product_id):
+    """aws_gateway.view_product, falling back to stale data when the tables are unavailable."""
+    try:
+        response = aws_gateway.view_product(product_id)
+    except Exception as e:
+        return stale_product_response(product_id, e)
+    if response["statusCode"] == 200:
+        stale_cache.remember(('product', product_id), json.loads(response["body"]))
+    return response
 
+def resolve_product_id(item):
+    """product_id of an item name (None if there is none); the last good answer is reused while the table is unavailable."""
+    try:
+        product_name_item = aws_gateway.get_product_name(item, projection=("product_id",))
+    except Exception as e:
+        cached = stale_cache.recall(('item', item))
+        if is_degraded(e) and cached:
+            return cached[0]
+        raise
+    product_id = product_name_item["product_id"] if product_name_item else None
+    if product_id:
+        stale_cache.remember(('item', item), product_id)
+    return product_id
+
+@lambda_handler
 def get_padeliver_products(event, context):
     """Handler for retrieving all padeliver products."""
+    snapshot = catalog_snapshot_response('products')
+    if snapshot:
+        return snapshot
     try:
-        response = padeliver_table.scan()
-        items = response.get('Items', [])
+        items = aws_gateway.scan_all_padeliver_products()
+        body = json.dumps(items, default=decimal_default)
+        stale_cache.remember('products', body)
         return {
             "statusCode": 200,
             'headers': {'Content-Type': 'application/json',},
-            "body": json.dumps(items)
+            "body": body
         }
     except Exception as e:
+        if is_degraded(e):
+            return stale_catalog_response('products', e)
         return {
             "statusCode": 500,
             "body": json.dumps({"message": f"Error retrieving products: {str(e)}"})
         }
 
+@lambda_handler
 def process_padeliver_csv(event, context):
     """Handler for processing CSV files uploaded to S3 for batch creation or deletion of Pa-deliver products."""
     bucket_name = os.getenv('S3_BUCKET_NAME')
@@ -43,6 +168,13 @@ def process_padeliver_csv(event, context):
         key = record['s3']['object']['key']
         logger.info(f"Processing file from S3: bucket={bucket_name}, key={key}")
 
+        if key.startswith(INVENTORY_CSV_PREFIX):
+            try:
+                process_inventory_csv(bucket_name, key)
+            except Exception as e:
+                logger.error(f"Error processing inventory file {key}: {e}")
+            continue
+
         # Fetch the content of the uploaded file
         content = aws_gateway.get_s3_object(bucket_name, key)
         if content:
@@ -50,13 +182,17 @@ def process_padeliver_csv(event, context):
                 if key.startswith('for_padeliver_create/'):
                     # Process the CSV for batch creation
                     products = padeliver_model.process_create_csv(content)
-                    aws_gateway.batch_create_products(products)
-                    logger.info(f"Batch created {len(products)} products from file: {key}")
+                    results = aws_gateway.batch_create_products(products)
+                    logger.info(f"Batch created {len(results['succeeded'])} products from file: {key}")
+                    if results["failed"]:
+                        logger.error(f"{len(results['failed'])} products failed from file {key}: {results['failed']}")
                 elif key.startswith('for_padeliver_delete/'):
                     # Process the CSV for batch deletion
                     product_ids = padeliver_model.process_delete_csv(content)
-                    aws_gateway.batch_delete_products(product_ids)
-                    logger.info(f"Batch deleted {len(product_ids)} products from file: {key}")
+                    results = aws_gateway.batch_delete_products(product_ids)
+                    logger.info(f"Batch deleted {len(results['succeeded'])} products from file: {key}")
+                    if results["failed"]:
+                        logger.error(f"{len(results['failed'])} deletions failed from file {key}: {results['failed']}")
             except Exception as e:
                 logger.error(f"Error processing file {key}: {e}")
         else:
@@ -68,16 +204,123 @@ def process_padeliver_csv(event, context):
         'headers': {'Content-Type': 'application/json'},
     }
 
+def process_inventory_csv(bucket_name, key):
+    """Apply an inventory delta CSV (product_id, quantity, remark) streamed from S3.
+
+    Rows are handled in chunks: product existence is checked with one bulk lookup per chunk,
+    ledger rows are written and the materialized stock totals adjusted. A per-row result
+    report is written to INVENTORY_RESULTS_PREFIX.
+
+    Ledger keys are derived from the object version (bucket, key, ETag) and the row number and
+    written only if absent, so when S3 retries the event after a timeout the rows applied by
+    the first attempt are reported "already_applied" and not added to stock again.
+    """
+    report_key = f"{INVENTORY_RESULTS_PREFIX}{key[len(INVENTORY_CSV_PREFIX):]}.results.csv.gz"
+    head = aws_gateway.s3.head_object(Bucket=bucket_name, Key=key)
+    uploaded_at = head["LastModified"]
+    seed_prefix = f"{bucket_name}/{key}/{head['ETag'].strip(chr(34))}"
+    rows = padeliver_model.iter_inventory_csv(aws_gateway.stream_s3_lines(bucket_name, key))
+    summary = {"applied": 0, "failed": 0}
+
+    with GzipMultipartWriter(aws_gateway.s3, bucket_name, report_key, content_type="text/csv") as report:
+        report.write("row_number,product_id,quantity,status,message\n")
+
+        def write_result(row, status, message=""):
+            summary["applied" if status in ("applied", "already_applied") else "failed"] += 1
+            line = StringIO()
+            csv.writer(line).writerow([row["row_number"], row["product_id"], row["quantity"], status, message])
+            report.write(line.getvalue())
+
+        for chunk in chunked(rows, INVENTORY_CSV_CHUNK_SIZE):
+            parsed = [row for row in chunk if "error" not in row]
+            existing = aws_gateway.batch_get_products([row["product_id"] for row in parsed], include_stock=False)
+
+            ledger_rows = {}
+            for row in chunk:
+                if "error" in row:
+                    write_result(row, "rejected", row["error"])
+                elif row["product_id"] not in existing:
+                    write_result(row, "rejected", "Product not found")
+                else:
+                    ledger_key = ledger_keys.derived_ledger_key(uploaded_at, f"{seed_prefix}#{row['row_number']}")
+                    ledger_rows[(row["product_id"], ledger_key)] = (row, {
+                        "product_id": row["product_id"],
+                        "quantity": row["quantity"],
+                        "remark": row["remark"],
+                        "datetime": ledger_key
+                    })
+
+            results = aws_gateway.add_inventory_items_once([item for _, item in ledger_rows.values()])
+            deltas = {}
+            for written in results["written"]:
+                row, item = ledger_rows[(written["product_id"], written["datetime"])]
+                deltas[row["product_id"]] = deltas.get(row["product_id"], 0) + item["quantity"]
+                write_result(row, "applied")
+            for existing in results["existing"]:
+                row, _ = ledger_rows[(existing["product_id"], existing["datetime"])]
+                write_result(row, "already_applied", "Applied by an earlier attempt")
+            for failure in results["failed"]:
+                row, _ = ledger_rows[(failure["key"]["product_id"], failure["key"]["datetime"])]
+                write_result(row, "failed", failure["error"])
+
+            for failure in aws_gateway.adjust_stock_totals(deltas):
+                logger.error(f"Stock total not updated for {failure['product_id']} from file {key}: {failure['error']}")
+
+    logger.info(f"Inventory file {key}: {summary['applied']} rows applied, {summary['failed']} not applied; report at {report_key}")
+    return summary
+
+@lambda_handler
+def get_padeliver_catalog_changes(event, context):
+    """Handler for incremental catalog sync: products changed or deleted since a sync version.
+
+    ?since=<version>&limit=<n>. Without `since` (or when it is older than the tombstone
+    retention) the response asks for a full resync, e.g. from the catalog snapshot. Clients
+    store the returned "version" and keep calling while "has_more" is true.
+    """
+    params = event.get("queryStringParameters") or {}
+    try:
+        limit = int(params["limit"]) if params.get("limit") else None
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "limit must be an integer"})
+        }
+
+    try:
+        changes = aws_gateway.get_catalog_changes(params.get("since"), limit)
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(changes, default=decimal_default)
+        }
+    except Exception as e:
+        logger.error(f"Error fetching catalog changes: {e}")
+        return {
+            "statusCode": 500,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Error fetching catalog changes: {str(e)}"})
+        }
+
+@lambda_handler
 def get_padeliver_product_names(event, context):
-    product_names = aws_gateway.get_product_names()
+    snapshot = catalog_snapshot_response('names')
+    if snapshot:
+        return snapshot
+    try:
+        product_names = json.dumps(aws_gateway.get_product_names())
+    except Exception as e:
+        return stale_catalog_response('names', e)
+    stale_cache.remember('names', product_names)
     return {
         'statusCode': 200,
-        'body': json.dumps(product_names),
+        'body': product_names,
         'headers': {
             'Content-Type': 'application/json',
         },
     }
 
+@lambda_handler
 def view_padeliver_product_by_id_or_name(event, context):
     """Handler for viewing a padeliver product by product_id or item header."""
     headers = event.get("headers", {})
@@ -98,16 +341,16 @@ def view_padeliver_product_by_id_or_name(event, context):
 
     if item:
         try:
-            product_name_item = aws_gateway.get_product_name(item)
-            if product_name_item:
-                product_id = product_name_item["product_id"]
-            else:
+            product_id = resolve_product_id(item)
+            if not product_id:
                 return {
                     "statusCode": 404,
                     "headers": {"Content-Type": "application/json"},
                     "body": json.dumps({"message": "Item not found"})
                 }
         except Exception as e:
+            if is_degraded(e):
+                return service_unavailable(e)
             return {
                 "statusCode": 500,
                 "headers": {"Content-Type": "application/json"},
@@ -120,10 +363,20 @@ def view_padeliver_product_by_id_or_name(event, context):
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"message": "Invalid product_id"})
         }
-    response = aws_gateway.view_product(product_id)
-    response["headers"] = {"Content-Type": "application/json"}
+    response = view_product_or_stale(product_id)
+    response.setdefault("headers", {"Content-Type": "application/json"})
+    if response["statusCode"] == 200:
+        try:
+            related = recommendations_gateway.get_related(product_id)
+        except Exception as e:
+            logger.warning(f"Recommendations unavailable for {product_id}: {e}")
+            related = []
+        product = json.loads(response["body"])
+        product["frequently_bought_together"] = related
+        response["body"] = json.dumps(product)
     return response
 
+@lambda_handler
 def view_padeliver_product_by_id_or_name_with_user(event, context):
     """Handler for viewing a padeliver product by product_id or item header with user-specific cart details."""
     headers = event.get("headers", {})
@@ -145,16 +398,16 @@ def view_padeliver_product_by_id_or_name_with_user(event, context):
 
     if item:
         try:
-            product_name_item = aws_gateway.get_product_name(item)
-            if product_name_item:
-                product_id = product_name_item["product_id"]
-            else:
+            product_id = resolve_product_id(item)
+            if not product_id:
                 return {
                     "statusCode": 404,
                     "headers": {"Content-Type": "application/json"},
                     "body": json.dumps({"message": "Item not found"})
                 }
         except Exception as e:
+            if is_degraded(e):
+                return service_unavailable(e)
             return {
                 "statusCode": 500,
                 "headers": {"Content-Type": "application/json"},
@@ -169,28 +422,75 @@ def view_padeliver_product_by_id_or_name_with_user(event, context):
         }
 
     # Fetch the product details
-    response = aws_gateway.view_product(product_id)
+    response = view_product_or_stale(product_id)
+    if response["statusCode"] == 503:
+        return response
     product = json.loads(response["body"])
 
-    # Fetch the user's cart
-    cart_response = get_cart({"pathParameters": {"user_id": user_id}}, context)
-    cart_data = json.loads(cart_response["body"])
+    # Only the cart attribute is read, and no JSON round trip through the get_cart handler
+    try:
+        product["in_user_cart"] = get_cart_quantity(user_id, product_id)
+    except Exception as e:
+        if is_degraded(e):
+            return service_unavailable(e)
+        raise
 
-    # Ensure cart_data is a dictionary and extract the cart list
-    cart = cart_data.get("cart", []) if isinstance(cart_data, dict) else []
+    response["body"] = json.dumps(product, default=aws_gateway.decimal_default)
+    response.setdefault("headers", {"Content-Type": "application/json"})
+    return response
 
-    product["in_user_cart"] = 0
+@lambda_handler
+def get_padeliver_products_bulk(event, context):
+    """Handler for resolving many padeliver products (name, current price and stock) in one call."""
+    body = json.loads(event.get("body") or "{}")
+    product_ids = body.get("product_ids")
 
-    # Find the matching product in the user's cart and append the quantity
-    for cart_item in cart:
-        if cart_item.get("product_id") == product_id:
-            product["in_user_cart"] = int(cart_item["quantity"])  # Convert to int
-            break
+    if (not isinstance(product_ids, list) or not product_ids
+            or not all(isinstance(product_id, str) and product_id.strip() for product_id in product_ids)):
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "Invalid input: Expected a non-empty list of non-empty product_id strings"})
+        }
 
-    response["body"] = json.dumps(product, default=aws_gateway.decimal_default)
-    response["headers"] = {"Content-Type": "application/json"}
-    return response
+    if len(product_ids) > MAX_BULK_PRODUCT_IDS:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Too many product_ids: at most {MAX_BULK_PRODUCT_IDS} per request"})
+        }
+
+    try:
+        products = aws_gateway.batch_get_products(product_ids)
+
+        found = []
+        missing = []
+        for product_id in dict.fromkeys(product_ids):
+            product = products.get(product_id)
+            if product:
+                found.append({
+                    "product_id": product_id,
+                    "item": product.get("item"),
+                    "price": product.get("price"),
+                    "stock": product.get("stock", 0)
+                })
+            else:
+                missing.append(product_id)
+
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"products": found, "missing": missing}, default=decimal_default)
+        }
+    except Exception as e:
+        logger.error(f"Error resolving bulk products: {e}")
+        return {
+            "statusCode": 500,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Error resolving products: {str(e)}"})
+        }
 
+@lambda_handler
 def add_padeliver_inventory(event, context):
     """Handler for adding inventory to a padeliver product."""
     body = json.loads(event.get("body", "{}"), parse_float=Decimal)
@@ -206,27 +506,31 @@ def add_padeliver_inventory(event, context):
         }
 
     # Check if the product_id exists in the padeliver table
-    if not aws_gateway.product_exists(product_id):
+    try:
+        exists = aws_gateway.product_exists(product_id)
+    except Exception as e:
+        if is_degraded(e):
+            return service_unavailable(e)
+        raise
+    if not exists:
         return {
             "statusCode": 404,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"message": "Product not found"})
         }
 
-    # Get the current local time
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # Create the inventory item
+    # Create the inventory item under a unique UTC ledger key
     inventory_item = {
         "product_id": product_id,
         "quantity": int(quantity),
         "remark": remark,
-        "datetime": current_time
+        "datetime": ledger_keys.new_ledger_key()
     }
 
     # Add the inventory item to the inventory table
     try:
         aws_gateway.add_inventory_item(inventory_item)
+        aws_gateway.adjust_stock_totals({product_id: inventory_item["quantity"]})
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
@@ -240,17 +544,22 @@ def add_padeliver_inventory(event, context):
             "body": json.dumps({"message": f"Error adding inventory: {str(e)}"})
         }
 
+@lambda_handler
 def get_padeliver_products_with_stock(event, context):
-    """Handler to fetch Pa-deliver products along with their stock."""
+    """Handler to fetch Pa-deliver products along with their stock (NDJSON with Accept: application/x-ndjson)."""
     try:
+        if wants_ndjson(event):
+            return ndjson_response(
+                aws_gateway.iter_products_with_stock(), default=decimal_default,
+                s3_client=aws_gateway.s3, bucket_name=os.getenv('S3_BUCKET_NAME'), name="products_with_stock"
+            )
+
         # Fetch all products from the PADELIVER_PRODUCTS_TABLE
         products = aws_gateway.scan_padeliver_products()
 
         # Fetch stock for each product
         for product in products:
-            product_id = product["product_id"]
-            inventory_data = aws_gateway.get_product_inventory(product_id)
-            product["stock"] = int(inventory_data["total_quantity"])  # Convert Decimal to int
+            product["stock"] = aws_gateway.get_product_stock(product["product_id"])  # Ledger sum, quantity only
 
         # Convert all Decimal values in the products list to JSON-serializable types
         def decimal_to_serializable(obj):
@@ -271,6 +580,14 @@ def get_padeliver_products_with_stock(event, context):
             "body": json.dumps({"message": f"Error fetching Pa-deliver products with stock: {str(e)}"})
         }
 
+def product_id_taken_response():
+    return {
+        "statusCode": 400,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"message": "Product ID already exists", "invalid_field": "product_id"})
+    }
+
+@lambda_handler
 def add_padeliver_product(event, context):
     """Handler for adding a new Pa-deliver product."""
     body = json.loads(event.get("body", "{}"), parse_float=Decimal)
@@ -290,14 +607,16 @@ def add_padeliver_product(event, context):
         }
 
     # Check if product_id or item already exists
-    if aws_gateway.product_exists(product_id):
-        return {
-            "statusCode": 400,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"message": "Product ID already exists", "invalid_field": "product_id"})
-        }
+    try:
+        exists = aws_gateway.product_exists(product_id)
+        existing_product_by_name = None if exists else aws_gateway.get_product_name(item, projection=("product_id",))
+    except Exception as e:
+        if is_degraded(e):
+            return service_unavailable(e)
+        raise
+    if exists:
+        return product_id_taken_response()
 
-    existing_product_by_name = aws_gateway.get_product_name(item)
     if existing_product_by_name:
         return {
             "statusCode": 400,
@@ -316,7 +635,8 @@ def add_padeliver_product(event, context):
     }
 
     try:
-        aws_gateway.add_product(new_product)
+        if not aws_gateway.add_product(new_product):
+            return product_id_taken_response()  # created since the check above
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
@@ -329,12 +649,19 @@ def add_padeliver_product(event, context):
             "body": json.dumps({"message": f"Error adding product: {str(e)}"})
         }
 
+@lambda_handler
 def edit_padeliver_product(event, context):
-    """Handler for editing a Pa-deliver product and updating related inventory."""
+    """Handler for editing a Pa-deliver product and updating related inventory.
+
+    Body: {"old_product_id", "new_product_id"?, "version"?, <attributes to change>...}. Only the
+    given attributes are written, in one conditional update. Pass the "version" last read to
+    reject the edit with 409 if someone else changed the product in between.
+    """
     body = json.loads(event.get("body", "{}"), parse_float=Decimal)
     old_product_id = body.get("old_product_id")
     new_product_id = body.get("new_product_id")
-    updates = {key: value for key, value in body.items() if key not in ["old_product_id", "new_product_id"]}
+    expected_version = body.get("version")
+    updates = {key: value for key, value in body.items() if key not in ["old_product_id", "new_product_id"] and key not in PROTECTED_PRODUCT_ATTRIBUTES}
 
     if not old_product_id:
         return {
@@ -343,51 +670,56 @@ def edit_padeliver_product(event, context):
             "body": json.dumps({"message": "old_product_id must be provided"})
         }
 
-    try:
-        # Fetch the old product
-        product = aws_gateway.view_product(old_product_id)
-        if product["statusCode"] != 200:
-            return product
-
-        product_data = json.loads(product["body"])
+    if not updates and not new_product_id:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": "No product attributes to update"})
+        }
 
-        # If a new product_id is provided, move the product to the new product_id
-        if new_product_id:
-            # Check if the new product_id already exists
-            if aws_gateway.product_exists(new_product_id):
+    try:
+        if new_product_id and new_product_id != old_product_id:
+            # Move the product to the new product_id with the updates applied
+            result = aws_gateway.rename_product(old_product_id, new_product_id, updates, expected_version)
+            if result["status"] == "exists":
                 return {
                     "statusCode": 400,
                     "headers": {"Content-Type": "application/json"},
                     "body": json.dumps({"message": "New product_id already exists", "invalid_field": "new_product_id"})
                 }
-
-            # Update the product_id and apply updates
-            product_data["product_id"] = new_product_id
-            product_data.update(updates)
-
-            # Delete the old product
-            aws_gateway.delete_product(old_product_id)
-
-            # Add the updated product with the new product_id
-            aws_gateway.add_product(product_data)
-
-            # Update all inventory records with the new product_id
-            inventory_data = aws_gateway.get_product_inventory(old_product_id)
-            for inventory_item in inventory_data["inventory_items"]:
-                inventory_item["product_id"] = new_product_id
-                aws_gateway.add_inventory_item(inventory_item)
-
-            logger.info(f"Product ID changed from {old_product_id} to {new_product_id} with updates: {updates}")
+            if result["status"] == "updated":
+                # Update all inventory records with the new product_id
+                inventory_data = aws_gateway.get_product_inventory(old_product_id)
+                for inventory_item in inventory_data["inventory_items"]:
+                    inventory_item["product_id"] = new_product_id
+                    aws_gateway.add_inventory_item(inventory_item)
+                logger.info(f"Product ID changed from {old_product_id} to {new_product_id} with updates: {updates}")
         else:
             # Apply updates to the existing product_id
-            product_data.update(updates)
-            aws_gateway.add_product(product_data)
-            logger.info(f"Product {old_product_id} updated with: {updates}")
+            result = aws_gateway.edit_product(old_product_id, updates, expected_version)
+            if result["status"] == "updated":
+                logger.info(f"Product {old_product_id} updated with: {updates}")
+
+        if result["status"] == "not_found":
+            return {
+                "statusCode": 404,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({"message": "Product not found"})
+            }
+        if result["status"] == "conflict":
+            return {
+                "statusCode": 409,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({
+                    "message": "Product was changed by someone else; reload it and retry",
+                    "product": result["product"]
+                }, default=decimal_default)
+            }
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"message": "Product and inventory updated successfully"})
+            "body": json.dumps({"message": "Product and inventory updated successfully", "product": result["product"]}, default=decimal_default)
         }
     except Exception as e:
         logger.error(f"Error editing product {old_product_id}: {e}")
@@ -397,6 +729,7 @@ def edit_padeliver_product(event, context):
             "body": json.dumps({"message": f"Error editing product: {str(e)}"})
         }
 
+@lambda_handler
 def delete_padeliver_product(event, context):
     """Handler for deleting a Pa-deliver product and its related inventory."""
     body = json.loads(event.get("body", "{}"))
@@ -415,7 +748,7 @@ def delete_padeliver_product(event, context):
         logger.info(f"Product deleted successfully: {product_id}")
 
         # Delete all related inventory records
-        inventory_data = aws_gateway.get_product_inventory(product_id)
+        inventory_data = aws_gateway.get_product_inventory(product_id, projection=("product_id", "datetime"))
         logger.info(f"Product inventory deleted successfully: {inventory_data}")
         for inventory_item in inventory_data["inventory_items"]:
             aws_gateway.delete_inventory_item(
@@ -435,6 +768,7 @@ def delete_padeliver_product(event, context):
             "body": json.dumps({"message": f"Error deleting product: {str(e)}"})
         }
 
+@lambda_handler
 def batch_create_padeliver_products(event, context):
     """Handler for batch creating Pa-deliver products."""
     try:
@@ -457,13 +791,18 @@ def batch_create_padeliver_products(event, context):
                 }
 
         # Batch create products
-        aws_gateway.batch_create_products(body)
-        logger.info(f"Batch created {len(body)} Pa-deliver products successfully.")
+        results = aws_gateway.batch_create_products(body)
+        created = len(results["succeeded"])
+        logger.info(f"Batch created {created} of {len(body)} Pa-deliver products.")
 
         return {
-            "statusCode": 200,
+            "statusCode": 200 if not results["failed"] else 207,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"message": f"Batch created {len(body)} products successfully"})
+            "body": json.dumps({
+                "message": f"Batch created {created} products successfully",
+                "succeeded": results["succeeded"],
+                "failed": results["failed"]
+            }, default=decimal_default)
         }
     except Exception as e:
         logger.error(f"Error batch creating Pa-deliver products: {e}")
@@ -0,0 +1,30 @@
+import logging
+from gateways.awsGateway import AWSGateway
+from gateways.recommendations_gateway import RecommendationsGateway, TOP_K, MIN_CO_OCCURRENCES, WINDOW_DAYS
+from utils.lambda_runtime import lambda_handler
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+aws_gateway = AWSGateway()
+recommendations_gateway = RecommendationsGateway()
+
+@lambda_handler
+def build_recommendations(event, context):
+    """Scheduled job that rebuilds the "frequently bought together" recommendations.
+
+    Event: {"top_k"?: int, "min_count"?: int, "window_days"?: int}
+    """
+    event = event or {}
+    names = {
+        product["product_id"]: product["item"]
+        for product in aws_gateway.scan_all_padeliver_products(projection=("product_id", "item"))
+        if "item" in product
+    }
+    return recommendations_gateway.build(
+        names=names,
+        top_k=int(event.get("top_k", TOP_K)),
+        min_count=int(event.get("min_count", MIN_CO_OCCURRENCES)),
+        window_days=int(event.get("window_days", WINDOW_DAYS))
+    )
@@ -0,0 +1,97 @@
+import json
+import re
+import logging
+import importlib
+from utils.lambda_runtime import lambda_handler
+from utils.warmup import register_primer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# HTTP API routeKey -> "module.function". Keep in step with the httpApi events in serverless.yml.
+ROUTES = {
+    "GET /api/padeliver-products": "handlers.padeliverHandler.get_padeliver_products",
+    "POST /api/cart/{user_id}": "handlers.cartHandler.add_to_cart",
+    "GET /api/cart/{user_id}": "handlers.cartHandler.get_cart",
+    "GET /api/padeliver-products/changes": "handlers.padeliverHandler.get_padeliver_catalog_changes",
+    "GET /api/padeliver-product-names": "handlers.padeliverHandler.get_padeliver_product_names",
+    "GET /api/padeliver-product/view": "handlers.padeliverHandler.view_padeliver_product_by_id_or_name",
+    "GET /api/padeliver-product/view/{user_id}": "handlers.padeliverHandler.view_padeliver_product_by_id_or_name_with_user",
+    "POST /api/padeliver-products/bulk": "handlers.padeliverHandler.get_padeliver_products_bulk",
+    "POST /api/padeliver-inventory": "handlers.padeliverHandler.add_padeliver_inventory",
+    "POST /api/cart/{user_id}/place-order": "handlers.cartHandler.place_order",
+    "GET /api/cart/{user_id}/formatted": "handlers.cartHandler.get_formatted_cart",
+    "GET /api/padeliver-products-with-stock": "handlers.padeliverHandler.get_padeliver_products_with_stock",
+    "POST /api/padeliver-product": "handlers.padeliverHandler.add_padeliver_product",
+    "PUT /api/padeliver-product": "handlers.padeliverHandler.edit_padeliver_product",
+    "DELETE /api/padeliver-product": "handlers.padeliverHandler.delete_padeliver_product",
+    "POST /api/padeliver-products/batch": "handlers.padeliverHandler.batch_create_padeliver_products",
+    "GET /api/inventory": "handlers.inventoryHandler.get_all_inventory",
+    "GET /api/padeliver-inventory/{product_id}/stock": "handlers.inventoryHandler.get_padeliver_stock_as_of",
+    "GET /api/padeliver-inventory/{product_id}/movements": "handlers.inventoryHandler.get_padeliver_inventory_movements",
+    "GET /api/orders/{user_id}": "handlers.cartHandler.get_orders",
+    "GET /api/orders": "handlers.cartHandler.get_all_orders",
+    "PATCH /api/orders/update-status": "handlers.cartHandler.update_order_status",
+    "PATCH /api/orders/bulk-update-status": "handlers.cartHandler.bulk_update_order_status",
+    "POST /api/orders/generate-receipt": "handlers.cartHandler.generate_receipt",
+    "GET /api/reports/sales": "handlers.salesHandler.get_sales_report",
+    "PUT /api/cart/{user_id}/edit": "handlers.cartHandler.edit_cart_product_quantity",
+    "DELETE /api/cart/{user_id}/delete": "handlers.cartHandler.delete_cart_product",
+}
+
+_resolved = {}
+
+def _compile_route(route_key):
+    method, path = route_key.split(" ", 1)
+    pattern = re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>[^/]+)", re.escape(path))
+    return method, re.compile(f"^{pattern}$")
+
+_route_patterns = [(route_key, *_compile_route(route_key)) for route_key in ROUTES]
+
+def resolve_handler(route_key):
+    """Import the route's module on first use and cache its handler function."""
+    if route_key not in _resolved:
+        module_name, function_name = ROUTES[route_key].rsplit(".", 1)
+        _resolved[route_key] = getattr(importlib.import_module(module_name), function_name)
+        logger.info(f"Loaded {ROUTES[route_key]} for {route_key}")
+    return _resolved[route_key]
+
+def match_route(event):
+    """Find the routeKey and path parameters of an HTTP API event.
+
+    Explicit routes arrive with their routeKey; a catch-all ($default) route is matched
+    against the route templates so pathParameters are filled in the same way.
+    """
+    route_key = event.get("routeKey")
+    if route_key in ROUTES:
+        return route_key, event.get("pathParameters")
+
+    http = event.get("requestContext", {}).get("http", {})
+    method, path = http.get("method"), event.get("rawPath") or http.get("path")
+    for candidate, route_method, pattern in _route_patterns:
+        match = pattern.match(path or "")
+        if route_method == method and match:
+            return candidate, match.groupdict() or event.get("pathParameters")
+    return None, None
+
+@register_primer
+def preload_routes():
+    """On warmup, import every route module so the first real request pays no import cost."""
+    for route_key in ROUTES:
+        resolve_handler(route_key)
+
+@lambda_handler
+def route(event, context):
+    """Single entry point for the monolithic deployment (serverless.router.yml)."""
+    route_key, path_parameters = match_route(event)
+    if route_key is None:
+        return {
+            "statusCode": 404,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"No route for {event.get('routeKey') or event.get('rawPath')}"})
+        }
+
+    if path_parameters is not None:
+        event = dict(event, pathParameters=path_parameters, routeKey=route_key)
+    return resolve_handler(route_key)(event, context)
@@ -0,0 +1,81 @@
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from gateways.sales_gateway import SalesGateway
+from utils.lambda_runtime import lambda_handler
+from utils.local_stream import deserialize_image
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+sales_gateway = SalesGateway()
+
+DEFAULT_REPORT_DAYS = 30
+
+def decimal_default(obj):
+    """Convert Decimal to int or float for JSON serialization."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError
+
+@lambda_handler
+def process_order_stream(event, context):
+    """DynamoDB stream consumer that keeps the sales aggregates in step with the orders table.
+
+    Records are applied in order. On the first failure the rest of the batch is reported
+    back via batchItemFailures so Lambda retries from that record only; each record is
+    counted at most once, keyed by its eventID, so retries never double-count. REMOVE
+    events are ignored: archiving an order must not un-count its sales.
+    """
+    for record in event.get("Records", []):
+        try:
+            event_name = record["eventName"]
+            new_order = deserialize_image(record["dynamodb"].get("NewImage"))
+            old_order = deserialize_image(record["dynamodb"].get("OldImage"))
+
+            if event_name == "INSERT":
+                sales_gateway.record_order_placed(new_order, record["eventID"])
+            elif event_name == "MODIFY":
+                sales_gateway.record_status_change(old_order, new_order, record["eventID"])
+        except Exception as e:
+            sequence_number = record["dynamodb"]["SequenceNumber"]
+            logger.error(f"Error aggregating order stream record {sequence_number}: {e}")
+            return {"batchItemFailures": [{"itemIdentifier": sequence_number}]}
+
+    return {"batchItemFailures": []}
+
+@lambda_handler
+def get_sales_report(event, context):
+    """Handler for precomputed sales reports.
+
+    ?product_id=&start=&end=  per-day sales of one product
+    ?day=                     per-product sales for one day
+    ?start=&end=              daily totals (defaults to the last 30 days)
+    Days are "%Y-%m-%d".
+    """
+    params = event.get("queryStringParameters") or {}
+    today = datetime.now(timezone.utc).date()
+    end_day = params.get("end") or today.isoformat()
+    start_day = params.get("start") or (today - timedelta(days=DEFAULT_REPORT_DAYS)).isoformat()
+
+    try:
+        if params.get("product_id"):
+            report = {"product_id": params["product_id"], "days": sales_gateway.get_product_sales(params["product_id"], start_day, end_day)}
+        elif params.get("day"):
+            report = {"day": params["day"], "products": sales_gateway.get_day_product_sales(params["day"])}
+        else:
+            report = {"start": start_day, "end": end_day, "days": sales_gateway.get_daily_totals(start_day, end_day)}
+
+        return {
+            "statusCode": 200,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps(report, default=decimal_default)
+        }
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"message": f"Error retrieving sales report: {str(e)}"})
+        }
@@ -0,0 +1,97 @@
+import json
+import logging
+from decimal import Decimal
+from gateways.awsGateway import AWSGateway
+from gateways.stock_notifications import WebSocketStockChannel
+from utils.lambda_runtime import lambda_handler
+from utils.local_stream import deserialize_image
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+stock_channel = WebSocketStockChannel()
+aws_gateway = AWSGateway()
+
+def coalesce_stock_changes(records):
+    """Collapse a batch of Pa-deliver product and stock shard stream records into one change per product.
+
+    Each change carries the net delta over the batch and, for unsharded products, the latest
+    stock_total, so a product written many times in the batching window produces a single
+    message. Sharded products get their stock filled in by resolve_sharded_totals, and so do
+    products not yet backfilled, whose stock_total does not reflect their ledger. The
+    backfill's own correction is sent as absolute stock with no delta.
+    """
+    changes = {}
+    for record in records:
+        old_product = deserialize_image(record["dynamodb"].get("OldImage"))
+        new_product = deserialize_image(record["dynamodb"].get("NewImage"))
+
+        if "shard" in (new_product or old_product):
+            product_id = (new_product or old_product)["product_id"]
+            shard_delta = Decimal(new_product.get("quantity", 0)) - Decimal(old_product.get("quantity", 0))
+            previous = changes.get(product_id, {})
+            changes[product_id] = {
+                "product_id": product_id,
+                "stock": None,
+                "delta": Decimal(previous.get("delta", 0)) + shard_delta,
+            }
+            continue
+
+        if record["eventName"] == "REMOVE":
+            changes[old_product["product_id"]] = {"product_id": old_product["product_id"], "removed": True}
+            continue
+
+        old_stock = Decimal(old_product.get("stock_total", 0))
+        new_stock = Decimal(new_product.get("stock_total", 0))
+        if record["eventName"] == "MODIFY" and old_stock == new_stock:
+            continue
+
+        product_id = new_product["product_id"]
+        previous = changes.get(product_id, {})
+        backfilled = bool(new_product.get("stock_backfilled"))
+        is_backfill = backfilled and record["eventName"] == "MODIFY" and not old_product.get("stock_backfilled")
+        changes[product_id] = {
+            "product_id": product_id,
+            "stock": new_stock if backfilled else None,
+            "from_ledger": not backfilled,
+            "delta": Decimal(previous.get("delta", 0)) + (0 if is_backfill else new_stock - old_stock),
+        }
+    return list(changes.values())
+
+def resolve_sharded_totals(changes):
+    """Fill in the stock of sharded products, whose records no longer carry it, and of products not yet backfilled."""
+    for change in changes:
+        if change.get("stock") is None and not change.get("removed"):
+            if change.pop("from_ledger", False):
+                change["stock"] = aws_gateway.get_product_stock(change["product_id"])
+            else:
+                change["stock"] = aws_gateway.get_stock_total(change["product_id"])
+        change.pop("from_ledger", None)
+    return changes
+
+@lambda_handler
+def connect(event, context):
+    """WebSocket $connect: subscribe, optionally to ?product_ids=a,b,c only."""
+    request_context = event["requestContext"]
+    params = event.get("queryStringParameters") or {}
+    product_ids = [product_id for product_id in params.get("product_ids", "").split(",") if product_id]
+    endpoint = f"https://{request_context['domainName']}/{request_context['stage']}"
+    stock_channel.add_subscriber(request_context["connectionId"], endpoint, product_ids)
+    return {"statusCode": 200, "body": "Connected"}
+
+@lambda_handler
+def disconnect(event, context):
+    """WebSocket $disconnect: drop the subscription."""
+    stock_channel.remove_subscriber(event["requestContext"]["connectionId"])
+    return {"statusCode": 200, "body": "Disconnected"}
+
+@lambda_handler
+def broadcast_stock_changes(event, context):
+    """Pa-deliver products stream consumer that pushes coalesced stock changes to subscribers."""
+    try:
+        stock_channel.broadcast(resolve_sharded_totals(coalesce_stock_changes(event.get("Records", []))))
+    except Exception as e:
+        # Notifications are best effort: clients resync from the catalog on reconnect.
+        logger.error(f"Error broadcasting stock changes: {e}")
+    return {"batchItemFailures": []}
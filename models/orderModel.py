@@ -0,0 +1,51 @@
+# Order lifecycle: which statuses an order may move to from each status.
+ORDER_STATUS_TRANSITIONS = {
+    "Preparing": ["Ready", "Out for Delivery", "Received", "Cancelled"],
+    "Ready": ["Out for Delivery", "Received", "Cancelled"],
+    "Out for Delivery": ["Received"],
+    "Received": [],
+    "Cancelled": [],
+}
+
+class OrderModel:
+    def __init__(self):
+        pass
+
+    def allowed_previous_statuses(self, new_status):
+        """Statuses from which an order may move to new_status."""
+        return [status for status, targets in ORDER_STATUS_TRANSITIONS.items() if new_status in targets]
+
+    def parse_status_updates(self, updates):
+        """Validate a list of {order_id, customer_name, status} updates.
+
+        Returns (valid, rejected); rejected entries carry the reason. Repeated orders keep
+        only their last update; each earlier one is returned with status "superseded".
+        """
+        valid = {}
+        rejected = []
+        for update in updates:
+            if not isinstance(update, dict):
+                rejected.append({"update": update, "status": "rejected", "message": "Each update must be an object"})
+                continue
+            order_id = update.get("order_id")
+            customer_name = update.get("customer_name")
+            new_status = update.get("status")
+            if not order_id or not customer_name or not new_status:
+                rejected.append({
+                    "order_id": order_id, "customer_name": customer_name, "status": "rejected",
+                    "message": "Missing required fields: order_id, customer_name, or status"
+                })
+            elif new_status not in ORDER_STATUS_TRANSITIONS or not self.allowed_previous_statuses(new_status):
+                rejected.append({
+                    "order_id": order_id, "customer_name": customer_name, "status": "rejected",
+                    "message": f"Orders cannot be moved to status: {new_status}"
+                })
+            else:
+                previous = valid.pop((order_id, customer_name), None)
+                if previous:
+                    rejected.append({
+                        "order_id": order_id, "customer_name": customer_name, "status": "superseded",
+                        "message": f"Superseded by a later update to {new_status} in the same request"
+                    })
+                valid[(order_id, customer_name)] = {"order_id": order_id, "customer_name": customer_name, "new_status": new_status}
+        return list(valid.values()), rejected
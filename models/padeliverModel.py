@@ -1,4 +1,5 @@
 import csv
+from decimal import Decimal, InvalidOperation
 from io import StringIO
 
 class PadeliverModel:
@@ -35,3 +36,27 @@ class PadeliverModel:
             product_ids.append(product_id)
 
         return product_ids
+
+    def iter_inventory_csv(self, lines):
+        """Stream-parse an inventory delta CSV (product_id, quantity, remark) from an iterable of lines.
+
+        Yields one dict per data row with its row_number; rows that cannot be parsed carry an
+        "error" instead of raising, so one bad row does not abort the whole file.
+        """
+        csv_reader = csv.DictReader(lines)
+        for row_number, row in enumerate(csv_reader, start=2):  # row 1 is the header
+            product_id = (row.get("product_id") or "").strip()
+            raw_quantity = (row.get("quantity") or "").strip()
+            parsed = {"row_number": row_number, "product_id": product_id, "quantity": raw_quantity}
+            try:
+                quantity = Decimal(raw_quantity)
+            except InvalidOperation:
+                quantity = None
+            if not product_id:
+                parsed["error"] = "Missing product_id"
+            elif quantity is None or quantity != quantity.to_integral_value() or quantity == 0:
+                parsed["error"] = f"Invalid quantity: {raw_quantity!r}"
+            else:
+                parsed["quantity"] = int(quantity)
+                parsed["remark"] = (row.get("remark") or "").strip() or "Bulk inventory adjustment."
+            yield parsed
@@ -0,0 +1,298 @@
+"""Concurrent checkout stress / soak harness.
+
+Drives add_to_cart, get_cart and place_order directly (no HTTP) with many simulated
+users against a local DynamoDB (e.g. `docker run -p 8000:8000 amazon/dynamodb-local`),
+then reports throughput, latency percentiles, conditional-check failures, lost cart
+updates and oversold products.
+
+Placed orders go through an in-memory fulfilment queue (utils.local_queue.LocalQueue) that
+is drained into process_fulfilment_queue once the users are done, followed by the pending
+order sweep, so the report also covers fulfilment failures, dead letters, orders left
+pending and stock totals that drifted from the ledger.
+
+    python -m scripts.load_harness --users 2000 --products 20 --stock 500 --duration 60
+
+Every simulated user adds items from two "tabs" at once (which exposes lost updates in
+the cart's read-modify-write), checks the cart, and places an order. Users are started
+until --duration seconds have passed, so long durations turn the run into a soak test.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+LOCAL_TABLES = {
+    "PADELIVER_PRODUCTS_TABLE": ("load_padeliver_products", [("product_id", "S")]),
+    "PRODUCTS_INVENTORY_TABLE": ("load_inventory", [("product_id", "S"), ("datetime", "S")]),
+    "PADELIVER_ORDERS_TABLE": ("load_orders", [("customer_name", "S"), ("order_id", "S")]),
+    "STOCK_SHARDS_TABLE": ("load_stock_shards", [("product_id", "S"), ("shard", "N")]),
+    "CATALOG_TOMBSTONES_TABLE": ("load_catalog_tombstones", [("sync_bucket", "S"), ("sync_version", "S")]),
+    "SALES_AGGREGATES_TABLE": ("load_sales_aggregates", [("bucket_id", "S"), ("bucket_key", "S")]),
+    "STOCK_SUBSCRIPTIONS_TABLE": ("load_stock_subscriptions", [("connection_id", "S")]),
+    "RATE_LIMIT_TABLE": ("load_rate_limits", [("limit_key", "S")]),
+    "PRODUCTS_TABLE": ("load_products", [("product_id", "S")]),
+    "PRODUCT_NAME_TABLE": ("load_product_names", [("product_name", "S")]),
+    "CART_TABLE": ("user_carts_rey", [("user_id", "S")]),  # name is hard-coded in cartHandler
+}
+# Global secondary indexes per table: (index name env, default name, key schema, projection type)
+LOCAL_INDEXES = {
+    "PADELIVER_PRODUCTS_TABLE": [
+        ("CATALOG_SYNC_INDEX", "sync_version_index", [("sync_bucket", "S"), ("sync_version", "S")], "KEYS_ONLY"),
+    ],
+    "PADELIVER_ORDERS_TABLE": [
+        ("FULFILMENT_PENDING_INDEX", "fulfilment_status_index", [("fulfilment_status", "S"), ("order_datetime", "S")], "ALL"),
+    ],
+}
+FULFILMENT_BATCH_SIZE = 100  # matches processFulfilmentQueue in serverless.yml
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+        self.conditional_failures = 0
+        self.errors = defaultdict(int)
+        self.lost_cart_units = 0
+        self.carts_with_lost_updates = 0
+        self.users_completed = 0
+        self.fulfilment_failures = 0
+
+    def record(self, operation, started, response):
+        latency_ms = (time.perf_counter() - started) * 1000
+        body = response.get("body", "") if isinstance(response, dict) else ""
+        with self.lock:
+            self.latencies[operation].append(latency_ms)
+            self.status_codes[operation][response.get("statusCode", 0)] += 1
+            if "ConditionalCheckFailed" in body:
+                self.conditional_failures += 1
+
+    def record_error(self, operation, error):
+        with self.lock:
+            self.errors[f"{operation}: {type(error).__name__}"] += 1
+            if "ConditionalCheckFailed" in str(error):
+                self.conditional_failures += 1
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def configure_environment(args):
+    """Point every client at the local endpoint; must run before any handler module is imported."""
+    os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+    os.environ.setdefault("S3_BUCKET_NAME", "")
+    os.environ.setdefault("AWS_MAX_POOL_CONNECTIONS", str(max(50, args.concurrency * 2)))
+    for env_name, (table_name, _) in LOCAL_TABLES.items():
+        os.environ.setdefault(env_name, table_name)
+    for indexes in LOCAL_INDEXES.values():
+        for env_name, index_name, _, _ in indexes:
+            os.environ.setdefault(env_name, index_name)
+
+def key_schema_kwargs(key_schema):
+    return [{"AttributeName": name, "KeyType": "HASH" if index == 0 else "RANGE"} for index, (name, _) in enumerate(key_schema)]
+
+def create_tables():
+    import boto3 #type: ignore
+    client = boto3.client("dynamodb")
+    existing = set(client.list_tables()["TableNames"])
+    for env_name, (_, key_schema) in LOCAL_TABLES.items():
+        table_name = os.environ[env_name]
+        if table_name in existing:
+            client.delete_table(TableName=table_name)
+            client.get_waiter("table_not_exists").wait(TableName=table_name)
+        indexes = LOCAL_INDEXES.get(env_name, [])
+        attributes = dict(key_schema)
+        for _, _, index_schema, _ in indexes:
+            attributes.update(index_schema)
+        index_kwargs = {"GlobalSecondaryIndexes": [
+            {"IndexName": os.environ[index_env], "KeySchema": key_schema_kwargs(index_schema), "Projection": {"ProjectionType": projection}}
+            for index_env, _, index_schema, projection in indexes
+        ]} if indexes else {}
+        client.create_table(
+            TableName=table_name,
+            KeySchema=key_schema_kwargs(key_schema),
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": kind} for name, kind in attributes.items()],
+            BillingMode="PAY_PER_REQUEST",
+            **index_kwargs
+        )
+        client.get_waiter("table_exists").wait(TableName=table_name)
+
+def seed_products(count, stock):
+    from gateways.awsGateway import AWSGateway
+    from utils import ledger_keys
+
+    gateway = AWSGateway()
+    product_ids = [f"LOAD-{index:04d}" for index in range(count)]
+    gateway.batch_create_products([
+        {"product_id": product_id, "item": f"Load test item {product_id}", "price": Decimal("9.99"), "stock_total": Decimal(stock)}
+        for product_id in product_ids
+    ])
+    gateway.add_inventory_items([
+        {"product_id": product_id, "quantity": stock, "remark": "Load test seed", "datetime": ledger_keys.new_ledger_key()}
+        for product_id in product_ids
+    ])
+    return gateway, product_ids
+
+def use_local_fulfilment_queue():
+    """Send placed orders to an in-memory queue instead of fulfilling them inline; returns the queue."""
+    from handlers import cartHandler
+    from gateways.order_fulfilment import OrderFulfilment
+    from utils.local_queue import LocalQueue
+
+    queue = LocalQueue()
+    cartHandler.order_fulfilment = OrderFulfilment(
+        cartHandler.aws_gateway, cartHandler.orders_table,
+        prepare_receipt=None,  # receipts need an S3 bucket
+        queue_url="local", sqs_client=queue
+    )
+    return queue
+
+def run_fulfilment(queue, metrics):
+    """Drain the fulfilment queue, sweep orders still pending into it and drain again."""
+    from handlers import cartHandler
+
+    def drain():
+        started = time.perf_counter()
+        batches = queue.drain(cartHandler.process_fulfilment_queue, batch_size=FULFILMENT_BATCH_SIZE)
+        with metrics.lock:
+            metrics.latencies["fulfil_batch"].append((time.perf_counter() - started) * 1000 / max(1, len(batches)))
+            metrics.fulfilment_failures += sum(len(batch.get("batchItemFailures", [])) for batch in batches)
+
+    drain()
+    swept = cartHandler.order_fulfilment.sweep(settle_seconds=0)
+    drain()
+    return {
+        "swept": swept,
+        "dead_letters": len(queue.dead_letters),
+        "still_pending": sum(1 for _ in cartHandler.order_fulfilment.pending_orders(settle_seconds=0)),
+    }
+
+def simulate_user(user_index, product_ids, args, metrics):
+    from handlers import cartHandler
+
+    user_id = f"load-user-{user_index}"
+    path = {"user_id": user_id}
+    chosen = random.sample(product_ids, min(args.items_per_user, len(product_ids)))
+    expected = defaultdict(int)
+
+    def add(product_id):
+        event = {"pathParameters": path, "body": json.dumps({"product_id": product_id, "quantity": 1, "item": product_id, "price": "9.99"})}
+        started = time.perf_counter()
+        try:
+            metrics.record("add_to_cart", started, cartHandler.add_to_cart(event, None))
+        except Exception as e:
+            metrics.record_error("add_to_cart", e)
+
+    # Two tabs adding the same products at the same time
+    adds = [product_id for product_id in chosen for _ in range(args.adds_per_item)]
+    for product_id in adds:
+        expected[product_id] += 1
+    with ThreadPoolExecutor(max_workers=2) as tabs:
+        list(tabs.map(add, adds))
+
+    started = time.perf_counter()
+    try:
+        response = cartHandler.get_cart({"pathParameters": path}, None)
+        metrics.record("get_cart", started, response)
+        cart = json.loads(response["body"]).get("cart", [])
+        actual = {item["product_id"]: int(Decimal(item["quantity"])) for item in cart}
+        lost = sum(max(0, quantity - actual.get(product_id, 0)) for product_id, quantity in expected.items())
+        with metrics.lock:
+            metrics.lost_cart_units += lost
+            metrics.carts_with_lost_updates += 1 if lost else 0
+    except Exception as e:
+        metrics.record_error("get_cart", e)
+
+    started = time.perf_counter()
+    try:
+        metrics.record("place_order", started, cartHandler.place_order({"pathParameters": path}, None))
+    except Exception as e:
+        metrics.record_error("place_order", e)
+
+    with metrics.lock:
+        metrics.users_completed += 1
+
+def run(args):
+    configure_environment(args)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    create_tables()
+    gateway, product_ids = seed_products(args.products, args.stock)
+    queue = use_local_fulfilment_queue()
+    metrics = Metrics()
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        user_index = 0
+        futures = []
+        while user_index < args.users or time.perf_counter() < deadline:
+            futures.append(executor.submit(simulate_user, user_index, product_ids, args, metrics))
+            user_index += 1
+            if len(futures) >= args.concurrency * 4:
+                futures.pop(0).result()
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    fulfilment = run_fulfilment(queue, metrics)
+
+    oversold = {}
+    stock_total_drift = {}
+    for product_id in product_ids:
+        stock = gateway.get_product_stock(product_id)
+        if stock < 0:
+            oversold[product_id] = -stock
+        stored = gateway.stock_counter.get_total(product_id, use_cache=False)
+        if stored != stock:
+            stock_total_drift[product_id] = stored - stock
+
+    report = {
+        "users": metrics.users_completed,
+        "elapsed_seconds": round(elapsed, 2),
+        "requests_per_second": round(sum(len(samples) for samples in metrics.latencies.values()) / elapsed, 1),
+        "latency_ms": {
+            operation: {
+                "count": len(samples),
+                "p50": round(percentile(samples, 0.50), 1),
+                "p95": round(percentile(samples, 0.95), 1),
+                "p99": round(percentile(samples, 0.99), 1),
+                "max": round(max(samples), 1),
+            }
+            for operation, samples in metrics.latencies.items()
+        },
+        "status_codes": {operation: dict(codes) for operation, codes in metrics.status_codes.items()},
+        "errors": dict(metrics.errors),
+        "conditional_check_failures": metrics.conditional_failures,
+        "lost_cart_units": metrics.lost_cart_units,
+        "carts_with_lost_updates": metrics.carts_with_lost_updates,
+        "oversold_products": len(oversold),
+        "oversold_units": sum(oversold.values()),
+        "fulfilment": {**fulfilment, "failed_deliveries": metrics.fulfilment_failures},
+        "stock_total_drift": stock_total_drift,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="http://localhost:8000", help="Local DynamoDB endpoint")
+    parser.add_argument("--users", type=int, default=1000, help="Minimum number of simulated users")
+    parser.add_argument("--duration", type=float, default=0, help="Keep starting users for this many seconds (soak)")
+    parser.add_argument("--concurrency", type=int, default=200, help="Users in flight at once")
+    parser.add_argument("--products", type=int, default=10, help="Products competing for stock")
+    parser.add_argument("--stock", type=int, default=1000, help="Initial stock per product")
+    parser.add_argument("--items-per-user", type=int, default=3)
+    parser.add_argument("--adds-per-item", type=int, default=2)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,85 @@
+"""Memory check for the NDJSON list mode.
+
+Feeds ndjson_response synthetic rows from a paginated generator (the same shape as
+AWSGateway.iter_table) and reports peak traced memory for growing row counts. Rows past
+the inline limit go through the S3 spill path against an in-memory client that keeps only
+part sizes, so the figures cover serialization and gzip buffering but not the uploaded data.
+
+    python -m scripts.ndjson_memory_harness --rows 10000 100000 1000000
+
+Peak memory should level off at roughly the inline limit plus one upload part, however
+many rows are produced.
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.ndjson import ndjson_response  # noqa: E402
+
+PAGE_SIZE = 1000
+
+class DiscardingS3:
+    """Just enough of the S3 client for GzipMultipartWriter and presigning; part bodies are dropped."""
+
+    def __init__(self):
+        self.part_sizes = []
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "local"}
+
+    def upload_part(self, Body, PartNumber, **kwargs):
+        self.part_sizes.append(len(Body))
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        return {}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.local/{Params['Key']}"
+
+def synthetic_pages(total_rows):
+    """Yield inventory-like rows, building one page at a time like a paginated scan."""
+    for start in range(0, total_rows, PAGE_SIZE):
+        page = [
+            {
+                "product_id": f"product-{index % 5000:05d}",
+                "datetime": f"2026-01-01T00:00:00.{index:06d}Z#{index:08x}",
+                "quantity": Decimal(index % 17 - 8),
+                "remark": "Stock-in: synthetic harness row",
+            }
+            for index in range(start, min(start + PAGE_SIZE, total_rows))
+        ]
+        yield from page
+
+def decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj)
+    raise TypeError
+
+def measure(total_rows):
+    s3 = DiscardingS3()
+    tracemalloc.start()
+    response = ndjson_response(synthetic_pages(total_rows), default=decimal_default, s3_client=s3, bucket_name="harness", name="inventory")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return response["statusCode"], peak, sum(s3.part_sizes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'status':>6} {'peak MiB':>9} {'uploaded MiB':>13}")
+    for total_rows in args.rows:
+        status, peak, uploaded = measure(total_rows)
+        print(f"{total_rows:>10} {status:>6} {peak / 2**20:>9.1f} {uploaded / 2**20:>13.1f}")
+
+if __name__ == "__main__":
+    main()
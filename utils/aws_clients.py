@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from functools import lru_cache, wraps
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import boto3 #type: ignore
+from botocore.config import Config #type: ignore
+from utils.circuit_breaker import table_breaker
+
+logger = logging.getLogger(__name__)
+
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "1"))
+READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "3"))
+S3_READ_TIMEOUT = float(os.getenv("AWS_S3_READ_TIMEOUT", "60"))  # multipart parts, exports and profiles upload for longer
+MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "4"))
+HEDGED_READS = os.getenv("HEDGED_READS", "false").lower() == "true"
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "20"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "100"))
+DEADLINE_SAFETY_MARGIN_MS = 500  # leave time to build and return the response
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,  # match the thread fan-out used by bulk reads and writes
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+    tcp_keepalive=True,
+)
+S3_CLIENT_CONFIG = CLIENT_CONFIG.merge(Config(read_timeout=S3_READ_TIMEOUT))
+
+def _client_config(service_name):
+    return S3_CLIENT_CONFIG if service_name == "s3" else CLIENT_CONFIG
+
+@lru_cache(maxsize=None)
+def get_resource(service_name, region_name=None):
+    """Return the container-wide boto3 resource for a service, built with the shared client config."""
+    return boto3.resource(service_name, region_name=region_name, config=_client_config(service_name))
+
+@lru_cache(maxsize=None)
+def get_client(service_name, region_name=None, endpoint_url=None):
+    """Return the container-wide boto3 client for a service, built with the shared client config."""
+    return boto3.client(service_name, region_name=region_name, endpoint_url=endpoint_url, config=_client_config(service_name))
+
+class LatencyTracker:
+    """Rolling window of call latencies per operation, used to pick the hedge delay."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, operation, latency_ms):
+        with self.lock:
+            self.samples.setdefault(operation, deque(maxlen=self.window)).append(latency_ms)
+
+    def p95(self, operation):
+        with self.lock:
+            samples = sorted(self.samples.get(operation, ()))
+        if len(samples) < 20:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+latency_tracker = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(max_workers=max(4, MAX_POOL_CONNECTIONS // 2))
+_invocation = {"context": None}
+
+def with_time_budget(handler):
+    """Decorator that records the Lambda context so reads can derive their timeout budget from it."""
+    @wraps(handler)
+    def wrapper(event, context):
+        previous_context = _invocation["context"]
+        _invocation["context"] = context
+        try:
+            return handler(event, context)
+        finally:
+            _invocation["context"] = previous_context
+    return wrapper
+
+def remaining_budget_seconds():
+    """Seconds an AWS call may take before the current invocation runs out of time."""
+    context = _invocation["context"]
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return READ_TIMEOUT
+    remaining_ms = context.get_remaining_time_in_millis() - DEADLINE_SAFETY_MARGIN_MS
+    return max(0.05, min(READ_TIMEOUT, remaining_ms / 1000))
+
+def _timed_call(operation, fn, kwargs):
+    started = time.monotonic()
+    result = fn(**kwargs)
+    latency_tracker.record(operation, (time.monotonic() - started) * 1000)
+    return result
+
+def hedged_read(operation, fn, hedge=None, **kwargs):
+    """Run an idempotent read, sending a duplicate request if the first is slower than p95.
+
+    The first response wins. A hedged call is bounded by the remaining invocation budget and
+    raises TimeoutError when it is exceeded. Hedging is off unless HEDGED_READS=true or hedge=True;
+    unhedged reads run inline on the calling thread, bounded by the botocore timeouts and retries.
+    Reads go through the circuit breaker of their table ("<table>.<call>") and raise
+    CircuitOpenError without calling it while the breaker is open.
+    """
+    return table_breaker(operation).call(_hedged_read, operation, fn, hedge, kwargs)
+
+def _hedged_read(operation, fn, hedge, kwargs):
+    if not (HEDGED_READS if hedge is None else hedge):
+        return _timed_call(operation, fn, kwargs)
+
+    budget = remaining_budget_seconds()
+    p95 = latency_tracker.p95(operation)
+    hedge_delay = max(HEDGE_MIN_DELAY_MS, p95 if p95 is not None else HEDGE_DEFAULT_DELAY_MS) / 1000
+    started = time.monotonic()
+
+    futures = [_hedge_executor.submit(_timed_call, operation, fn, kwargs)]
+    done, _ = wait(futures, timeout=min(hedge_delay, budget))
+    if not done:
+        logger.info(f"Hedging slow {operation} after {hedge_delay * 1000:.0f} ms")
+        futures.append(_hedge_executor.submit(_timed_call, operation, fn, kwargs))
+
+    errors = []
+    while futures:
+        remaining = budget - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            futures.remove(future)
+            if future.exception() is None:
+                return future.result()
+            errors.append(future.exception())
+    if errors and not futures:
+        raise errors[0]
+    raise TimeoutError(f"{operation} exceeded its {budget:.2f}s budget")
@@ -1,14 +1,15 @@
 import json
 import boto3 #type: ignore
+from utils.aws_clients import get_resource, get_client
 import logging
 import os
 from decimal import Decimal
 
 class AWSResources:
     def __init__(self, region_name="us-east-2"):
-        self.dynamodb = boto3.resource("dynamodb", region_name=region_name)
-        self.s3_client = boto3.client("s3", region_name=region_name)
-        self.sqs = boto3.resource("sqs", region_name=region_name)
+        self.dynamodb = get_resource("dynamodb", region_name=region_name)
+        self.s3_client = get_client("s3", region_name=region_name)
+        self.sqs = get_resource("sqs", region_name=region_name)
         self.products_table = self.dynamodb.Table(os.getenv("PRODUCTS_TABLE"))
         self.product_inventory_table = self.dynamodb.Table(os.getenv("PRODUCTS_INVENTORY_TABLE"))
         self.product_name_table = self.dynamodb.Table(os.getenv("PRODUCT_NAME_TABLE"))
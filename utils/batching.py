@@ -0,0 +1,16 @@
+import random
+
+def chunked(items, size):
+    """Yield successive lists of at most `size` items from an iterable."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def backoff_delay(attempt, base=0.05, cap=2.0):
+    """Return a full-jitter exponential backoff delay (in seconds) for the given retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
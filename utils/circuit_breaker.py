@@ -0,0 +1,192 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError #type: ignore
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "10"))
+HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+METRICS_NAMESPACE = os.getenv("CIRCUIT_METRICS_NAMESPACE", "Padeliver/CircuitBreaker")
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", "1000"))
+
+# Errors that mean the table is struggling, as opposed to a request it answered and refused
+TRANSIENT_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "InternalServerError",
+    "ServiceUnavailable",
+}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a table whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit for {name} is open, retry after {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def is_transient_failure(error):
+    """True for throttling, 5xx, timeouts and connection errors; these count against a breaker."""
+    if isinstance(error, (TimeoutError, FutureTimeoutError, BotoConnectionError)):
+        return True
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in TRANSIENT_ERROR_CODES or status >= 500
+    return False
+
+def emit_state_change(name, previous, state):
+    """Publish a breaker transition as a CloudWatch embedded-metric log line."""
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Table", "State"]],
+                "Metrics": [{"Name": "CircuitStateChange", "Unit": "Count"}],
+            }],
+        },
+        "Table": name,
+        "State": state,
+        "PreviousState": previous,
+        "CircuitStateChange": 1,
+    }), flush=True)
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one table.
+
+    After FAILURE_THRESHOLD transient failures in a row the breaker opens and calls fail
+    immediately with CircuitOpenError. After RECOVERY_SECONDS it goes half-open and lets
+    HALF_OPEN_PROBES calls through: a success closes it, a failure opens it again. Errors
+    the table answered with (validation, conditional checks) count as successes.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, recovery_seconds=RECOVERY_SECONDS, half_open_probes=HALF_OPEN_PROBES):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.lock = threading.Lock()
+
+    def _transition(self, state):
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self.probes_in_flight = 0
+        self.failures = 0
+        log = logger.warning if state == OPEN else logger.info
+        log(f"Circuit for {self.name}: {previous} -> {state}")
+        emit_state_change(self.name, previous, state)
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError; returns True when the call is a half-open probe."""
+        with self.lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self.opened_at
+                if waited < self.recovery_seconds:
+                    raise CircuitOpenError(self.name, self.recovery_seconds - waited)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    raise CircuitOpenError(self.name, self.recovery_seconds)
+                self.probes_in_flight += 1
+                return True
+            return False
+
+    def record_success(self, probe=False):
+        with self.lock:
+            if self.state == HALF_OPEN and probe:
+                self._transition(CLOSED)
+            elif self.state == CLOSED:
+                self.failures = 0
+
+    def record_failure(self, probe=False):
+        with self.lock:
+            if self.state == HALF_OPEN and probe:
+                self._transition(OPEN)
+            elif self.state == CLOSED:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self._transition(OPEN)
+
+    def call(self, fn, *args, **kwargs):
+        probe = self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_transient_failure(e):
+                self.record_failure(probe)
+            else:
+                self.record_success(probe)
+            raise
+        self.record_success(probe)
+        return result
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def table_breaker(operation):
+    """The container-wide breaker of the table an operation ("<table>.<call>") belongs to."""
+    name = operation.split(".", 1)[0]
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def guarded_call(operation, fn, **kwargs):
+    """Call fn through the breaker of its table."""
+    return table_breaker(operation).call(fn, **kwargs)
+
+def is_degraded(error):
+    """True when a read failed because its table is unavailable, so stale data may be served."""
+    return isinstance(error, CircuitOpenError) or is_transient_failure(error)
+
+def service_unavailable(error):
+    """503 with Retry-After for a read that failed fast on an open circuit or a struggling table."""
+    seconds = max(1, math.ceil(getattr(error, "retry_after", RECOVERY_SECONDS)))
+    return {
+        "statusCode": 503,
+        "headers": {"Content-Type": "application/json", "Retry-After": str(seconds)},
+        "body": '{"message": "Service temporarily unavailable, retry after %d seconds"}' % seconds
+    }
+
+class StaleCache:
+    """Last good value per key, kept per container for serving reads while a table is unavailable."""
+
+    def __init__(self, maxsize=STALE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def remember(self, key, value):
+        with self.lock:
+            self.items[key] = (value, time.time())
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def recall(self, key):
+        """(value, seconds since it was stored), or None."""
+        with self.lock:
+            entry = self.items.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        return value, time.time() - stored_at
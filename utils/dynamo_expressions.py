@@ -0,0 +1,56 @@
+def projection_kwargs(*attributes, names=None):
+    """Build ProjectionExpression/ExpressionAttributeNames kwargs for the given attributes.
+
+    Every attribute goes through a #p placeholder so reserved words (item, datetime, status)
+    are safe. Pass `names` to merge with placeholders already used by the call.
+    """
+    if not attributes:
+        return {}
+    expression_names = dict(names or {})
+    placeholders = []
+    for index, attribute in enumerate(attributes):
+        placeholder = f"#p{index}"
+        expression_names[placeholder] = attribute
+        placeholders.append(placeholder)
+    return {"ProjectionExpression": ", ".join(placeholders), "ExpressionAttributeNames": expression_names}
+
+def set_update_kwargs(updates, key_attribute=None, version_attribute=None, expected_version=None):
+    """Build UpdateItem kwargs that SET each attribute of `updates` in one request.
+
+    Attribute names and values go through #u/:u placeholders. With `key_attribute` the update
+    is conditional on the item existing (no upsert). With `version_attribute` the version is
+    incremented (items written before versioning start at 0), and with `expected_version` too
+    the update only applies if the stored version still matches (optimistic locking).
+    """
+    names = {}
+    values = {}
+    assignments = []
+    for index, (attribute, value) in enumerate(updates.items()):
+        names[f"#u{index}"] = attribute
+        values[f":u{index}"] = value
+        assignments.append(f"#u{index} = :u{index}")
+
+    conditions = []
+    if key_attribute:
+        names["#key"] = key_attribute
+        conditions.append("attribute_exists(#key)")
+    if version_attribute:
+        names["#version"] = version_attribute
+        values[":version_zero"] = 0
+        values[":version_step"] = 1
+        assignments.append("#version = if_not_exists(#version, :version_zero) + :version_step")
+        if expected_version is not None:
+            if int(expected_version) == 0:
+                conditions.append("attribute_not_exists(#version)")
+            else:
+                values[":expected_version"] = int(expected_version)
+                conditions.append("#version = :expected_version")
+
+    kwargs = {
+        "UpdateExpression": "SET " + ", ".join(assignments),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+    if conditions:
+        kwargs["ConditionExpression"] = " AND ".join(conditions)
+    return kwargs
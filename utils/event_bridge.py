@@ -1,8 +1,9 @@
 import json
 import boto3 #type: ignore
 from utils.aws_resources import DecimalEncoder
+from utils.aws_clients import get_client
 
-eventbridge_client = boto3.client("events")
+eventbridge_client = get_client("events")
 
 def submit_product_creation_event(product):
     """Submit an event to EventBridge upon product creation."""
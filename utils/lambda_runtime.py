@@ -0,0 +1,45 @@
+import logging
+import threading
+from functools import wraps
+from utils.aws_clients import with_time_budget
+from utils.rate_limit import rate_limit_response
+from utils.profiling import should_profile, run_profiled
+from utils.warmup import is_warmup_event, handle_warmup
+
+logger = logging.getLogger(__name__)
+
+_container = {"cold_start": True}
+_invocation = threading.local()  # set while a decorated handler runs, so nested handlers (router) are not limited twice
+
+def lambda_handler(handler):
+    """Decorator applied to every Lambda entry point.
+
+    Answers warmup pings before the handler runs, logs cold starts, rejects HTTP requests
+    over their rate limits with 429 before any table is touched, records the invocation
+    context for per-operation time budgets, and profiles sampled invocations when
+    profiling is switched on (PROFILE_INVOCATIONS or an X-Profile header).
+    """
+    budgeted = with_time_budget(handler)
+
+    @wraps(handler)
+    def wrapper(event, context):
+        cold_start = _container["cold_start"]
+        _container["cold_start"] = False
+        if is_warmup_event(event):
+            return handle_warmup(event, context, cold_start)
+        if cold_start:
+            logger.info(f"Cold start serving {handler.__name__}")
+        if getattr(_invocation, "active", False):
+            return budgeted(event, context)
+
+        limited = rate_limit_response(event)
+        if limited:
+            return limited
+        _invocation.active = True
+        try:
+            if should_profile(event):
+                return run_profiled(budgeted, event, context, handler.__name__)
+            return budgeted(event, context)
+        finally:
+            _invocation.active = False
+    return wrapper
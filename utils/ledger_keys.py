@@ -0,0 +1,69 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+
+# Ledger sort keys look like "2025-03-01T08:15:30.123456Z#1f2e3d4c": a fixed-width UTC
+# timestamp with microseconds, so keys sort chronologically as strings, followed by a
+# suffix that keeps two movements in the same microsecond from overwriting each other.
+KEY_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+SUFFIX_SEPARATOR = "#"
+RANGE_END_SUFFIX = SUFFIX_SEPARATOR + "~"  # "~" sorts after every hex suffix character
+LEGACY_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+
+def to_utc(moment):
+    """Return an aware UTC datetime; naive values are treated as UTC (Lambda's local time)."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+def format_key_time(moment):
+    return to_utc(moment).strftime(KEY_TIME_FORMAT)
+
+def new_ledger_key(moment=None):
+    """Build a unique, chronologically sortable ledger sort key for a new movement."""
+    moment = moment or datetime.now(timezone.utc)
+    return f"{format_key_time(moment)}{SUFFIX_SEPARATOR}{uuid.uuid4().hex[:8]}"
+
+def is_current_key(value):
+    """True when a ledger sort key is already in the uniform UTC format."""
+    timestamp, separator, suffix = value.partition(SUFFIX_SEPARATOR)
+    if not separator or not suffix:
+        return False
+    try:
+        datetime.strptime(timestamp, KEY_TIME_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+def parse_ledger_key(value):
+    """Parse a current or legacy ledger sort key into an aware UTC datetime."""
+    timestamp = value.partition(SUFFIX_SEPARATOR)[0]
+    for time_format in (KEY_TIME_FORMAT,) + LEGACY_FORMATS:
+        try:
+            return datetime.strptime(timestamp, time_format).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return to_utc(datetime.fromisoformat(timestamp))
+
+def derived_ledger_key(moment, seed):
+    """Build a ledger sort key whose suffix is derived from `seed`, so re-running a write reuses the key."""
+    suffix = hashlib.sha1(seed.encode("utf-8")).hexdigest()[:8]
+    return f"{format_key_time(moment)}{SUFFIX_SEPARATOR}{suffix}"
+
+def migrated_ledger_key(legacy_value):
+    """Map a legacy key to the uniform format, deterministically so migrations can be re-run."""
+    return derived_ledger_key(parse_ledger_key(legacy_value), legacy_value)
+
+def range_start(moment):
+    """Lowest sort key at or after `moment`."""
+    return format_key_time(moment)
+
+def range_end(moment):
+    """Highest sort key at or before `moment`."""
+    return format_key_time(moment) + RANGE_END_SUFFIX
+
+def parse_query_time(value):
+    """Parse an ISO 8601 query parameter (a trailing "Z" is allowed) into an aware UTC datetime."""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return to_utc(datetime.fromisoformat(value))
@@ -0,0 +1,59 @@
+import uuid
+import itertools
+
+class LocalQueue:
+    """In-memory stand-in for an SQS queue, for exercising queue producers and consumers locally.
+
+    Exposes the subset of the SQS client API the producers use (send_message,
+    send_message_batch), so it can replace the client directly. drain() delivers messages to a
+    consumer in SQS-shaped Lambda events and honours partial batch failures: failed messages
+    are redelivered until max_receives, then moved to dead_letters.
+    """
+
+    def __init__(self, queue_arn="arn:aws:sqs:local:000000000000:local"):
+        self.queue_arn = queue_arn
+        self.messages = []
+        self.dead_letters = []
+        self.sequence = itertools.count(1)
+
+    def send_message(self, QueueUrl=None, MessageBody=None, **kwargs):
+        message_id = str(uuid.uuid4())
+        self.messages.append({"messageId": message_id, "body": MessageBody, "receive_count": 0})
+        return {"MessageId": message_id}
+
+    def send_message_batch(self, QueueUrl=None, Entries=()):
+        successful = []
+        for entry in Entries:
+            response = self.send_message(QueueUrl, entry["MessageBody"])
+            successful.append({"Id": entry["Id"], "MessageId": response["MessageId"]})
+        return {"Successful": successful, "Failed": []}
+
+    def _record(self, message):
+        return {
+            "messageId": message["messageId"],
+            "receiptHandle": f"local-{next(self.sequence)}",
+            "body": message["body"],
+            "attributes": {"ApproximateReceiveCount": str(message["receive_count"])},
+            "messageAttributes": {},
+            "eventSource": "aws:sqs",
+            "eventSourceARN": self.queue_arn,
+        }
+
+    def drain(self, consumer, batch_size=10, context=None, max_receives=3):
+        """Deliver queued messages to an SQS handler until the queue is empty; returns the responses."""
+        responses = []
+        while self.messages:
+            batch, self.messages = self.messages[:batch_size], self.messages[batch_size:]
+            for message in batch:
+                message["receive_count"] += 1
+            response = consumer({"Records": [self._record(message) for message in batch]}, context) or {}
+            responses.append(response)
+            failed_ids = {failure["itemIdentifier"] for failure in response.get("batchItemFailures", [])}
+            for message in batch:
+                if message["messageId"] not in failed_ids:
+                    continue
+                if message["receive_count"] >= max_receives:
+                    self.dead_letters.append(message)
+                else:
+                    self.messages.append(message)
+        return responses
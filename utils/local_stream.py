@@ -0,0 +1,83 @@
+import copy
+import itertools
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer #type: ignore
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+def serialize_image(item):
+    """Convert a native item into a DynamoDB stream image (typed AttributeValues)."""
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+def deserialize_image(image):
+    """Convert a DynamoDB stream image back into a native item."""
+    return {key: _deserializer.deserialize(value) for key, value in (image or {}).items()}
+
+class LocalStream:
+    """In-memory stand-in for a DynamoDB stream with NEW_AND_OLD_IMAGES.
+
+    Writes made through put_item/update_item/delete_item are kept in a local table and
+    emitted as stream records shaped like the real Lambda event, so stream consumers can be
+    exercised without AWS. flush() hands pending records to a consumer in batches.
+    """
+
+    def __init__(self, key_attributes, event_source_arn="arn:aws:dynamodb:local:000000000000:table/local/stream/local"):
+        self.key_attributes = list(key_attributes)
+        self.event_source_arn = event_source_arn
+        self.items = {}
+        self.pending = []
+        self.sequence = itertools.count(1)
+
+    def _key(self, item):
+        return tuple(item[attribute] for attribute in self.key_attributes)
+
+    def _record(self, event_name, old_item, new_item):
+        keys = {attribute: (new_item or old_item)[attribute] for attribute in self.key_attributes}
+        sequence_number = next(self.sequence)
+        record = {
+            "eventID": str(sequence_number),
+            "eventName": event_name,
+            "eventSource": "aws:dynamodb",
+            "eventSourceARN": self.event_source_arn,
+            "dynamodb": {
+                "Keys": serialize_image(keys),
+                "SequenceNumber": str(sequence_number).zfill(21),
+                "StreamViewType": "NEW_AND_OLD_IMAGES",
+            },
+        }
+        if old_item is not None:
+            record["dynamodb"]["OldImage"] = serialize_image(old_item)
+        if new_item is not None:
+            record["dynamodb"]["NewImage"] = serialize_image(new_item)
+        self.pending.append(record)
+
+    def put_item(self, Item):
+        old_item = self.items.get(self._key(Item))
+        self.items[self._key(Item)] = copy.deepcopy(Item)
+        self._record("MODIFY" if old_item else "INSERT", old_item, Item)
+
+    def update_item(self, Key, updates):
+        """Apply a dict of attribute updates to an existing item."""
+        old_item = self.items[self._key(Key)]
+        new_item = dict(copy.deepcopy(old_item), **updates)
+        self.items[self._key(Key)] = new_item
+        self._record("MODIFY", old_item, new_item)
+
+    def delete_item(self, Key):
+        old_item = self.items.pop(self._key(Key), None)
+        if old_item is not None:
+            self._record("REMOVE", old_item, None)
+
+    def flush(self, consumer, batch_size=100, context=None):
+        """Deliver pending records to a stream handler; failed records stay pending for retry."""
+        responses = []
+        while self.pending:
+            batch, self.pending = self.pending[:batch_size], self.pending[batch_size:]
+            response = consumer({"Records": batch}, context) or {}
+            responses.append(response)
+            failed_ids = {failure["itemIdentifier"] for failure in response.get("batchItemFailures", [])}
+            if failed_ids:
+                first_failed = next(i for i, record in enumerate(batch) if record["dynamodb"]["SequenceNumber"] in failed_ids)
+                self.pending = batch[first_failed:] + self.pending
+                break
+        return responses
@@ -0,0 +1,69 @@
+import io
+import os
+import json
+import uuid
+import logging
+from utils.s3_multipart import GzipMultipartWriter
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+NDJSON_STREAM_PREFIX = "ndjson_streams/"
+INLINE_LIMIT_BYTES = int(os.getenv("NDJSON_INLINE_LIMIT_BYTES", str(5 * 1024 * 1024)))  # serialized body; under Lambda's 6 MB response cap
+PRESIGNED_URL_SECONDS = 900
+
+def wants_ndjson(event):
+    """True when the request's Accept header asks for newline-delimited JSON."""
+    headers = {name.lower(): value for name, value in ((event or {}).get("headers") or {}).items()}
+    return NDJSON_CONTENT_TYPE in (headers.get("accept") or "")
+
+def ndjson_lines(rows, default=None):
+    """Serialize rows one at a time as NDJSON lines."""
+    for row in rows:
+        yield json.dumps(row, default=default) + "\n"
+
+def serialized_size(line):
+    """Bytes a body line takes once the response is JSON-encoded, with quotes and newlines escaped."""
+    return len(json.dumps(line)) - 2
+
+def ndjson_response(rows, default=None, s3_client=None, bucket_name=None, name="rows"):
+    """Build an NDJSON response from an iterator of rows without holding the rows in memory.
+
+    Rows are pulled from `rows` (typically a generator over paginated reads) and serialized
+    one at a time. Results whose JSON-encoded body fits under NDJSON_INLINE_LIMIT_BYTES (what
+    Lambda measures against its response cap, with every quote escaped) are returned inline. Larger
+    results continue streaming into a gzip multipart upload in S3 and the client is sent there
+    with 303 See Other. Either way memory is bounded by the inline limit plus one upload part,
+    whatever the table size.
+    """
+    buffer = io.StringIO()
+    size = 0
+    lines = ndjson_lines(rows, default)
+    for line in lines:
+        buffer.write(line)
+        size += serialized_size(line)
+        if size > INLINE_LIMIT_BYTES and s3_client is not None and bucket_name:
+            return _spill_to_s3(buffer, lines, s3_client, bucket_name, name)
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": NDJSON_CONTENT_TYPE},
+        "body": buffer.getvalue()
+    }
+
+def _spill_to_s3(buffer, remaining_lines, s3_client, bucket_name, name):
+    key = f"{NDJSON_STREAM_PREFIX}{name}/{uuid.uuid4().hex}.ndjson.gz"
+    with GzipMultipartWriter(s3_client, bucket_name, key, content_type=NDJSON_CONTENT_TYPE) as writer:
+        writer.write(buffer.getvalue())
+        buffer.close()
+        for line in remaining_lines:
+            writer.write(line)
+    url = s3_client.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket_name, "Key": key}, ExpiresIn=PRESIGNED_URL_SECONDS
+    )
+    logger.info(f"NDJSON response for {name} exceeded {INLINE_LIMIT_BYTES} bytes; streamed to s3://{bucket_name}/{key}")
+    return {
+        "statusCode": 303,
+        "headers": {"Location": url, "Content-Type": NDJSON_CONTENT_TYPE},
+        "body": ""
+    }
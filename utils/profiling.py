@@ -0,0 +1,143 @@
+import io
+import os
+import sys
+import gzip
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from utils.aws_clients import get_client
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INVOCATIONS = os.getenv("PROFILE_INVOCATIONS", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1"))
+PROFILE_HEADER = "x-profile"
+PROFILE_HEADER_TOKEN = os.getenv("PROFILE_HEADER_TOKEN", "")  # requests carrying X-Profile: <token> may be profiled
+PROFILE_HEADER_SAMPLE_RATE = float(os.getenv("PROFILE_HEADER_SAMPLE_RATE", "1"))
+PROFILE_BUCKET = os.getenv("PROFILE_BUCKET") or os.getenv("S3_BUCKET_NAME")
+PROFILE_PREFIX = "profiles/"
+PROFILE_DIR = "/tmp/profiles"
+SUMMARY_LINES = 25
+THREAD_SAMPLE_SECONDS = float(os.getenv("PROFILE_THREAD_SAMPLE_MS", "5")) / 1000
+PROFILING_CONFIGURED = PROFILE_INVOCATIONS or bool(PROFILE_HEADER_TOKEN)
+
+def should_profile(event):
+    """True when this invocation is sampled for profiling, by environment or by request header."""
+    if not PROFILING_CONFIGURED:
+        return False
+    if PROFILE_INVOCATIONS:
+        return random.random() < PROFILE_SAMPLE_RATE
+    headers = (event.get("headers") if isinstance(event, dict) else None) or {}
+    token = next((value for name, value in headers.items() if name.lower() == PROFILE_HEADER), None)
+    return token == PROFILE_HEADER_TOKEN and random.random() < PROFILE_HEADER_SAMPLE_RATE
+
+class ThreadSampler:
+    """Samples the stacks of every thread but the handler's while an invocation is profiled.
+
+    cProfile only sees the thread that enabled it, so work handed to thread pools (bulk
+    writes, fulfilment, exports, hedged reads) shows up there as waiting on futures. The
+    sampler adds where those threads spent their time, as collapsed stacks with sample
+    counts (flamegraph.pl / speedscope "folded" format). Idle pool workers are skipped.
+    """
+
+    def __init__(self, interval=THREAD_SAMPLE_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.skip = {threading.get_ident()}
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        self.skip.add(threading.get_ident())
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident in self.skip or frame.f_code.co_name == "_worker":  # idle ThreadPoolExecutor worker
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def profile_key(function_name, request_id):
+    return f"{PROFILE_PREFIX}{function_name}/{time.strftime('%Y/%m/%d/%H%M%S', time.gmtime())}-{request_id}.prof.gz"
+
+def save_profile(profile, function_name, request_id, sampler=None):
+    """Log the top functions by cumulative time, write the gzip pstats file to /tmp and upload it to S3.
+
+    With a sampler, its folded worker-thread stacks are saved next to it as <key>.threads.folded.gz.
+    """
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+    logger.info(f"Profile of {function_name} ({request_id}):\n{summary.getvalue()}")
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if sampler is not None and sampler.stacks:
+        leaves = Counter()
+        for stack, count in sampler.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        logger.info(f"Worker thread samples of {function_name} ({request_id}), by function: {leaves.most_common(SUMMARY_LINES)}")
+        threads_path = os.path.join(PROFILE_DIR, f"{request_id}.threads.folded.gz")
+        with gzip.open(threads_path, "wt") as folded:
+            folded.write(sampler.folded())
+        _store(threads_path, profile_key(function_name, request_id).replace(".prof.gz", ".threads.folded.gz"))
+
+    raw_path = os.path.join(PROFILE_DIR, f"{request_id}.prof")
+    profile.dump_stats(raw_path)
+    path = raw_path + ".gz"
+    with open(raw_path, "rb") as raw, gzip.open(path, "wb") as compressed:
+        compressed.write(raw.read())
+    os.remove(raw_path)
+    return _store(path, profile_key(function_name, request_id))
+
+def _store(path, key):
+    """Upload a profile file to S3 and remove it from /tmp; without a bucket it stays in /tmp."""
+    if not PROFILE_BUCKET:
+        logger.info(f"Profile written to {path}")
+        return path
+    try:
+        get_client('s3').upload_file(path, PROFILE_BUCKET, key, ExtraArgs={"ContentType": "application/octet-stream", "ContentEncoding": "gzip"})
+        os.remove(path)  # /tmp is shared by every invocation of the container
+        logger.info(f"Profile uploaded to s3://{PROFILE_BUCKET}/{key}")
+    except Exception as e:
+        logger.error(f"Error uploading profile {path}: {e}")
+    return key
+
+def run_profiled(handler, event, context, function_name):
+    """Run one invocation under cProfile and save the profile, whatever the handler returns or raises.
+
+    cProfile records the handler thread only; other threads are covered by a ThreadSampler at
+    PROFILE_THREAD_SAMPLE_MS, which shows where they spent time but not call counts or exact
+    durations. Unhedged reads run on the handler thread (see utils.aws_clients.hedged_read).
+    Download with `aws s3 cp` and inspect with `python -m pstats <file>` after gunzip, or
+    snakeviz; open the .threads.folded file with speedscope or flamegraph.pl.
+    """
+    request_id = getattr(context, "aws_request_id", None) or f"local-{int(time.time() * 1000)}"
+    sampler = ThreadSampler()
+    profile = cProfile.Profile()
+    sampler.start()
+    profile.enable()
+    try:
+        return handler(event, context)
+    finally:
+        profile.disable()
+        sampler.stop()
+        try:
+            save_profile(profile, function_name, request_id, sampler)
+        except Exception as e:
+            logger.error(f"Error saving profile of {function_name}: {e}")
@@ -0,0 +1,145 @@
+import os
+import math
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from botocore.exceptions import ClientError #type: ignore
+from gateways.bulk_writer import TokenBucket
+from utils.aws_clients import get_resource
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+USER_RATE = float(os.getenv("RATE_LIMIT_USER_RPS", "5"))  # per caller and route
+USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "20"))
+ROUTE_RATE = float(os.getenv("RATE_LIMIT_ROUTE_RPS", "200"))  # all callers of a route
+ROUTE_BURST = float(os.getenv("RATE_LIMIT_ROUTE_BURST", "400"))
+SHARED_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "10"))
+SHARED_ROUTE_SHARDS = int(os.getenv("RATE_LIMIT_ROUTE_SHARDS", "10"))  # spreads each route's counter over this many items
+MAX_TRACKED_KEYS = 10000
+
+class SharedRateLimitCounter:
+    """Fixed-window request counters in DynamoDB, shared by every container.
+
+    Each (scope, window) is one item, incremented with a conditional ADD that fails once the
+    window's limit is reached. Items expire through TTL on expires_at. Errors other than the
+    limit being hit fail open so a counter-table problem never takes the API down.
+
+    Cost: every limited request pays one conditional write per scope (caller, then route),
+    so up to two writes per request. A busy route's counter is split over `shards` items,
+    each allowed its share of the limit, so it is not a single hot item.
+    """
+
+    def __init__(self, table_name, window_seconds=SHARED_WINDOW_SECONDS):
+        self.table = get_resource('dynamodb').Table(table_name)
+        self.window_seconds = window_seconds
+
+    def hit(self, scope, rate, shards=1):
+        """Count one request against `scope`; returns 0, or the seconds until the window resets."""
+        now = time.time()
+        window_start = int(now // self.window_seconds) * self.window_seconds
+        limit = max(1, int(rate * self.window_seconds / shards))
+        limit_key = f"{scope}#{window_start}" if shards == 1 else f"{scope}#{window_start}#{random.randrange(shards)}"
+        try:
+            self.table.update_item(
+                Key={"limit_key": limit_key},
+                UpdateExpression="ADD hits :one SET expires_at = if_not_exists(expires_at, :expires_at)",
+                ConditionExpression="attribute_not_exists(hits) OR hits < :limit",
+                ExpressionAttributeValues={":one": 1, ":limit": limit, ":expires_at": window_start + 2 * self.window_seconds}
+            )
+            return 0.0
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                return window_start + self.window_seconds - now
+            logger.warning(f"Shared rate limit counter unavailable, allowing request: {e}")
+            return 0.0
+
+class RateLimiter:
+    """Per-caller and per-route token buckets held in warm-container memory.
+
+    Callers are identified by the user_id path parameter, falling back to the source IP.
+    Buckets live for the container's lifetime (least recently used callers are dropped past
+    MAX_TRACKED_KEYS). Every bucket is checked before any is charged, so a request denied by
+    one limit does not use up another. With RATE_LIMIT_TABLE set, requests that pass the
+    local buckets are also counted in a SharedRateLimitCounter so the limits hold across
+    containers; the caller's counter goes first, so callers over their own limit never
+    count against the route.
+    """
+
+    def __init__(self, user_rate=USER_RATE, user_burst=USER_BURST, route_rate=ROUTE_RATE, route_burst=ROUTE_BURST, shared_counter=None):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self.shared_counter = shared_counter
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _bucket(self, key, rate, burst):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(rate, burst)
+                while len(self.buckets) > MAX_TRACKED_KEYS:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket
+
+    def check(self, route, caller):
+        """Take a token for this request; returns 0 if allowed, else the seconds to wait."""
+        checks = []
+        if self.user_rate > 0 and caller:
+            checks.append((f"caller#{route}#{caller}", self.user_rate, self.user_burst, 1))
+        if self.route_rate > 0:
+            checks.append((f"route#{route}", self.route_rate, self.route_burst, SHARED_ROUTE_SHARDS))
+
+        buckets = [self._bucket(key, rate, burst) for key, rate, burst, _ in checks]
+        with self.lock:  # check every bucket, then charge them all
+            wait = max((bucket.wait_time() for bucket in buckets), default=0.0)
+            if wait:
+                return wait
+            for bucket in buckets:
+                bucket.try_acquire()
+        if self.shared_counter:
+            for key, rate, _, shards in checks:
+                wait = self.shared_counter.hit(key, rate, shards)
+                if wait:
+                    return wait
+        return 0.0
+
+def request_identity(event):
+    """(route, caller) of an HTTP API event, or (None, None) for non-HTTP invocations."""
+    if not isinstance(event, dict) or not event.get("routeKey"):
+        return None, None
+    caller = (event.get("pathParameters") or {}).get("user_id")
+    if not caller:
+        caller = event.get("requestContext", {}).get("http", {}).get("sourceIp")
+    return event["routeKey"], caller
+
+def too_many_requests(retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    return {
+        "statusCode": 429,
+        "headers": {"Content-Type": "application/json", "Retry-After": str(seconds)},
+        "body": '{"message": "Too many requests, retry after %d seconds"}' % seconds
+    }
+
+rate_limiter = RateLimiter(
+    shared_counter=SharedRateLimitCounter(os.getenv("RATE_LIMIT_TABLE")) if os.getenv("RATE_LIMIT_TABLE") else None
+)
+
+def rate_limit_response(event):
+    """A 429 response if this HTTP request is over its limits, otherwise None."""
+    if not RATE_LIMIT_ENABLED:
+        return None
+    route, caller = request_identity(event)
+    if route is None:
+        return None
+    retry_after = rate_limiter.check(route, caller)
+    if retry_after:
+        logger.warning(f"Rate limited {caller or 'anonymous'} on {route}; retry after {retry_after:.2f}s")
+        return too_many_requests(retry_after)
+    return None
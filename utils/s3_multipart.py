@@ -0,0 +1,72 @@
+import io
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 8 * 1024 * 1024  # S3 requires >= 5 MiB for every part except the last
+
+class GzipMultipartWriter:
+    """Stream bytes into a gzip-compressed S3 object with a multipart upload.
+
+    Only one compressed part is held in memory at a time, so memory stays bounded no
+    matter how large the object grows. Use as a context manager: the upload is completed
+    on a clean exit and aborted if an exception escapes.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=MIN_PART_SIZE, content_type="application/x-ndjson"):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.content_type = content_type
+        self.buffer = io.BytesIO()
+        self.gzip = gzip.GzipFile(fileobj=self.buffer, mode="wb")
+        self.parts = []
+        self.upload_id = None
+        self.bytes_written = 0
+
+    def __enter__(self):
+        response = self.s3.create_multipart_upload(
+            Bucket=self.bucket, Key=self.key, ContentType=self.content_type, ContentEncoding="gzip"
+        )
+        self.upload_id = response["UploadId"]
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.gzip.write(data)
+        self.bytes_written += len(data)
+        if self.buffer.tell() >= self.part_size:
+            self._upload_buffer()
+
+    def _upload_buffer(self):
+        body = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        part_number = len(self.parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=part_number, Body=body
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def close(self):
+        self.gzip.close()
+        self._upload_buffer()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts}
+        )
+        logger.info(f"Uploaded s3://{self.bucket}/{self.key} ({self.bytes_written} bytes before compression)")
+
+    def abort(self):
+        if self.upload_id:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            logger.warning(f"Aborted multipart upload of s3://{self.bucket}/{self.key}")
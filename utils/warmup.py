@@ -0,0 +1,42 @@
+import os
+import time
+import logging
+from utils.aws_clients import get_resource, get_client
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SOURCE = "serverless-plugin-warmup"  # payload of deployments still on the plugin
+WARMUP_DELAY_MS = int(os.getenv("WARMUP_DELAY_MS", "75"))  # hold the container so concurrent pings land on distinct ones
+
+_primers = []
+
+def is_warmup_event(event):
+    """True for the scheduled {"warmup": true} pings (or the serverless-plugin-warmup payload)."""
+    return isinstance(event, dict) and (event.get("source") == WARMUP_SOURCE or event.get("warmup") is True)
+
+def register_primer(primer):
+    """Register a callable run on warmup pings, e.g. to open a table or preload a cache."""
+    _primers.append(primer)
+    return primer
+
+@register_primer
+def prime_connections():
+    """Build the shared clients and open pooled HTTPS connections to DynamoDB and S3."""
+    get_resource('dynamodb').meta.client.describe_endpoints()
+    bucket_name = os.getenv('S3_BUCKET_NAME')
+    if bucket_name:
+        get_client('s3').head_bucket(Bucket=bucket_name)
+
+def handle_warmup(event, context, cold_start):
+    """Run the primers on a cold container, then return without touching the real handler."""
+    started = time.monotonic()
+    if cold_start:
+        for primer in _primers:
+            try:
+                primer()
+            except Exception as e:
+                logger.warning(f"Warmup primer {primer.__name__} failed: {e}")
+    time.sleep(WARMUP_DELAY_MS / 1000)
+    function_name = getattr(context, "function_name", "local")
+    logger.info(f"Warmup ping for {function_name}: {'cold' if cold_start else 'warm'} container, primed in {(time.monotonic() - started) * 1000:.0f} ms")
+    return {"statusCode": 200, "body": "warmed", "cold_start": cold_start}